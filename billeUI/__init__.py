@@ -14,3 +14,10 @@ def currency_format(value: str | float | Decimal, to_numeric: bool = False) -> s
         return f"{value:,.2f}".replace(".", "x").replace(",", ".").replace("x", ",")
     elif isinstance(value, str):
         return value.replace(".", "").replace(",", ".")
+
+
+def negative_balance_detail(operation) -> str:
+    """Describes where the balance becomes negative, from the operation of a NegativeAccountTotalError, if known."""
+    if operation is None:
+        return ""
+    return f" The balance becomes negative on {operation.operation_datetime:%d-%m-%Y %H:%M}."
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+created on 17/10/2026
+Background loader of the data shown by the screens.
+
+The queries run on a QThreadPool so the window is never frozen while they run, and their results are delivered back
+to the GUI thread through signals. Every request has a key (e.g.: "operations", "chart"): only the latest request of a
+key is delivered, so the result of an account or a month that is no longer selected is discarded, and a request equal
+to the one of the same key still running is not started again.
+
+Every loader of every screen shares one thread pool of DB_WORKERS threads (by default one less than the connections of
+the database pool), so however many screens are open the loaders hold at most DB_WORKERS connections at once and leave
+one for the queries of the GUI thread. A request that is superseded while it waits in the queue is dropped without
+running its query.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+from src.dbhandler.executor import DB_WORKERS
+
+
+_thread_pool: Optional[QThreadPool] = None
+
+
+def shared_thread_pool() -> QThreadPool:
+    """Returns the thread pool of every DataLoader, creating it on first use."""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = QThreadPool()
+        _thread_pool.setMaxThreadCount(DB_WORKERS)
+    return _thread_pool
+
+
+class LoaderSignals(QObject):
+    """Signals of a load task: (key, generation, result) or (key, generation, exception)"""
+
+    finished = pyqtSignal(str, int, object)
+    failed = pyqtSignal(str, int, object)
+
+
+class LoadTask(QRunnable):
+    """
+    Runs a single query function on a thread of the pool and emits its result, unless is_stale returns True when the
+    task starts: its result would be discarded, so the query is not run.
+    """
+
+    def __init__(
+        self, key: str, generation: int, func: Callable, args: tuple, kwargs: dict, is_stale: Callable[[], bool]
+    ) -> None:
+        super().__init__()
+        self.key = key
+        self.generation = generation
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.is_stale = is_stale
+        self.signals = LoaderSignals()
+
+    @pyqtSlot()
+    def run(self) -> None:
+        if self.is_stale():
+            return
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(self.key, self.generation, e)
+        else:
+            self.signals.finished.emit(self.key, self.generation, result)
+
+
+class DataLoader(QObject):
+    """
+    Runs query functions off the GUI thread, one latest request per key.
+
+    Args:
+        parent (QObject, optional): The screen that owns the loader.
+    """
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.thread_pool = shared_thread_pool()
+        self.generations: Dict[str, int] = {}
+        # key -> (func, args, kwargs) of the request still running
+        self.in_flight: Dict[str, Tuple[Callable, tuple, dict]] = {}
+        # key -> (on_result, on_error) of the latest request
+        self.callbacks: Dict[str, Tuple[Callable, Optional[Callable]]] = {}
+
+    def request(
+        self, key: str, func: Callable, *args: Any, on_result: Callable, on_error: Optional[Callable] = None, **kwargs
+    ) -> None:
+        """
+        Runs func(*args, **kwargs) on the thread pool and calls on_result with its return value on the GUI thread.
+        Any previous request of the same key still running is discarded when it finishes.
+
+        Args:
+            key (str): Identifies what the data is for, e.g.: "operations".
+            func (Callable): A function that only queries the database: it must not touch any widget.
+            on_result (Callable): Called with the result of func, on the GUI thread.
+            on_error (Callable, optional): Called with the exception raised by func, on the GUI thread.
+        """
+        self.callbacks[key] = (on_result, on_error)
+        if self.in_flight.get(key) == (func, args, kwargs):
+            # the same data is already being loaded: its result will go to the new callbacks
+            return
+
+        generation = self.generations.get(key, 0) + 1
+        self.generations[key] = generation
+        self.in_flight[key] = (func, args, kwargs)
+
+        task = LoadTask(key, generation, func, args, kwargs, lambda: self.generations.get(key) != generation)
+        task.signals.finished.connect(self.on_finished)
+        task.signals.failed.connect(self.on_failed)
+        self.thread_pool.start(task)
+
+    def cancel(self, key: Optional[str] = None) -> None:
+        """Discards the results of the running requests of a key, or of every key if no key is provided"""
+        keys = [key] if key is not None else list(self.generations)
+        for k in keys:
+            self.generations[k] = self.generations.get(k, 0) + 1
+            self.in_flight.pop(k, None)
+            self.callbacks.pop(k, None)
+
+    def _take_callbacks(self, key: str, generation: int) -> Optional[Tuple[Callable, Optional[Callable]]]:
+        """Returns the callbacks of a finished request, or None if a newer request of the same key was made"""
+        if self.generations.get(key) != generation:
+            return None
+        self.in_flight.pop(key, None)
+        return self.callbacks.pop(key, None)
+
+    @pyqtSlot(str, int, object)
+    def on_finished(self, key: str, generation: int, result: Any) -> None:
+        callbacks = self._take_callbacks(key, generation)
+        if callbacks is not None:
+            callbacks[0](result)
+
+    @pyqtSlot(str, int, object)
+    def on_failed(self, key: str, generation: int, error: Exception) -> None:
+        callbacks = self._take_callbacks(key, generation)
+        if callbacks is None:
+            return
+        on_error = callbacks[1]
+        if on_error is None:
+            raise error
+        on_error(error)
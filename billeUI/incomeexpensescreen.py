@@ -6,6 +6,7 @@ Created on 05/02/2023 18:10
 @author: igna
 """
 import os
+import sqlite3
 import datetime
 import decimal
 
@@ -20,7 +21,7 @@ from src.queries.opqueries import GetUniqueCategoriesByAccount, GetUniqueSubcate
 from src.commands.groupcommands import CreateOperationGroupCommand
 from src.ophandlers.operationhandler import OperationHandler, NegativeAccountTotalError
 
-from billeUI import UISPATH, operationscreen, groupbrowser, animatedlabel, currency_format
+from billeUI import UISPATH, operationscreen, groupbrowser, animatedlabel, currency_format, negative_balance_detail
 
 
 class IncomeExpenseScreen(QMainWindow):
@@ -248,11 +249,15 @@ class IncomeExpenseScreen(QMainWindow):
         except ValueError:
             self.status_label.setText("<font color='red'>Invalid value entered.</font>")
             animatedlabel.AnimatedLabel("Invalid value", message_type="error").display()
-        except NegativeAccountTotalError:
+        except NegativeAccountTotalError as e:
             animatedlabel.AnimatedLabel("Invalid value", message_type="error").display()
             self.status_label.setText(
-                "<font color='red'>This value could lead to a negative total amount. Please check the date or the value.</font>"
+                "<font color='red'>This value could lead to a negative total amount. Please check the date or the value."
+                f"{negative_balance_detail(e.operation)}</font>"
             )
+        except sqlite3.Error:
+            animatedlabel.AnimatedLabel("Operation failed", message_type="error").display()
+            self.status_label.setText("<font color='red'>The operation could not be saved.</font>")
         # Updates the total value of the account in the label "total_label"
         self.set_acc_data(self.accounts_comboBox.currentIndex())
 
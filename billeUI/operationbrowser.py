@@ -20,13 +20,21 @@ from PyQt5.QtWidgets import QMainWindow, QLabel
 from src.queries.accqueries import ListAccountsQuery
 from src.queries.opqueries import GetOperationByIDQuery, ListOperationsQuery
 
-from src.models.opmodel import UserOperations
+from src.models.opmodel import OperationsModel, OperationRow
 from src.ophandlers.deletehandler import DeletionHandler
 from src.ophandlers.operationhandler import OperationHandler, NegativeAccountTotalError
 
 from src.datahandler.datahandler import AccountDataAnalyzer
 
-from billeUI import UISPATH, operationscreen, currency_format, animatedlabel, headerfiltermixin
+from billeUI import (
+    UISPATH,
+    operationscreen,
+    currency_format,
+    negative_balance_detail,
+    animatedlabel,
+    headerfiltermixin,
+    dataloader,
+)
 
 DATEFORMAT = "%A %d-%m-%Y %H:%M:%S"
 
@@ -83,6 +91,7 @@ class OperationBrowser(QMainWindow, headerfiltermixin.HeaderFilterMixin):
         operation_browser_screen = os.path.join(UISPATH, "operation_browser_screen.ui")
         loadUi(operation_browser_screen, self)
         self.widget = widget
+        self.data_loader = dataloader.DataLoader(self)
 
         self.accounts_object = ListAccountsQuery(user_id=self.widget.user_object.user_id).execute()
         self.acc_list = [f"{acc.account_name} ({acc.account_currency})" for acc in self.accounts_object]
@@ -185,42 +194,58 @@ class OperationBrowser(QMainWindow, headerfiltermixin.HeaderFilterMixin):
             )
             self.delete_op_button.setVisible(any_checked)
 
-    def get_all_operations_data(self) -> List:
-        """Makes the query to fetch ALL operations in ALL accounts"""
-        acc_data_obj = AccountDataAnalyzer(user_id=self.widget.user_object.user_id)
-        all_operations = acc_data_obj.get_all_operations()
-        self.add_account_column()
-        return all_operations
+    @staticmethod
+    def fetch_operations_data(user_id: str, account_id: str | None) -> List[OperationRow]:
+        """
+        Makes de query to fetch all operations from a given account, or ALL operations in ALL accounts if no
+        account_id is provided. It doesn't touch any widget, so it runs in the background data loader. The operations
+        are only rendered, so they are loaded as OperationRow objects.
+        """
+        if account_id is None:
+            return AccountDataAnalyzer(user_id=user_id).get_all_operations(as_rows=True)
+        return ListOperationsQuery(user_id=user_id, account_id=account_id).execute(
+            order_by_datetime="DESC", as_rows=True
+        )
 
     def get_operations_data(self, index: int) -> None:
-        """Makes de query to fetch all operations from a given account"""
+        """Loads in the background all operations from a given account, then shows them with set_operations_data"""
         if index == len(self.accounts_object):
-            acc_data_obj = AccountDataAnalyzer(user_id=self.widget.user_object.user_id)
-            self.operations_list = acc_data_obj.get_all_operations()
+            account_id = None
         else:
             self.acc_id = self.accounts_object[index].model_dump()["account_id"]
-            self.operations_list = ListOperationsQuery(
-                user_id=self.widget.user_object.user_id, account_id=self.acc_id
-            ).execute(order_by_datetime="DESC")
+            account_id = self.acc_id
+        self.data_loader.request(
+            "operations",
+            self.fetch_operations_data,
+            self.widget.user_object.user_id,
+            account_id,
+            on_result=lambda operations_list: self.set_operations_data(index, operations_list),
+        )
+
+    def set_operations_data(self, index: int, operations_list: List[OperationRow]) -> None:
+        """Receives the operations loaded by get_operations_data and populates the table with them"""
+        self.operations_list = operations_list
         self.current_account_index = index
+        self.pagination_index = 0
+        self.set_table_data(index)
 
     def set_table_data(self, index: int) -> None:
         """
         Populates the table with the operations of the given account. The given account is selected with the index
         """
-        # Disconnect the signal for the table so cellChanged.connect is not triggered while loading a new account
-        self.operation_table_widget.blockSignals(True)
-
         if self.accounts_comboBox.itemText(index) == "All":
-            self.operations_list = self.get_all_operations_data()
+            self.add_account_column()
         else:
             self.remove_account_column()
 
-        # call the get_operations_data only when the account is changed and not when moving through pagination
+        # load the operations only when the account is changed and not when moving through pagination: the table is
+        # populated when they arrive
         if self.current_account_index != index:
             self.get_operations_data(index)
-            self.current_account_index = index
-            self.pagination_index = 0
+            return
+
+        # Disconnect the signal for the table so cellChanged.connect is not triggered while loading a new account
+        self.operation_table_widget.blockSignals(True)
 
         self.operation_table_widget.setColumnCount(len(self.headers_list))
         self.operation_table_widget.setHorizontalHeaderLabels(self.headers_list)
@@ -268,7 +293,7 @@ class OperationBrowser(QMainWindow, headerfiltermixin.HeaderFilterMixin):
         else:
             self.operation_table_widget.clearContents()
 
-    def set_table_items(self, current_operations_page: List[UserOperations]) -> None:
+    def set_table_items(self, current_operations_page: List[OperationRow]) -> None:
         """wrapper function to set the info into the table"""
         for row_index, operation in enumerate(current_operations_page):
             items = [
@@ -345,56 +370,54 @@ class OperationBrowser(QMainWindow, headerfiltermixin.HeaderFilterMixin):
             self.status_label.setText("<font color='orange'>Changes to be saved.</font>")
 
     def save_updated_row(self):
-        """Get all the new data in a row"""
-        for row_idx in self.rows_changed:
-            user_id = self.widget.user_object.user_id
-            account_id = self.operation_table_widget.item(row_idx, 0).data(QtCore.Qt.UserRole + 1)
-            operation_id = self.operation_table_widget.item(row_idx, 0).data(QtCore.Qt.UserRole)
-            # original operation used for edition
-            original_op = GetOperationByIDQuery(
-                user_id=user_id, account_id=account_id, operation_id=operation_id
-            ).execute()
-            # dictionary to create the OperationHandler object
-            row_data = {
-                "user_id": user_id,
-                "account_id": account_id,
-                "operation_id": operation_id,
-                "operation_datetime": datetime.strptime(
-                    self.operation_table_widget.item(row_idx, 0).text() + "+00:00", DATEFORMAT + "%z"
-                ),
-                "cumulative_amount": Decimal(
-                    currency_format(self.operation_table_widget.item(row_idx, 1).text(), to_numeric=True)
-                ),
-                "amount": Decimal(
-                    currency_format(self.operation_table_widget.item(row_idx, 2).text(), to_numeric=True)
-                ),
-                "operation_type": self.operation_table_widget.item(row_idx, 3).text(),
-                "category": self.operation_table_widget.item(row_idx, 4).text(),
-                "subcategory": self.operation_table_widget.item(row_idx, 5).text(),
-                "description": self.operation_table_widget.item(row_idx, 6).text(),
-            }
-
-            edited_op = OperationHandler(**row_data)
-            try:
-                edited_op.set_account_total(edit_flag=True, original_operation=original_op)
-                cml = edited_op.set_cumulatives(edit_flag=True, original_operation=original_op)
-                edited_op.save(cml)
-                self.status_label.setText("<font color='green'>Change saved.</font>")
-                animatedlabel.AnimatedLabel("Changes successfully saved ✅").display()
-            except (ValueError, NegativeAccountTotalError):
-                animatedlabel.AnimatedLabel("Edition not allowed!!", message_type="error").display()
-                self.status_label.setText(
-                    """<font color='red'>
-                    Can not save this change because somewhere the cumulative amount becomes negative.
-                    </font>"""
-                )
+        """Get all the new data in the changed rows and save them at once"""
+        user_id = self.widget.user_object.user_id
+        try:
+            edits = []
+            for row_idx in self.rows_changed:
+                account_id = self.operation_table_widget.item(row_idx, 0).data(QtCore.Qt.UserRole + 1)
+                operation_id = self.operation_table_widget.item(row_idx, 0).data(QtCore.Qt.UserRole)
+                # original operation used for edition
+                original_op = GetOperationByIDQuery(
+                    user_id=user_id, account_id=account_id, operation_id=operation_id
+                ).execute()
+                # dictionary to create the edited operation
+                row_data = {
+                    "user_id": user_id,
+                    "account_id": account_id,
+                    "operation_id": operation_id,
+                    "operation_datetime": datetime.strptime(
+                        self.operation_table_widget.item(row_idx, 0).text() + "+00:00", DATEFORMAT + "%z"
+                    ),
+                    "amount": Decimal(
+                        currency_format(self.operation_table_widget.item(row_idx, 2).text(), to_numeric=True)
+                    ),
+                    "operation_type": self.operation_table_widget.item(row_idx, 3).text(),
+                    "category": self.operation_table_widget.item(row_idx, 4).text(),
+                    "subcategory": self.operation_table_widget.item(row_idx, 5).text(),
+                    "description": self.operation_table_widget.item(row_idx, 6).text(),
+                    "tags": original_op.tags,
+                    "group_id": original_op.group_id,
+                    "detail_id": original_op.detail_id,
+                }
+                edits.append((original_op, OperationsModel(**row_data)))
+
+            OperationHandler.save_many(edits)
+            self.status_label.setText(f"<font color='green'>{len(edits)} changes saved.</font>")
+            animatedlabel.AnimatedLabel("Changes successfully saved ✅").display()
+        except (ValueError, NegativeAccountTotalError) as e:
+            detail = negative_balance_detail(e.operation) if isinstance(e, NegativeAccountTotalError) else ""
+            animatedlabel.AnimatedLabel("Edition not allowed!!", message_type="error").display()
+            self.status_label.setText(
+                f"""<font color='red'>
+                Can not save these changes because somewhere the cumulative amount becomes negative.{detail}
+                </font>"""
+            )
         self.save_changes_button.setEnabled(False)
         # force update data in set_table by changing the self.current_account_index
         self.current_account_index = -1
-
-        if self.accounts_comboBox.currentText() == "All":
-            # self.set_True_all_operations_flag()
-            self.operations_list = self.get_all_operations_data()
+        # a load started before the changes must not be reused
+        self.data_loader.cancel("operations")
 
         self.set_table_data(self.accounts_comboBox.currentIndex())
         self.rows_changed.clear()
@@ -419,20 +442,25 @@ class OperationBrowser(QMainWindow, headerfiltermixin.HeaderFilterMixin):
                     acc_id = self.operation_table_widget.item(row, 0).data(QtCore.Qt.UserRole + 1)
                     rows_to_delete.append((op_id, acc_id))
 
-            for op_id, acc_id in rows_to_delete:
-                op = GetOperationByIDQuery(
-                    user_id=self.widget.user_object.user_id, account_id=acc_id, operation_id=op_id
-                ).execute()
-                deletion = DeletionHandler(**op.model_dump())
-                deletion.set_account_total()
-                cml = deletion.set_cumulatives()
-                deletion.save(cml)
-
-            # QTimer used to deffer slightly the generation of the label to next iteration of the event loop, so the main
-            # window get of focus again. Otherwise it will not appear.
-            QTimer.singleShot(1, lambda: animatedlabel.AnimatedLabel("Operations deleted successfully ✅").display())
-            self.status_label.setText(f"<font color='green'>{len(rows_to_delete)} operations deleted.</font>")
+            try:
+                deleted_count = DeletionHandler.delete_many(
+                    self.widget.user_object.user_id, [(acc_id, op_id) for op_id, acc_id in rows_to_delete]
+                )
+            except NegativeAccountTotalError as e:
+                animatedlabel.AnimatedLabel("Deletion not allowed!!", message_type="error").display()
+                self.status_label.setText(
+                    "<font color='red'>No operations deleted. These operations can not be deleted because the "
+                    f"cumulative amount becomes negative.{negative_balance_detail(e.operation)}</font>"
+                )
+            else:
+                # QTimer used to deffer slightly the generation of the label to next iteration of the event loop, so
+                # the main window get of focus again. Otherwise it will not appear.
+                QTimer.singleShot(
+                    1, lambda: animatedlabel.AnimatedLabel("Operations deleted successfully ✅").display()
+                )
+                self.status_label.setText(f"<font color='green'>{deleted_count} operations deleted.</font>")
             self.current_account_index = -1  # fuerza recarga
+            self.data_loader.cancel("operations")
             self.set_table_data(self.accounts_comboBox.currentIndex())
             self.delete_op_button.setVisible(False)
 
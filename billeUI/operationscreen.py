@@ -5,8 +5,7 @@ created on 12/02/2023
 updated on 21/06/2026
 """
 import os
-from typing import List
-from decimal import Decimal
+from typing import Dict, List
 from datetime import datetime
 
 from PyQt5 import QtCore
@@ -28,11 +27,11 @@ from billeUI import (
     operationbrowser,
     accountbrowser,
     piechartfunctions,
+    dataloader,
 )
 
 from src.queries.accqueries import ListAccountsQuery
-from src.datahandler.datahandler import AccountDataAnalyzer
-from .piechartfunctions import _get_month_interval
+from src.dbhandler.dbhandler import close_user_connections
 
 
 class OperationScreen(QMainWindow):
@@ -71,6 +70,7 @@ class OperationScreen(QMainWindow):
     def initialize_variables(self) -> None:
         """Set up the initial variables"""
         self.operation = None
+        self.data_loader = dataloader.DataLoader(self)
         # variables for the pie chart
         self.chart_mode = "month"
         self.chart_type = "expense"
@@ -130,7 +130,6 @@ class OperationScreen(QMainWindow):
             self.acc_totals_widget = QStackedWidget()
             self.acc_totals_widget.addWidget(self.account_dashlet)
             self.central_VL_Layout.insertWidget(0, self.acc_totals_widget)
-            self.account_dashlet.set_monthly_balance(self.get_monthly_balance())
 
     def get_currency_list(self) -> List[str]:
         """
@@ -142,31 +141,29 @@ class OperationScreen(QMainWindow):
         currencies_list.sort()
         return currencies_list
 
-    def get_monthly_balance(self) -> Decimal:
+    def load_chart(self, time_period: datetime | Dict[str, str], chart_mode: str) -> None:
         """
-        calculates the balances of the month
+        Loads the pie chart data, its title and the monthly balance in the background. They are shown by set_chart
+        when ready, unless another chart was requested meanwhile.
         """
-        if hasattr(self, "selected_datetime") and self.selected_datetime is not None:
-            dttime = self.selected_datetime
-        else:
-            dttime = self.curr_datetime
-        from_datetime, to_datetime = _get_month_interval(dttime.year, dttime.month)
-        income_balance = AccountDataAnalyzer.get_user_totals_by_period(
-            user_id=self.widget.user_object.user_id,
-            from_datetime=from_datetime,
-            to_datetime=to_datetime,
-            operation_type="income",
-            currency=self.currency,
-        )
-        expense_balance = AccountDataAnalyzer.get_user_totals_by_period(
-            user_id=self.widget.user_object.user_id,
-            from_datetime=from_datetime,
-            to_datetime=to_datetime,
-            operation_type="expense",
-            currency=self.currency,
+        self.data_loader.request(
+            "chart",
+            piechartfunctions.load_chart,
+            self.widget.user_object.user_id,
+            self.currency,
+            time_period,
+            chart_mode,
+            self.chart_type,
+            self.selected_datetime,
+            on_result=self.set_chart,
         )
-        balance = income_balance - expense_balance
-        return balance
+
+    def set_chart(self, chart_data: tuple) -> None:
+        """Shows the data loaded by load_chart"""
+        data_inner, data_outer, chart_title, balance = chart_data
+        self.chart.setTitle(chart_title)
+        self.chart.generate_chart(data_inner, data_outer, self.chart_type)
+        self.account_dashlet.set_monthly_balance(balance)
 
     def income(self) -> None:
         """Takes the user to the income screen"""
@@ -217,65 +214,17 @@ class OperationScreen(QMainWindow):
         self.period_dict = {}  # resets de period dict to empty
         self.chart_mode = "month"  # resets the chart mode to month
         self.chart_type = "expense"
-        data_inner, data_outer = piechartfunctions.load_data(
-            user_id=self.widget.user_object.user_id,
-            chart_mode=self.chart_mode,
-            chart_type=self.chart_type,
-            time_period=self.curr_datetime,
-            currency=self.currency,
-        )
-        chart_title = piechartfunctions.update_n_format_chart_title(
-            user_id=self.widget.user_object.user_id,
-            currency=self.currency,
-            time_period=self.selected_datetime,
-            chart_mode=self.chart_mode,
-            chart_type=self.chart_type,
-        )
-        self.chart.setTitle(chart_title)
-        self.chart.generate_chart(data_inner, data_outer, self.chart_type)
-        self.account_dashlet.set_monthly_balance(self.get_monthly_balance())
+        self.load_chart(time_period=self.curr_datetime, chart_mode=self.chart_mode)
 
     def next_month_chart(self):
         """Changes to a pie chart for the next month"""
         self.selected_datetime = piechartfunctions.get_next_month(self.selected_datetime)
-        data_inner, data_outer = piechartfunctions.load_data(
-            user_id=self.widget.user_object.user_id,
-            chart_mode="month",
-            chart_type=self.chart_type,
-            time_period=self.selected_datetime,
-            currency=self.currency,
-        )
-        chart_title = piechartfunctions.update_n_format_chart_title(
-            user_id=self.widget.user_object.user_id,
-            currency=self.currency,
-            time_period=self.selected_datetime,
-            chart_mode="month",
-            chart_type=self.chart_type,
-        )
-        self.chart.setTitle(chart_title)
-        self.chart.generate_chart(data_inner, data_outer, self.chart_type)
-        self.account_dashlet.set_monthly_balance(self.get_monthly_balance())
+        self.load_chart(time_period=self.selected_datetime, chart_mode="month")
 
     def previous_month_chart(self):
         """Changes to a pie chart for the previus month"""
         self.selected_datetime = piechartfunctions.get_prev_month(self.selected_datetime)
-        data_inner, data_outer = piechartfunctions.load_data(
-            user_id=self.widget.user_object.user_id,
-            chart_mode="month",
-            chart_type=self.chart_type,
-            time_period=self.selected_datetime,
-            currency=self.currency,
-        )
-        chart_title = piechartfunctions.update_n_format_chart_title(
-            user_id=self.widget.user_object.user_id,
-            currency=self.currency,
-            time_period=self.selected_datetime,
-            chart_mode="month",
-            chart_type=self.chart_type,
-        )
-        self.chart.setTitle(chart_title)
-        self.chart.generate_chart(data_inner, data_outer, self.chart_type)
-        self.account_dashlet.set_monthly_balance(self.get_monthly_balance())
+        self.load_chart(time_period=self.selected_datetime, chart_mode="month")
 
     def switch_chart_type(self):
         """Changes the pie chart from income to expenses and viceversa"""
@@ -289,23 +238,7 @@ class OperationScreen(QMainWindow):
             self.chart_type = "expense"
         elif self.chart_type == "expense":
             self.chart_type = "income"
-        data_inner, data_outer = piechartfunctions.load_data(
-            user_id=self.widget.user_object.user_id,
-            chart_mode=self.chart_mode,
-            chart_type=self.chart_type,
-            time_period=stime,
-            currency=self.currency,
-        )
-        chart_title = piechartfunctions.update_n_format_chart_title(
-            user_id=self.widget.user_object.user_id,
-            currency=self.currency,
-            time_period=stime,
-            chart_mode=self.chart_mode,
-            chart_type=self.chart_type,
-        )
-        self.chart.setTitle(chart_title)
-        self.chart.generate_chart(data_inner, data_outer, self.chart_type)
-        self.account_dashlet.set_monthly_balance(self.get_monthly_balance())
+        self.load_chart(time_period=stime, chart_mode=self.chart_mode)
 
     def custom_date_range_chart(self):
         """
@@ -329,23 +262,7 @@ class OperationScreen(QMainWindow):
                 "initial": str(self.custom_initial_date),
                 "final": str(self.custom_final_date),
             }
-            data_inner, data_outer = piechartfunctions.load_data(
-                user_id=self.widget.user_object.user_id,
-                chart_mode=self.chart_mode,
-                chart_type=self.chart_type,
-                time_period=self.period_dict,
-                currency=self.currency,
-            )
-            chart_title = piechartfunctions.update_n_format_chart_title(
-                user_id=self.widget.user_object.user_id,
-                currency=self.currency,
-                time_period=self.period_dict,
-                chart_mode=self.chart_mode,
-                chart_type=self.chart_type,
-            )
-            self.chart.setTitle(chart_title)
-            self.chart.generate_chart(data_inner, data_outer, self.chart_type)
-        self.account_dashlet.set_monthly_balance(self.get_monthly_balance())
+            self.load_chart(time_period=self.period_dict, chart_mode=self.chart_mode)
 
     def change_currency_chart(self):
         """Change the currency of the pie chart"""
@@ -355,26 +272,12 @@ class OperationScreen(QMainWindow):
             stime = self.selected_datetime
         self.currency = self.currency_combobox.currentText()
 
-        data_inner, data_outer = piechartfunctions.load_data(
-            user_id=self.widget.user_object.user_id,
-            chart_mode=self.chart_mode,
-            chart_type=self.chart_type,
-            time_period=stime,
-            currency=self.currency,
-        )
-        chart_title = piechartfunctions.update_n_format_chart_title(
-            user_id=self.widget.user_object.user_id,
-            currency=self.currency,
-            time_period=stime,
-            chart_mode=self.chart_mode,
-            chart_type=self.chart_type,
-        )
-        self.chart.setTitle(chart_title)
-        self.chart.generate_chart(data_inner, data_outer, self.chart_type)
-        self.account_dashlet.set_monthly_balance(self.get_monthly_balance())
+        self.load_chart(time_period=stime, chart_mode=self.chart_mode)
 
     def back(self) -> None:
         """Returns to the LoginScreen Menu"""
+        self.data_loader.cancel()
+        close_user_connections(self.widget.user_object.user_id)
         login_screen = loginscreen.LoginScreen(widget=self.widget)
         self.widget.addWidget(login_screen)
         self.widget.setCurrentIndex(self.widget.currentIndex() + 1)
@@ -382,6 +285,8 @@ class OperationScreen(QMainWindow):
     def keyPressEvent(self, e):
         """Returns to the LoginScreen Menu when Esc key is pressed."""
         if e.key() == QtCore.Qt.Key_Escape:
+            self.data_loader.cancel()
+            close_user_connections(self.widget.user_object.user_id)
             login_screen = loginscreen.LoginScreen(widget=self.widget)
             self.widget.addWidget(login_screen)
             self.widget.setCurrentIndex(self.widget.currentIndex() + 1)
@@ -5,9 +5,11 @@ created on 28/07/2025
 Auxiliary functions to generate the PieCharts
 """
 from typing import Tuple, Dict
+from decimal import Decimal
 from datetime import datetime, timedelta, UTC
 
-from src.datahandler.datahandler import AccountDataAnalyzer
+from src.datahandler.datahandler import AccountDataAnalyzer, OperationDataAnalizer
+from src.datahandler.opframe import OperationFrame, frame_analytics
 
 
 def get_next_month(current_date: datetime) -> datetime:
@@ -135,7 +137,6 @@ def update_n_format_chart_title(
     """
     if chart_mode == "month":
         from_datetime, to_datetime = _get_month_interval(time_period.year, time_period.month)
-        selected_period = time_period.strftime(format="%B %Y").capitalize()
         total = AccountDataAnalyzer.get_user_totals_by_period(
             user_id=user_id,
             from_datetime=from_datetime,
@@ -145,7 +146,6 @@ def update_n_format_chart_title(
         )
     elif chart_mode == "period":
         ci_date, cf_date = time_period.values()
-        selected_period = f"Period: {ci_date} -- {cf_date}"
         total = AccountDataAnalyzer.get_user_totals_by_period(
             user_id=user_id,
             from_datetime=ci_date,
@@ -153,8 +153,94 @@ def update_n_format_chart_title(
             operation_type=chart_type,
             currency=currency,
         )
+    return _format_chart_title(total, time_period, chart_mode, chart_type)
+
+
+def _format_chart_title(
+    total: Decimal, time_period: datetime | Dict[str, str], chart_mode: str, chart_type: str
+) -> str:
+    """Creates the title of the chart with the total of the chart_type operations of the period"""
+    if chart_mode == "month":
+        selected_period = time_period.strftime(format="%B %Y").capitalize()
+    else:
+        ci_date, cf_date = time_period.values()
+        selected_period = f"Period: {ci_date} -- {cf_date}"
     title_type = chart_type.capitalize()
     total_int = f"{total:,.0f}".replace(",", ".")
     total_decimal = f"{total:.2f}".split(".")[1]
     title = f"<h3><p align='center' style='color:black'><b>{title_type}: ${total_int}<sup>{total_decimal}</sup><br>{selected_period}</b></p>"
     return title
+
+
+def get_monthly_balance(user_id: str, currency: str, dttime: datetime) -> Decimal:
+    """
+    Calculates the balance (incomes - expenses) of the month of the given datetime.
+    Args:
+        user_id (str): The user id, required to make the query to the db.
+        currency (str): The currency of the data to be retrieve.
+        dttime (datetime.datetime): Any datetime of the month.
+    Returns:
+        balance (Decimal)
+    """
+    from_datetime, to_datetime = _get_month_interval(dttime.year, dttime.month)
+    income_balance = AccountDataAnalyzer.get_user_totals_by_period(
+        user_id=user_id,
+        from_datetime=from_datetime,
+        to_datetime=to_datetime,
+        operation_type="income",
+        currency=currency,
+    )
+    expense_balance = AccountDataAnalyzer.get_user_totals_by_period(
+        user_id=user_id,
+        from_datetime=from_datetime,
+        to_datetime=to_datetime,
+        operation_type="expense",
+        currency=currency,
+    )
+    return income_balance - expense_balance
+
+
+def load_chart(
+    user_id: str,
+    currency: str,
+    time_period: datetime | Dict[str, str],
+    chart_mode: str,
+    chart_type: str,
+    balance_datetime: datetime,
+) -> tuple:
+    """
+    Loads everything the operation screen shows for a chart: its data, its title and the monthly balance.
+    It only queries the database, so it can run outside of the GUI thread.
+    Returns:
+        data_inner, data_outer, chart_title, balance
+    """
+    if not frame_analytics(user_id):
+        data_inner, data_outer = load_data(
+            user_id=user_id, currency=currency, time_period=time_period, chart_mode=chart_mode, chart_type=chart_type
+        )
+        chart_title = update_n_format_chart_title(
+            user_id=user_id, currency=currency, time_period=time_period, chart_mode=chart_mode, chart_type=chart_type
+        )
+        balance = get_monthly_balance(user_id, currency, balance_datetime)
+        return data_inner, data_outer, chart_title, balance
+
+    # a single frame of the chart period gives its data, the total of the title and, for a month, its balance
+    if chart_mode == "month":
+        from_datetime, to_datetime = _get_month_interval(time_period.year, time_period.month)
+    elif chart_mode == "period":
+        from_datetime, to_datetime = time_period.values()
+    else:
+        raise ValueError("Valid types: 'expense', 'income'. Valid modes: 'month', 'period'")
+    frame = OperationFrame.load(user_id, from_datetime=from_datetime, to_datetime=to_datetime, currency=currency)
+
+    data_outer = OperationDataAnalizer.categorize_flow_operations(frame, None, None, chart_type, "category")
+    data_inner = OperationDataAnalizer.categorize_flow_operations(frame, None, None, chart_type, "subcategory")
+    total = OperationDataAnalizer.get_totals_by_period(frame, None, None, chart_type)
+    chart_title = _format_chart_title(total, time_period, chart_mode, chart_type)
+    if chart_mode == "month" and time_period.strftime("%Y%m") == balance_datetime.strftime("%Y%m"):
+        income_balance = OperationDataAnalizer.get_totals_by_period(frame, None, None, "income")
+        expense_balance = OperationDataAnalizer.get_totals_by_period(frame, None, None, "expense")
+        balance = income_balance - expense_balance
+    else:
+        balance = get_monthly_balance(user_id, currency, balance_datetime)
+    return data_inner, data_outer, chart_title, balance
@@ -6,6 +6,7 @@ Created on 12/02/2023 18:10
 @author: igna
 """
 import os
+import sqlite3
 import datetime
 from decimal import Decimal, InvalidOperation
 
@@ -200,6 +201,10 @@ class TransferScreen(QMainWindow):
             self.status_label.setText(
                 f"<font color='red'>Can not transfer more than the current balance of the account: {value}."
             )
+        except sqlite3.Error:
+            # nothing was written: both legs are rolled back together
+            animatedlabel.AnimatedLabel("Transfer failed!", message_type="error").display()
+            self.status_label.setText("<font color='red'>The transfer could not be saved.</font>")
 
     def cancel(self):
         """Returns to previous screen OperationScreen menu."""
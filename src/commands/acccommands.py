@@ -8,6 +8,7 @@ It uses the models.py module.
 from typing import Optional
 from pydantic import BaseModel, EmailStr, model_validator
 
+from src.dbhandler.executor import AsyncExecutable
 from src.models.usrmodel import User
 from src.models.accmodel import UserAccounts, AccountNotFoundError
 
@@ -16,7 +17,7 @@ class AccountAlreadyExistsError(Exception):
     pass
 
 
-class CreateUsersAccountCommand(BaseModel):
+class CreateUsersAccountCommand(BaseModel, AsyncExecutable):
     """Creates an account table with name <table_name> for a given user in the accounts_database"""
 
     email: Optional[EmailStr] = None
@@ -48,7 +49,7 @@ class CreateUsersAccountCommand(BaseModel):
         return user_account
 
 
-class EditUsersAccountCommand(BaseModel):
+class EditUsersAccountCommand(BaseModel, AsyncExecutable):
     """Edits an account table with name <table_name> for a given user in the accounts_database"""
 
     user_id: str
@@ -77,7 +78,7 @@ class EditUsersAccountCommand(BaseModel):
         return user_acc
 
 
-class DeleteUsersAccountCommand(BaseModel):
+class DeleteUsersAccountCommand(BaseModel, AsyncExecutable):
     """Deletes a given account from table accounts and drops the <account_name> talbe"""
 
     user_id: str
@@ -7,6 +7,7 @@ High level module to handle groups of operations
 from decimal import Decimal
 from typing import Optional, Literal
 
+from src.dbhandler.executor import AsyncExecutable
 from src.models.opgroupsmodel import OperationGroups
 
 
@@ -14,7 +15,7 @@ class NoEditedFieldsError(Exception):
     pass
 
 
-class CreateOperationGroupCommand(OperationGroups):
+class CreateOperationGroupCommand(OperationGroups, AsyncExecutable):
 
     status: str = "open"
 
@@ -24,7 +25,7 @@ class CreateOperationGroupCommand(OperationGroups):
         return group
 
 
-class EditOperationGroupCommand(OperationGroups):
+class EditOperationGroupCommand(OperationGroups, AsyncExecutable):
 
     group_id: str
     group_name: Optional[str] = None
@@ -57,7 +58,7 @@ class EditOperationGroupCommand(OperationGroups):
         return oper_group.save()
 
 
-class DeleteOperationGroupCommand(OperationGroups):
+class DeleteOperationGroupCommand(OperationGroups, AsyncExecutable):
 
     user_id: str
     group_id: str
@@ -6,16 +6,21 @@ It uses the models.py module.
 """
 
 import datetime
-from typing import Optional, Literal
+from typing import List, Optional, Literal, Tuple
 
+from pydantic import BaseModel
+
+from src.dbhandler.executor import AsyncExecutable
 from src.models.opmodel import OperationsModel, UserOperations
+from src.ophandlers.deletehandler import DeletionHandler
+from src.ophandlers.operationhandler import OperationHandler
 
 
 class NoEditedFieldsError(Exception):
     pass
 
 
-class CreateAccountOperationCommand(OperationsModel):
+class CreateAccountOperationCommand(OperationsModel, AsyncExecutable):
     """Creates an operation entry for a given user in a given account in the accounts_database"""
 
     user_id: str
@@ -28,7 +33,24 @@ class CreateAccountOperationCommand(OperationsModel):
         return oper.create()
 
 
-class CreateNEditAccountOperationsCommand(OperationsModel):
+class CreateAccountOperationsCommand(BaseModel, AsyncExecutable):
+    """
+    Creates several operation entries for a given user in a given account in the accounts_database at once, with
+    their cumulative amounts and the ones of the later operations recalculated in a single pass
+    """
+
+    user_id: str
+    account_id: str
+    operations: List[OperationsModel]
+
+    def execute(self) -> List[UserOperations]:
+        operations = [
+            oper.model_copy(update={"user_id": self.user_id, "account_id": self.account_id}) for oper in self.operations
+        ]
+        return OperationHandler.create_many(operations)
+
+
+class CreateNEditAccountOperationsCommand(OperationsModel, AsyncExecutable):
     """Edits an account entry for a given user in a given account in the accounts_database for a given operation id"""
 
     user_id: str
@@ -44,7 +66,7 @@ class CreateNEditAccountOperationsCommand(OperationsModel):
         return oper.massive_save(existing_operations, edit_flag)
 
 
-class DeleteNEditAccountOperationsCommand(OperationsModel):
+class DeleteNEditAccountOperationsCommand(OperationsModel, AsyncExecutable):
     """
     Deletes the self operation and edits all other affected operations for a given user in a given acount in a given
     account in the accounts_database for a given operation id
@@ -63,7 +85,21 @@ class DeleteNEditAccountOperationsCommand(OperationsModel):
         return oper.delete_n_massive_save(existing_operations)
 
 
-class EditAccountOperationCommand(OperationsModel):
+class DeleteAccountOperationsCommand(BaseModel, AsyncExecutable):
+    """
+    Deletes several operation entries for a given user in one or more accounts in the accounts_database at once, with
+    the cumulative amounts of every account recalculated once
+    """
+
+    user_id: str
+    # (account_id, operation_id) of every operation
+    operations: List[Tuple[str, str]]
+
+    def execute(self) -> int:
+        return DeletionHandler.delete_many(self.user_id, self.operations)
+
+
+class EditAccountOperationCommand(OperationsModel, AsyncExecutable):
     """Edits an account entry for a given user in a given account in the accounts_database for a given operation id"""
 
     user_id: str
@@ -120,7 +156,7 @@ class EditAccountOperationCommand(OperationsModel):
         return oper.save()
 
 
-class DeleteAccountOperationCommand(OperationsModel):
+class DeleteAccountOperationCommand(OperationsModel, AsyncExecutable):
     """
     Deletes an operation entry for a given user in a given account in the accounts_database for a given operation id
     """
@@ -5,10 +5,11 @@ Higher order module for creation of databases, users and accounts.
 It uses the models.py module.
 """
 
+from src.dbhandler.executor import AsyncExecutable
 from src.models.opdetmodel import OperationsDetails
 
 
-class CreateOperationDetailCommand(OperationsDetails):
+class CreateOperationDetailCommand(OperationsDetails, AsyncExecutable):
 
     def execute(self):
         oper_details = OperationsDetails(**self.model_dump())
@@ -16,7 +17,7 @@ class CreateOperationDetailCommand(OperationsDetails):
         return det
 
 
-class EditOperationDetailsCommand(OperationsDetails):
+class EditOperationDetailsCommand(OperationsDetails, AsyncExecutable):
 
     def execute(self):
         oper_details = OperationsDetails(**self.model_dump())
@@ -24,7 +25,7 @@ class EditOperationDetailsCommand(OperationsDetails):
         return det
 
 
-class DeleteOperationDetailsCommand(OperationsDetails):
+class DeleteOperationDetailsCommand(OperationsDetails, AsyncExecutable):
 
     def execute(self):
         det = OperationsDetails.get_details_by_operation_id(self.user_id, self.operation_id)
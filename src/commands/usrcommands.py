@@ -11,6 +11,7 @@ from typing import Optional
 from pydantic import BaseModel, Field, EmailStr
 from pydantic_extra_types.country import CountryAlpha3
 
+from src.dbhandler.executor import AsyncExecutable
 from src.pwhandler.pwhandler import hash_password
 from src.models.usrmodel import User, UserNotFoundError
 
@@ -19,7 +20,7 @@ class UserAlreadyExistsError(Exception):
     pass
 
 
-class CreateUserCommand(BaseModel):
+class CreateUserCommand(BaseModel, AsyncExecutable):
     first_name: str
     last_name: Optional[str] = None
     birthdate: Optional[datetime.date] = None
@@ -51,7 +52,7 @@ class CreateUserCommand(BaseModel):
         return user
 
 
-class EditUserCommand(BaseModel):
+class EditUserCommand(BaseModel, AsyncExecutable):
     user_id: str
     first_name: Optional[str] = None
     last_name: Optional[str] = None
@@ -76,7 +77,7 @@ class EditUserCommand(BaseModel):
         return user
 
 
-class DeleteUserCommand(BaseModel):
+class DeleteUserCommand(BaseModel, AsyncExecutable):
     user_id: str
     password: str
 
@@ -2,12 +2,15 @@
 Enero 2025
 """
 
-import os
 import sqlite3
 import csv
 from zoneinfo import ZoneInfo
 from datetime import datetime, UTC
 
+from src.dbhandler.balanceindex import invalidate_balance_index
+from src.dbhandler.dbhandler import acc_db_path, connect, uses_minor_units_storage
+from src.dbhandler.money import minor_unit_exponent, to_minor_units, record_from_db
+from src.dbhandler.timestamps import epoch_us
 from src.models.usrmodel import User
 from src.models.accmodel import UserAccounts
 from src.models.opmodel import OperationNotFoundError
@@ -19,13 +22,17 @@ class CSVtoSQLiteMapper:
         """
         Initialize the mapper with the SQLite database path.
         """
-        self.db_path = os.path.join("data", user.user_id, "accounts_database.db")
-        self.connection = sqlite3.connect(self.db_path)
+        self.db_path = acc_db_path(user.user_id)
+        self.connection = connect(self.db_path)
         self.connection.row_factory = sqlite3.Row
         self.cursor = self.connection.cursor()
         self.table_name = table_name
         self.user_id = user.user_id
         self.account_id = account.account_id
+        # None if the database stores decimal amounts
+        self.amount_exponent = (
+            minor_unit_exponent(account.account_currency) if uses_minor_units_storage(user.user_id) else None
+        )
 
     def close(self):
         """
@@ -56,7 +63,8 @@ class CSVtoSQLiteMapper:
         db_row["account_id"] = self.account_id
         db_row["cumulative_amount"] = db_row["amount"]
         db_row["created_at"] = db_row["updated_at"] = datetime.now(UTC)
-        return OperationHandler(**db_row)
+        # every row shares the account object, so it is not fetched once per row
+        return OperationHandler(account=account, **db_row)
 
     def map_and_insert(self, user: User, account: UserAccounts, rows) -> dict:
         """
@@ -90,6 +98,8 @@ class CSVtoSQLiteMapper:
             # Insert into database
             oper4db = self.initialize_operation(user, account, db_row)
             self.insert_row(oper4db)
+        # the rows are inserted without the operations model
+        invalidate_balance_index(self.user_id, self.account_id)
 
     def insert_row(self, operation: OperationHandler):
         """
@@ -106,20 +116,22 @@ class CSVtoSQLiteMapper:
             subcategory,
             description,
             created_at,
-            updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            updated_at,
+            operation_ts
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
         """
         values = (
             operation.operation_id,
             operation.operation_datetime,
-            operation.amount,
-            operation.cumulative_amount,
+            to_minor_units(operation.amount, self.amount_exponent),
+            to_minor_units(operation.cumulative_amount, self.amount_exponent),
             operation.operation_type,
             operation.category,
             operation.subcategory,
             operation.description,
             operation.created_at,
             operation.updated_at,
+            epoch_us(operation.operation_datetime),
         )
         self.cursor.execute(insert_query, values)
         self.connection.commit()
@@ -136,12 +148,14 @@ class CSVtoSQLiteMapper:
         if not record:
             raise OperationNotFoundError
 
-        record = dict(record)
+        record = dict(record_from_db(record, self.amount_exponent))
         record["user_id"] = self.user_id
         record["account_id"] = self.account_id
 
         first_operation = OperationHandler(**record)
-        cml_corrected_list = first_operation.set_cumulatives(edit_flag=True, original_operation=first_operation)
+        cml_corrected_list = first_operation.set_cumulatives(
+            edit_flag=True, original_operation=first_operation, recalculate=True
+        )
         # the first operation is added at the end of the list
         cml_corrected_list_without_first = cml_corrected_list[:-1]
         # the account total must be the same as the last cumulative amount
@@ -4,16 +4,29 @@ billeterapp 2.0 - Junio 2025
 This module handles the data stored in the operation tables.
 """
 
-import os
 import sqlite3
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional, Sequence
 from string import Template
 from decimal import Decimal
 from datetime import datetime
 from collections import defaultdict
 
 from src.models.accmodel import UserAccounts
-from src.models.opmodel import UserOperations
+from src.models.opmodel import OperationRow, UserOperations
+from src.datahandler.opframe import OperationFrame, frame_analytics
+from src.dbhandler.dbhandler import get_connection, is_consolidated_layout, uses_minor_units_storage
+from src.dbhandler.layout import OPERATIONS_COLUMNS
+from src.dbhandler.money import AMOUNT_COLUMNS, minor_unit_exponent, from_minor_units, record_from_db
+from src.dbhandler.statements import (
+    READ_BATCH_SIZE,
+    build_statement,
+    check_identifier,
+    fetch_in_batches,
+    operation_filters,
+)
+from src.dbhandler.tableresolver import resolve_table_name
+from src.dbhandler.timestamps import epoch_us
+from src.dbhandler.trustedload import load_models
 
 
 SELECT_QUERY = Template(
@@ -30,9 +43,9 @@ SELECT_QUERY = Template(
     FROM
       $table_name
     WHERE 
-      operation_datetime >= ?
+      operation_ts >= ?
     AND
-      operation_datetime <= ?
+      operation_ts <= ?
     AND
       operation_type = ?
     """
@@ -45,20 +58,107 @@ TOTAL_QUERY = Template(
     FROM
       $table_name
     WHERE
-      operation_datetime >= ?
+      operation_ts >= ?
+    AND
+      operation_ts <= ?
+    AND
+      operation_type = ?
+    """
+)
+
+# queries for databases with the consolidated layout: one statement over the operations table for all the accounts
+CONSOLIDATED_SELECT_QUERY = Template(
+    """
+    SELECT
+      account_id,
+      operation_id,
+      operation_datetime,
+      amount,
+      operation_type,
+      category,
+      subcategory,
+      description,
+      tags
+    FROM
+      operations
+    WHERE
+      account_id IN ($account_ids)
+    AND
+      operation_ts >= ?
+    AND
+      operation_ts <= ?
+    AND
+      operation_type = ?
+    """
+)
+
+CONSOLIDATED_TOTAL_QUERY = Template(
+    """
+    SELECT
+      account_id,
+      SUM(amount)
+    FROM
+      operations
+    WHERE
+      account_id IN ($account_ids)
+    AND
+      operation_ts >= ?
     AND
-      operation_datetime <= ?
+      operation_ts <= ?
     AND
       operation_type = ?
+    GROUP BY
+      account_id
     """
 )
 
 
+# group keys of the OperationFrame by data_type of the category analytics
+DATA_TYPE_KEYS = {"category": ("category",), "subcategory": ("category", "subcategory")}
+
+
+def _placeholders(values: List) -> str:
+    """Returns a '?, ?, ...' string with one placeholder per value"""
+    return ", ".join("?" * len(values))
+
+
+def _amount_exponents(user_id: str, accounts_list: List[UserAccounts]) -> Dict[str, Optional[int]]:
+    """
+    Returns the minor unit exponent of the currency of every account by account_id if the database stores integer
+    amounts, otherwise None for every account.
+    """
+    minor_units = uses_minor_units_storage(user_id)
+    return {
+        account.account_id: minor_unit_exponent(account.account_currency) if minor_units else None
+        for account in accounts_list
+    }
+
+
+def _operation_rows(records: List[sqlite3.Row], exponents: Dict[str, Optional[int]]) -> List[OperationRow]:
+    """Builds the OperationRow objects of records of several accounts, with the amounts of every account converted"""
+    if len(set(exponents.values())) <= 1:
+        return OperationRow.from_records(records, next(iter(exponents.values()), None))
+    return [OperationRow.from_db(record, exponents[record["account_id"]]) for record in records]
+
+
+def _scaled_columns(factor: int) -> str:
+    """Returns the columns of an operations table with the amounts multiplied by an integer factor"""
+    return ", ".join(
+        f"{column} * {factor} AS {column}" if factor != 1 and column in AMOUNT_COLUMNS else column
+        for column in OPERATIONS_COLUMNS
+    )
+
+
 class AccountDataAnalyzer(UserAccounts):
 
-    def get_all_operations(self, **kwargs) -> List:
-        """Returns an ordered by timestamp list of all existing operations of all accounts of the same currency"""
+    def get_all_operations(self, as_rows: bool = False, **kwargs) -> List:
+        """
+        Returns an ordered by timestamp list of all existing operations of all accounts of the same currency, as
+        UserOperations objects or as OperationRow objects if as_rows is True (e.g.: to render them).
+        """
         accounts_list = UserAccounts.get_all_accounts(user_id=self.user_id, **kwargs)
+        if is_consolidated_layout(self.user_id):
+            return self._get_all_consolidated_operations(accounts_list, as_rows)
         select_template = Template(
             "SELECT *, ? AS 'user_id', $account_id AS 'account_id', '$account_name' AS account_name FROM $table_name"
         )
@@ -78,23 +178,144 @@ class AccountDataAnalyzer(UserAccounts):
         # join all queries for every table with a UNION ALL
         operation_select_union = " UNION ALL ".join(operations_selects_list)
 
-        final_query = operation_select_union + " ORDER BY operation_datetime DESC;"
+        final_query = operation_select_union + " ORDER BY operation_ts DESC;"
+
+        with get_connection(self.user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            try:
+                cur.execute(final_query, (self.user_id,) * len(accounts_list))
+                all_operations = cur.fetchall()
+            except sqlite3.OperationalError as e:
+                print(e)  # debugging and develop purposes
+
+        exponents = _amount_exponents(self.user_id, accounts_list)
+        if as_rows:
+            return _operation_rows(all_operations, exponents)
+        operation_objects = load_models(
+            UserOperations,
+            (record_from_db(operation, exponents[operation["account_id"]]) for operation in all_operations),
+        )
 
-        db_path = os.path.join("data", self.user_id, "accounts_database.db")
+        return operation_objects
 
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        try:
-            cur.execute(final_query, (self.user_id,) * len(accounts_list))
+    def _get_all_consolidated_operations(self, accounts_list: List[UserAccounts], as_rows: bool = False) -> List:
+        """get_all_operations for databases with the consolidated layout"""
+        account_ids = [account.account_id for account in accounts_list]
+        columns = ", ".join(f"operations.{column}" for column in OPERATIONS_COLUMNS)
+        query = f"""
+            SELECT {columns}, ? AS user_id, operations.account_id, accounts.account_name
+            FROM operations JOIN accounts ON operations.account_id = accounts.account_id
+            WHERE operations.account_id IN ({_placeholders(account_ids)})
+            ORDER BY operations.operation_ts DESC;"""
+
+        with get_connection(self.user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute(query, (self.user_id, *account_ids))
             all_operations = cur.fetchall()
-            conn.close()
-        except sqlite3.OperationalError as e:
-            print(e)  # debugging and develop purposes
 
-        operation_objects = [UserOperations(**operation) for operation in all_operations]
+        exponents = _amount_exponents(self.user_id, accounts_list)
+        if as_rows:
+            return _operation_rows(all_operations, exponents)
+        return load_models(
+            UserOperations,
+            (record_from_db(operation, exponents[operation["account_id"]]) for operation in all_operations),
+        )
 
-        return operation_objects
+    def iter_all_operations(
+        self,
+        from_datetime: Optional[datetime] = None,
+        to_datetime: Optional[datetime] = None,
+        operation_types: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[Optional[str]]] = None,
+        order_by_datetime: str = "DESC",
+        limit: Optional[int] = None,
+        batch_size: int = READ_BATCH_SIZE,
+        as_rows: bool = False,
+        **kwargs: int | str,
+    ) -> Iterator:
+        """
+        Streams the operations of all accounts matching the given filters, ordered by timestamp, as get_all_operations
+        returns them. The filters are applied in the query of every account and the rows are fetched and converted
+        batch_size at a time, so the memory doesn't grow with the size of the accounts.
+
+        The generator holds a pooled connection of its thread until it is exhausted or closed: iterate it on a single
+        thread, and close it (e.g.: with contextlib.closing) to stop early.
+        Args:
+            from_datetime (datetime, optional): initial datetime, included
+            to_datetime (datetime, optional): final datetime, included
+            operation_types (Sequence[str], optional): e.g.: ["income", "transfer_in"]
+            categories (Sequence[str], optional): categories to keep, None for the operations without category
+            order_by_datetime (str, optional): 'ASC' or 'DESC'
+            limit (int, optional): maximum number of operations
+            batch_size (int, optional): number of rows per fetchmany call
+            as_rows (bool, optional): yields OperationRow objects instead of UserOperations objects
+            **kwargs (int | str): 'is_active', 'currency'
+        """
+        accounts_list = UserAccounts.get_all_accounts(user_id=self.user_id, **kwargs)
+        if not accounts_list:
+            return
+        exponents = _amount_exponents(self.user_id, accounts_list)
+        consolidated = is_consolidated_layout(self.user_id)
+        conditions, filter_params = operation_filters(
+            from_datetime, to_datetime, operation_types, categories, column_prefix="operations." if consolidated else ""
+        )
+
+        with get_connection(self.user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            if consolidated:
+                account_ids = [account.account_id for account in accounts_list]
+                columns = ", ".join(f"operations.{column}" for column in OPERATIONS_COLUMNS)
+                query = f"""
+                    SELECT {columns}, ? AS user_id, operations.account_id, accounts.account_name
+                    FROM operations JOIN accounts ON operations.account_id = accounts.account_id
+                    WHERE operations.account_id IN ({_placeholders(account_ids)})"""
+                if conditions:
+                    query += f" AND {conditions}"
+                params = [self.user_id, *account_ids, *filter_params]
+            else:
+                selects = []
+                params = []
+                for account in accounts_list:
+                    table_name = check_identifier(resolve_table_name(self.user_id, account.account_id, cur))
+                    select = f"SELECT *, ? AS user_id, ? AS account_id, ? AS account_name FROM {table_name}"
+                    if conditions:
+                        select += f" WHERE {conditions}"
+                    selects.append(select)
+                    params += [self.user_id, account.account_id, account.account_name, *filter_params]
+                # join all queries for every table with a UNION ALL
+                query = " UNION ALL ".join(selects)
+
+            if order_by_datetime in ("ASC", "DESC"):
+                query += f" ORDER BY operation_ts {order_by_datetime}"
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit)
+
+            cur.execute(query, params)
+            for records in fetch_in_batches(cur, batch_size):
+                if as_rows:
+                    yield from _operation_rows(records, exponents)
+                else:
+                    yield from load_models(
+                        UserOperations,
+                        (record_from_db(operation, exponents[operation["account_id"]]) for operation in records),
+                    )
+
+    def get_operation_frame(
+        self, from_datetime: Optional[datetime] = None, to_datetime: Optional[datetime] = None, **kwargs: int | str
+    ) -> OperationFrame:
+        """
+        Returns the operations of all accounts in a given period of time as an OperationFrame, for the vectorized
+        analytics over long histories, e.g.: the monthly totals by category. Requires numpy.
+        Args:
+            from_datetime (datetime, optional): initial datetime
+            to_datetime (datetime, optional): final datetime
+            **kwargs (int | str): 'is_active', 'currency'
+        """
+        return OperationFrame.load(self.user_id, from_datetime=from_datetime, to_datetime=to_datetime, **kwargs)
 
     @classmethod
     def get_user_totals(cls, user_id: str, **kwargs: int | str) -> Decimal:
@@ -125,32 +346,43 @@ class AccountDataAnalyzer(UserAccounts):
             total (Decimal): The total value
         """
         accounts_list = UserAccounts.get_all_accounts(user_id=user_id, **kwargs)
-
-        db_path = os.path.join("data", user_id, "accounts_database.db")
-
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
+        exponents = _amount_exponents(user_id, accounts_list)
 
         total = Decimal(0)
 
-        for account in accounts_list:
-            try:
-                table_name = f"{account.account_name}_{account.account_currency}"
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+
+            if is_consolidated_layout(user_id):
+                account_ids = [account.account_id for account in accounts_list]
                 cur.execute(
-                    TOTAL_QUERY.substitute(table_name=table_name),
-                    (
-                        from_datetime,
-                        to_datetime,
-                        operation_type,
-                    ),
+                    CONSOLIDATED_TOTAL_QUERY.substitute(account_ids=_placeholders(account_ids)),
+                    (*account_ids, epoch_us(from_datetime), epoch_us(to_datetime), operation_type),
                 )
-                parcial = cur.fetchone()["SUM(amount)"]
-                if parcial:
-                    total += Decimal(parcial)
-
-            except sqlite3.OperationalError as e:
-                print(e)  # debugging and develop purposes
+                for row in cur.fetchall():
+                    parcial = row["SUM(amount)"]
+                    if parcial:
+                        total += Decimal(from_minor_units(parcial, exponents[row["account_id"]]))
+                return total
+
+            for account in accounts_list:
+                try:
+                    table_name = f"{account.account_name}_{account.account_currency}"
+                    cur.execute(
+                        build_statement(TOTAL_QUERY, table_name),
+                        (
+                            epoch_us(from_datetime),
+                            epoch_us(to_datetime),
+                            operation_type,
+                        ),
+                    )
+                    parcial = cur.fetchone()["SUM(amount)"]
+                    if parcial:
+                        total += Decimal(from_minor_units(parcial, exponents[account.account_id]))
+
+                except sqlite3.OperationalError as e:
+                    print(e)  # debugging and develop purposes
 
         return total
 
@@ -180,34 +412,53 @@ class AccountDataAnalyzer(UserAccounts):
              subcategory_data (List[Dict]):
                 e.g.: [{'category': <category_name>, 'subcategory': <subcat_name>, 'total': total}, ...]
         """
+        if frame_analytics(user_id):
+            # the frame of the operations of the type is faster than building a row per operation to add them
+            frame = OperationFrame.load(
+                user_id,
+                from_datetime=from_datetime,
+                to_datetime=to_datetime,
+                operation_types=[operation_type],
+                **kwargs,
+            )
+            return OperationDataAnalizer.categorize_flow_operations(
+                frame, from_datetime, to_datetime, operation_type, data_type
+            )
+
         accounts_list = UserAccounts.get_all_accounts(user_id=user_id, **kwargs)
+        exponents = _amount_exponents(user_id, accounts_list)
         all_operations = []
 
-        db_path = os.path.join("data", user_id, "accounts_database.db")
-
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
 
-        for account in accounts_list:
-            try:
-                table_name = f"{account.account_name}_{account.account_currency}"
+            if is_consolidated_layout(user_id):
+                account_ids = [account.account_id for account in accounts_list]
                 cur.execute(
-                    SELECT_QUERY.substitute(table_name=table_name),
-                    (
-                        from_datetime,
-                        to_datetime,
-                        operation_type,
-                    ),
+                    CONSOLIDATED_SELECT_QUERY.substitute(account_ids=_placeholders(account_ids)),
+                    (*account_ids, epoch_us(from_datetime), epoch_us(to_datetime), operation_type),
                 )
-                operations = cur.fetchall()
-                all_operations.extend(operations)
-            except sqlite3.OperationalError as e:
-                print(e)  # debugging and develop purposes
-
-        operation_objects = []
-        for operation in all_operations:
-            operation_objects.append(UserOperations(**operation))
+                all_operations = _operation_rows(cur.fetchall(), exponents)
+            else:
+                for account in accounts_list:
+                    try:
+                        table_name = f"{account.account_name}_{account.account_currency}"
+                        cur.execute(
+                            build_statement(SELECT_QUERY, table_name),
+                            (
+                                epoch_us(from_datetime),
+                                epoch_us(to_datetime),
+                                operation_type,
+                            ),
+                        )
+                        operations = cur.fetchall()
+                        all_operations.extend(OperationRow.from_records(operations, exponents[account.account_id]))
+                    except sqlite3.OperationalError as e:
+                        print(e)  # debugging and develop purposes
+
+        # only the amounts are added: the rows are not validated as models
+        operation_objects = all_operations
 
         # operation_objects.sort(key=lambda operation_objects: operation_objects.operation_datetime)
         # Grouping
@@ -267,32 +518,57 @@ class AccountDataAnalyzer(UserAccounts):
 
         accounts_list = UserAccounts.get_all_accounts(user_id=user_id, **kwargs)
 
-        db_path = os.path.join("data", user_id, "accounts_database.db")
-
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-
-        # A query for listing all existing groups created inside the time window
-        cur.execute("SELECT * FROM operation_groups WHERE created_at BETWEEN ? AND ?", (from_datetime, to_datetime))
-        groups_list = [dict(group)["group_id"] for group in cur.fetchall()]
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            # A query for listing all existing groups created inside the time window
+            cur.execute(
+                "SELECT * FROM operation_groups WHERE created_at BETWEEN ? AND ?", (from_datetime, to_datetime)
+            )
+            groups_list = [dict(group)["group_id"] for group in cur.fetchall()]
 
         # Generate a query for every account table in the time window
         operation_select_for_all_accounts = Template(
-            "SELECT * FROM $acc_table WHERE operation_datetime BETWEEN '$from_dttime' AND '$to_dttime'"
+            "SELECT * FROM $acc_table WHERE operation_ts BETWEEN $from_ts AND $to_ts"
         )
 
-        operations_selects_list = []
-        for account in accounts_list:
-            table_name = f"{account.account_name}_{account.account_currency}"
-            operations_selects_list.append(
+        # integer amounts of currencies with different minor units are scaled to the biggest one to be added in SQL
+        exponents = _amount_exponents(user_id, accounts_list)
+        common_exponent = max((exponent for exponent in exponents.values() if exponent is not None), default=None)
+        factors = {
+            account_id: 1 if exponent is None else 10 ** (common_exponent - exponent)
+            for account_id, exponent in exponents.items()
+        }
+
+        if is_consolidated_layout(user_id):
+            # a single select over the operations table replaces the union of every account table
+            account_ids_by_factor = defaultdict(list)
+            for account in accounts_list:
+                account_ids_by_factor[factors[account.account_id]].append(f"'{account.account_id}'")
+            operation_select_union = " UNION ALL ".join(
                 operation_select_for_all_accounts.substitute(
-                    acc_table=table_name, from_dttime=from_datetime, to_dttime=to_datetime
+                    acc_table=f"(SELECT {_scaled_columns(factor)} FROM operations "
+                    f"WHERE account_id IN ({', '.join(account_ids)}))",
+                    from_ts=epoch_us(from_datetime),
+                    to_ts=epoch_us(to_datetime),
                 )
+                for factor, account_ids in account_ids_by_factor.items()
             )
+        else:
+            operations_selects_list = []
+            for account in accounts_list:
+                table_name = f"{account.account_name}_{account.account_currency}"
+                factor = factors[account.account_id]
+                if factor != 1:
+                    table_name = f"(SELECT {_scaled_columns(factor)} FROM {table_name})"
+                operations_selects_list.append(
+                    operation_select_for_all_accounts.substitute(
+                        acc_table=table_name, from_ts=epoch_us(from_datetime), to_ts=epoch_us(to_datetime)
+                    )
+                )
 
-        # join all queries for every table with a UNION ALL
-        operation_select_union = " UNION ALL ".join(operations_selects_list)
+            # join all queries for every table with a UNION ALL
+            operation_select_union = " UNION ALL ".join(operations_selects_list)
 
         # Generate the part of the query that takes care of filtering by group id
         group_ids = ", ".join([f"'{gid}'" for gid in groups_list])
@@ -383,15 +659,146 @@ class AccountDataAnalyzer(UserAccounts):
               operation_type = '{operation_type}'
             GROUP BY category, subcategory;"""
 
-        if data_type == "category":
-            cur.execute(category_query)
-            data = cur.fetchall()
-            return list(map(dict, data))
-        elif data_type == "subcategory":
-            cur.execute(subcategory_query)
-            data = cur.fetchall()
-            return list(map(dict, data))
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            if data_type == "category":
+                cur.execute(category_query)
+            elif data_type == "subcategory":
+                cur.execute(subcategory_query)
+            else:
+                return None
+            data = [dict(row) for row in cur.fetchall()]
+
+        for row in data:
+            row["total"] = from_minor_units(row["total"], common_exponent)
+        return data
 
 
 class OperationDataAnalizer(UserOperations):
-    pass
+    """
+    The analytics of AccountDataAnalyzer over an OperationFrame: the frame of a period is loaded once (e.g.: with
+    AccountDataAnalyzer.get_operation_frame) and every analytics of the period, or of any part of it, is computed from
+    its arrays without querying the database again. Requires numpy, and the amounts of the decimal storage are rounded
+    to the minor unit in a frame (see opframe.frame_analytics).
+    """
+
+    @classmethod
+    def get_totals_by_period(
+        cls,
+        frame: OperationFrame,
+        from_datetime: Optional[datetime],
+        to_datetime: Optional[datetime],
+        operation_type: str,
+    ) -> Decimal:
+        """
+        Calculates the income/expense total of the operations of a frame in a given period of time.
+        Args:
+            frame (OperationFrame): The operations, e.g.: of all the accounts of a currency
+            from_datetime (datetime, optional): initial datetime, the start of the frame if None
+            to_datetime (datetime, optional): final datetime, the end of the frame if None
+            operation_type (str): 'income'/'expense'
+        Returns:
+            total (Decimal): The total value
+        """
+        return frame.filter(from_datetime, to_datetime, operation_types=[operation_type]).total()
+
+    @classmethod
+    def get_totals_by_month(cls, frame: OperationFrame, operation_type: str) -> List[Dict]:
+        """
+        Calculates the income/expense total of every month (UTC) of the operations of a frame.
+        Args:
+            frame (OperationFrame): The operations, e.g.: of all the accounts of a currency
+            operation_type (str): 'income'/'expense'
+        Returns:
+            month_data (List[Dict]): e.g.: [{'month': date(2026, 10, 1), 'total': total}, ...], only the months with
+                operations
+        """
+        return frame.filter(operation_types=[operation_type]).group_totals("month")
+
+    @classmethod
+    def categorize_flow_operations(
+        cls,
+        frame: OperationFrame,
+        from_datetime: Optional[datetime],
+        to_datetime: Optional[datetime],
+        operation_type: str,
+        data_type: str,
+    ) -> Optional[List[Dict]]:
+        """
+        Groups the operations of a frame in a given period of time by category or by category and subcategory adding
+        their amounts, as AccountDataAnalyzer.categorize_flow_operations.
+        Args:
+            frame (OperationFrame): The operations, e.g.: of all the accounts of a currency
+            from_datetime (datetime, optional): initial datetime, the start of the frame if None
+            to_datetime (datetime, optional): final datetime, the end of the frame if None
+            operation_type (str): 'income'/'expense'
+            data_type (str): 'category'/'subcategory'
+        Returns:
+             category_data (List[Dict]): e.g.: [{'category': <category_name>, 'total': total}, ...]
+             subcategory_data (List[Dict]):
+                e.g.: [{'category': <category_name>, 'subcategory': <subcat_name>, 'total': total}, ...]
+        """
+        if data_type not in DATA_TYPE_KEYS:
+            return None
+        operations = frame.filter(from_datetime, to_datetime, operation_types=[operation_type])
+        return operations.group_totals(*DATA_TYPE_KEYS[data_type])
+
+    @classmethod
+    def categorize_net_operations(
+        cls,
+        frame: OperationFrame,
+        user_id: str,
+        from_datetime: datetime,
+        to_datetime: datetime,
+        operation_type: str,
+        data_type: str,
+    ) -> Optional[List[Dict]]:
+        """
+        Groups the operations of a frame in a given period of time by category or by category and subcategory adding
+        their amounts, netting the operations of every group as AccountDataAnalyzer.categorize_net_operations.
+        Args:
+            frame (OperationFrame): The operations, e.g.: of all the accounts of a currency
+            user_id (str): The unique identifier for the user, to read the groups
+            from_datetime (datetime): initial datetime
+            to_datetime (datetime): final datetime
+            operation_type (str): 'income'/'expense'
+            data_type (str): 'category'/'subcategory'
+        Returns:
+             category_data (List[Dict]): e.g.: [{'category': <category_name>, 'total': total}, ...]
+             subcategory_data (List[Dict]):
+                e.g.: [{'category': <category_name>, 'subcategory': <subcat_name>, 'total': total}, ...]
+        """
+        if data_type not in DATA_TYPE_KEYS:
+            return None
+        keys = DATA_TYPE_KEYS[data_type]
+
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            # the groups created inside the time window, with the category their operations are added to
+            cur.execute(
+                "SELECT group_id, category, subcategory FROM operation_groups WHERE created_at BETWEEN ? AND ?",
+                (from_datetime, to_datetime),
+            )
+            groups = {group["group_id"]: group for group in cur.fetchall()}
+
+        operations = frame.filter(from_datetime, to_datetime)
+        totals = defaultdict(Decimal)
+        for row in operations.filter(operation_types=[operation_type], group_ids=[None]).group_totals(*keys):
+            totals[tuple(row[key] for key in keys)] += row["total"]
+
+        # the operations of a group add up to a single net income or net expense, the transfers are not added
+        signs = {"income": 1, "expense": -1}
+        net_totals = defaultdict(Decimal)
+        for row in operations.filter(group_ids=groups).group_totals("group_id", "operation_type"):
+            net_totals[row["group_id"]] += signs.get(row["operation_type"], 0) * row["total"]
+        for group_id, net_total in net_totals.items():
+            if ("income" if net_total >= 0 else "expense") == operation_type:
+                totals[tuple(groups[group_id][key] for key in keys)] += abs(net_total)
+
+        # sorted as the GROUP BY of the query: None first
+        return [
+            dict(zip(keys, key), total=total)
+            for key, total in sorted(totals.items(), key=lambda item: [(v is not None, v or "") for v in item[0]])
+        ]
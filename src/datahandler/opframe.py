@@ -0,0 +1,371 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the columnar analytics of the operations.
+
+An OperationFrame holds the operations of one or more accounts as NumPy column arrays: int64 amounts in minor units
+of a common exponent, int64 epoch timestamps (microseconds, as stored in operation_ts), int8 operation type codes
+and dictionary-encoded category, subcategory and group ids. Filters, time buckets and group-by totals run as
+vectorized array operations, so the analytics over years of history don't build a Python object per operation.
+
+numpy is an optional dependency: the rest of the app works without it, only loading a frame requires it. The
+analytics of the datahandler module use a frame if frame_analytics returns True, and their queries otherwise: the
+amounts of the decimal storage are rounded to the minor unit in a frame, so its totals could differ from the exact
+ones of the queries.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from string import Template
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+FRAME_AVAILABLE = np is not None
+
+from src.models.accmodel import UserAccounts
+from src.dbhandler.balanceindex import COEFF
+from src.dbhandler.dbhandler import get_connection, uses_minor_units_storage
+from src.dbhandler.money import minor_unit_exponent
+from src.dbhandler.statements import build_statement
+from src.dbhandler.tableresolver import resolve_table_name
+from src.dbhandler.timestamps import epoch_us
+
+OPERATION_TYPES = ("income", "expense", "transfer_in", "transfer_out")
+# sign of every operation type, by code
+COEFFS = tuple(COEFF[operation_type] for operation_type in OPERATION_TYPES)
+
+# numpy datetime64 unit of every time bucket
+PERIODS = {"day": "D", "month": "M", "year": "Y"}
+
+FRAME_QUERY = """
+    SELECT
+      operation_ts,
+      {amount} AS amount,
+      operation_type,
+      category,
+      subcategory,
+      group_id
+    FROM
+      $table_name
+    WHERE
+      operation_ts >= ?
+    AND
+      operation_ts <= ?
+    """
+
+# by storage, True for minor units: the amounts are multiplied by a bound factor, the minor units are scaled to the
+# common exponent and the decimals are rounded to it, losing the digits below the minor unit
+FRAME_QUERIES = {
+    True: Template(FRAME_QUERY.format(amount="amount * ?")),
+    False: Template(FRAME_QUERY.format(amount="CAST(ROUND(amount * ?) AS INTEGER)")),
+}
+
+
+def frame_analytics(user_id: str) -> bool:
+    """
+    Returns True if the analytics of a user can run on an OperationFrame: numpy is installed and the database stores
+    integer minor units, which the frame holds exactly.
+    """
+    return FRAME_AVAILABLE and uses_minor_units_storage(user_id)
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("OperationFrame requires numpy, install it with: pip install numpy")
+
+
+def _dictionary(values: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """Returns the sorted distinct values of a column, None first, so the codes keep the order of the values"""
+    distinct = set(values)
+    return ([None] if None in distinct else []) + sorted(distinct - {None})
+
+
+class OperationFrame:
+    """
+    Operations of one or more accounts as column arrays, all of the same length.
+
+    Args:
+        accounts (List[UserAccounts]): The accounts of the frame, account_codes index this list.
+        exponent (int): Number of decimals of the amounts, the largest minor unit exponent of the accounts currencies.
+        account_codes (np.ndarray): int16 index of the account of every operation.
+        amounts (np.ndarray): int64 unsigned amounts in minor units of exponent, e.g.: 1234 for 12.34 with exponent 2.
+        timestamps (np.ndarray): int64 operation_ts, microseconds since the epoch in UTC.
+        type_codes (np.ndarray): int8 index in OPERATION_TYPES.
+        category_codes (np.ndarray): int32 index in categories.
+        subcategory_codes (np.ndarray): int32 index in subcategories.
+        group_codes (np.ndarray): int32 index in groups.
+        categories (List[Optional[str]]): Sorted distinct categories, None first.
+        subcategories (List[Optional[str]]): Sorted distinct subcategories, None first.
+        groups (List[Optional[str]]): Sorted distinct group ids, None first for the operations without group.
+    """
+
+    def __init__(
+        self,
+        accounts: List[UserAccounts],
+        exponent: int,
+        account_codes: "np.ndarray",
+        amounts: "np.ndarray",
+        timestamps: "np.ndarray",
+        type_codes: "np.ndarray",
+        category_codes: "np.ndarray",
+        subcategory_codes: "np.ndarray",
+        group_codes: "np.ndarray",
+        categories: List[Optional[str]],
+        subcategories: List[Optional[str]],
+        groups: List[Optional[str]],
+    ) -> None:
+        self.accounts = accounts
+        self.exponent = exponent
+        self.account_codes = account_codes
+        self.amounts = amounts
+        self.timestamps = timestamps
+        self.type_codes = type_codes
+        self.category_codes = category_codes
+        self.subcategory_codes = subcategory_codes
+        self.group_codes = group_codes
+        self.categories = categories
+        self.subcategories = subcategories
+        self.groups = groups
+
+    @classmethod
+    def load(
+        cls,
+        user_id: str,
+        account_ids: Optional[Sequence[str]] = None,
+        from_datetime: Optional[datetime] = None,
+        to_datetime: Optional[datetime] = None,
+        operation_types: Optional[Sequence[str]] = None,
+        **kwargs: int | str,
+    ) -> "OperationFrame":
+        """
+        Loads the operations of the accounts of a user in a given period of time.
+
+        The amounts are converted to integers in SQL: the minor units storage is scaled to the common exponent and the
+        decimal storage is rounded to it.
+
+        Args:
+            user_id (str): The unique identifier for the user.
+            account_ids (Sequence[str], optional): The accounts to load. Defaults to every account matching kwargs.
+            from_datetime (datetime, optional): initial datetime, included.
+            to_datetime (datetime, optional): final datetime, included.
+            operation_types (Sequence[str], optional): The operation types to load, e.g.: ["income"]. Defaults to all.
+            **kwargs (int | str): 'is_active', 'currency', as in UserAccounts.get_all_accounts.
+        Returns:
+            OperationFrame: The frame, in no particular order of the operations.
+        """
+        _require_numpy()
+        accounts = UserAccounts.get_all_accounts(user_id=user_id, **kwargs)
+        if account_ids is not None:
+            wanted = set(account_ids)
+            accounts = [account for account in accounts if account.account_id in wanted]
+
+        exponents = [minor_unit_exponent(account.account_currency) for account in accounts]
+        exponent = max(exponents, default=2)
+        from_ts = epoch_us(from_datetime) if from_datetime is not None else -(2**63)
+        to_ts = epoch_us(to_datetime) if to_datetime is not None else 2**63 - 1
+        type_condition = ""
+        type_params: Tuple[str, ...] = ()
+        if operation_types is not None:
+            type_params = tuple(operation_types)
+            type_condition = f" AND operation_type IN ({', '.join('?' * len(type_params))})"
+
+        # the records of every account, in the order of accounts
+        columns: List[List[Tuple]] = []
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = None
+            minor_units = uses_minor_units_storage(user_id)
+            for account, account_exponent in zip(accounts, exponents):
+                factor = 10 ** (exponent - account_exponent) if minor_units else 10**exponent
+                # the accounts of the consolidated layout keep a view with the name of their table
+                table_name = resolve_table_name(user_id, account.account_id, cur)
+                cur.execute(
+                    build_statement(FRAME_QUERIES[minor_units], table_name) + type_condition,
+                    (factor, from_ts, to_ts, *type_params),
+                )
+                columns.append(cur.fetchall())
+
+        return cls._from_records(accounts, exponent, columns)
+
+    @classmethod
+    def _from_records(cls, accounts: List[UserAccounts], exponent: int, columns: List[List[Tuple]]) -> "OperationFrame":
+        """Builds the column arrays from the records of every account"""
+        records = [record for account_records in columns for record in account_records]
+        count = len(records)
+        if count:
+            timestamps, amounts, operation_types, categories, subcategories, group_ids = zip(*records)
+        else:
+            timestamps = amounts = operation_types = categories = subcategories = group_ids = ()
+
+        category_dictionary = _dictionary(categories)
+        subcategory_dictionary = _dictionary(subcategories)
+        group_dictionary = _dictionary(group_ids)
+        type_index = {operation_type: code for code, operation_type in enumerate(OPERATION_TYPES)}
+        category_index = {category: code for code, category in enumerate(category_dictionary)}
+        subcategory_index = {subcategory: code for code, subcategory in enumerate(subcategory_dictionary)}
+        group_index = {group_id: code for code, group_id in enumerate(group_dictionary)}
+
+        return cls(
+            accounts=accounts,
+            exponent=exponent,
+            account_codes=np.repeat(
+                np.arange(len(columns), dtype=np.int16), [len(account_records) for account_records in columns]
+            ),
+            amounts=np.fromiter(amounts, dtype=np.int64, count=count),
+            timestamps=np.fromiter(timestamps, dtype=np.int64, count=count),
+            type_codes=np.fromiter(map(type_index.__getitem__, operation_types), dtype=np.int8, count=count),
+            category_codes=np.fromiter(map(category_index.__getitem__, categories), dtype=np.int32, count=count),
+            subcategory_codes=np.fromiter(
+                map(subcategory_index.__getitem__, subcategories), dtype=np.int32, count=count
+            ),
+            group_codes=np.fromiter(map(group_index.__getitem__, group_ids), dtype=np.int32, count=count),
+            categories=category_dictionary,
+            subcategories=subcategory_dictionary,
+            groups=group_dictionary,
+        )
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    @property
+    def signed_amounts(self) -> "np.ndarray":
+        """Amounts with the sign of their operation type: positive for incomes and negative for expenses"""
+        return self.amounts * np.array(COEFFS, dtype=np.int64)[self.type_codes]
+
+    def to_amount(self, value: int) -> Decimal:
+        """Converts an integer total of the frame to Decimal, e.g.: 1234 -> Decimal('12.34') with exponent 2"""
+        return Decimal(int(value)).scaleb(-self.exponent)
+
+    def take(self, selection: "np.ndarray") -> "OperationFrame":
+        """Returns a frame with the operations of a boolean mask or an array of positions, with the same dictionaries"""
+        return OperationFrame(
+            accounts=self.accounts,
+            exponent=self.exponent,
+            account_codes=self.account_codes[selection],
+            amounts=self.amounts[selection],
+            timestamps=self.timestamps[selection],
+            type_codes=self.type_codes[selection],
+            category_codes=self.category_codes[selection],
+            subcategory_codes=self.subcategory_codes[selection],
+            group_codes=self.group_codes[selection],
+            categories=self.categories,
+            subcategories=self.subcategories,
+            groups=self.groups,
+        )
+
+    def filter(
+        self,
+        from_datetime: Optional[datetime] = None,
+        to_datetime: Optional[datetime] = None,
+        operation_types: Optional[Iterable[str]] = None,
+        categories: Optional[Iterable[Optional[str]]] = None,
+        account_ids: Optional[Iterable[str]] = None,
+        group_ids: Optional[Iterable[Optional[str]]] = None,
+    ) -> "OperationFrame":
+        """
+        Returns a frame with the operations matching every given condition.
+
+        Args:
+            from_datetime (datetime, optional): initial datetime, included.
+            to_datetime (datetime, optional): final datetime, included.
+            operation_types (Iterable[str], optional): e.g.: ["income", "transfer_in"].
+            categories (Iterable[str], optional): Categories to keep, None for the operations without category.
+            account_ids (Iterable[str], optional): Accounts to keep.
+            group_ids (Iterable[str], optional): Groups to keep, None for the operations without group.
+        Returns:
+            OperationFrame: The filtered frame.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if from_datetime is not None:
+            mask &= self.timestamps >= epoch_us(from_datetime)
+        if to_datetime is not None:
+            mask &= self.timestamps <= epoch_us(to_datetime)
+        if operation_types is not None:
+            codes = [OPERATION_TYPES.index(operation_type) for operation_type in operation_types]
+            mask &= np.isin(self.type_codes, codes)
+        if categories is not None:
+            wanted = set(categories)
+            codes = [code for code, category in enumerate(self.categories) if category in wanted]
+            mask &= np.isin(self.category_codes, codes)
+        if account_ids is not None:
+            wanted = set(account_ids)
+            codes = [code for code, account in enumerate(self.accounts) if account.account_id in wanted]
+            mask &= np.isin(self.account_codes, codes)
+        if group_ids is not None:
+            wanted = set(group_ids)
+            codes = [code for code, group_id in enumerate(self.groups) if group_id in wanted]
+            mask &= np.isin(self.group_codes, codes)
+        return self.take(mask)
+
+    def buckets(self, period: str) -> "np.ndarray":
+        """Returns the UTC day, month or year of every operation as a numpy datetime64 array"""
+        return self.timestamps.astype("datetime64[us]").astype(f"datetime64[{PERIODS[period]}]")
+
+    def _key(self, key: str) -> Tuple["np.ndarray", Callable[[int], Any]]:
+        """Returns the int64 codes of a group key and the function that decodes a code into its value"""
+        if key == "category":
+            return self.category_codes.astype(np.int64), self.categories.__getitem__
+        if key == "subcategory":
+            return self.subcategory_codes.astype(np.int64), self.subcategories.__getitem__
+        if key == "operation_type":
+            return self.type_codes.astype(np.int64), OPERATION_TYPES.__getitem__
+        if key == "group_id":
+            return self.group_codes.astype(np.int64), self.groups.__getitem__
+        if key == "account_id":
+            return self.account_codes.astype(np.int64), lambda code: self.accounts[code].account_id
+        if key in PERIODS:
+            unit = PERIODS[key]
+            buckets = self.buckets(key).astype(np.int64)
+            start = int(buckets.min()) if len(buckets) else 0
+            return buckets - start, lambda code: np.datetime64(start + code, unit).astype(object)
+        raise ValueError(f"Unknown group key: {key}")
+
+    def group_totals(self, *keys: str, signed: bool = False) -> List[Dict]:
+        """
+        Adds the amounts of the operations grouped by one or more keys.
+
+        Args:
+            *keys (str): 'category', 'subcategory', 'operation_type', 'group_id', 'account_id', 'day', 'month' or
+                'year'. The time buckets are returned as dates, e.g.: date(2026, 10, 1) for October 2026.
+            signed (bool, optional): True to add the incomes and subtract the expenses.
+        Returns:
+            List[Dict]: One dict per group sorted by the keys, e.g.: [{'month': date(2026, 10, 1), 'category':
+                'Food', 'total': Decimal('12.34')}, ...]
+        """
+        amounts = self.signed_amounts if signed else self.amounts
+        if not len(self):
+            return []
+
+        # a single int64 code per operation with the codes of every key as digits of mixed radix
+        decoders = []
+        combined = np.zeros(len(self), dtype=np.int64)
+        for key in keys:
+            codes, decode = self._key(key)
+            radix = int(codes.max()) + 1
+            combined = combined * radix + codes
+            decoders.append((key, radix, decode))
+
+        order = np.argsort(combined, kind="stable")
+        ordered = combined[order]
+        starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+        totals = np.add.reduceat(amounts[order], starts)
+
+        groups = []
+        for code, total in zip(ordered[starts].tolist(), totals.tolist()):
+            group = {}
+            for key, radix, decode in reversed(decoders):
+                code, key_code = divmod(code, radix)
+                group[key] = decode(key_code)
+            group = {key: group[key] for key in keys}
+            group["total"] = self.to_amount(total)
+            groups.append(group)
+        return groups
+
+    def total(self, signed: bool = False) -> Decimal:
+        """Returns the sum of the amounts, of the signed amounts if signed is True"""
+        amounts = self.signed_amounts if signed else self.amounts
+        return self.to_amount(amounts.sum())
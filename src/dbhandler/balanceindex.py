@@ -0,0 +1,308 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the optional in-memory balance index of the accounts.
+
+The running balance of an account is the prefix sum of the signed amounts of its operations sorted by
+(operation_ts, created_at). The handlers check that a change never makes it negative. With ACC_BALANCE_INDEX=1 every
+account gets, on its first check, an index built from its operations table: a treap keyed by the operation position
+where every node keeps the sum of the amounts of its subtree and the minimum running balance inside it. Prefix
+balances, range minimums of the running balance, insertions, deletions and moves are O(log n), so validating a change
+never scans the later history.
+
+The index is kept in sync by the write methods of the operations model, and dropped by the account model and the CSV
+importer, which write without them. It only sees the writes of this process.
+
+This module is intended to be used by the models and the handlers and not directly.
+"""
+
+import os
+import random
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.dbhandler.dbhandler import get_connection, uses_minor_units_storage
+from src.dbhandler.money import amount_from_db, minor_unit_exponent
+from src.dbhandler.tableresolver import resolve_account_currency, resolve_table_name
+from src.dbhandler.timestamps import epoch_us
+
+BALANCE_INDEX = os.getenv("ACC_BALANCE_INDEX", "0") == "1"
+
+# sign of every operation type in the account total, used by the balance indexes, the models and the handlers
+COEFF = {"income": 1, "expense": -1, "transfer_in": 1, "transfer_out": -1}
+# sorts after every operation_id, so (operation_ts, created_at, LAST_ID) is after every operation at that position
+LAST_ID = "\U0010ffff"
+
+# (operation_ts, created_at, operation_id)
+Key = Tuple[int, str, str]
+
+# own generator for the node priorities, so the index doesn't consume the state of the global one
+_priorities = random.Random()
+
+
+class _Node:
+    __slots__ = ("key", "amount", "priority", "left", "right", "total", "low")
+
+    def __init__(self, key: Key, amount: Decimal) -> None:
+        self.key = key
+        self.amount = amount
+        self.priority = _priorities.random()
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+        self.total = amount
+        self.low = amount
+
+
+def _update(node: _Node) -> None:
+    """Recalculates the sum of the subtree amounts and the minimum running balance inside the subtree"""
+    left, right = node.left, node.right
+    balance = (left.total if left else 0) + node.amount
+    low = min(left.low, balance) if left else balance
+    if right:
+        node.total = balance + right.total
+        node.low = min(low, balance + right.low)
+    else:
+        node.total = balance
+        node.low = low
+
+
+def _split(node: Optional[_Node], key: tuple) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """Splits a treap into the nodes with keys lower than key and the nodes with keys greater or equal"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _update(node)
+    return left, node
+
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    """Merges two treaps where every key of left is lower than every key of right"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def position_key(operation_datetime: datetime, created_at: Optional[datetime | str]) -> Tuple[int, Optional[str]]:
+    """Returns the (operation_ts, created_at) sort key of a position, with created_at as it is stored"""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    return epoch_us(operation_datetime), created_at
+
+
+class BalanceIndex:
+    """
+    Running balance index of one account.
+
+    Args:
+        entries (Iterable): (operation_id, operation_ts, created_at, signed amount) of every operation, sorted by
+            (operation_ts, created_at).
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, int, str, Decimal]]) -> None:
+        self.lock = threading.Lock()
+        # operation_id -> (key, signed amount)
+        self.operations: Dict[str, Tuple[Key, Decimal]] = {}
+        self.root: Optional[_Node] = None
+
+        # linear time build of a treap from sorted keys: the rightmost path is kept in a stack
+        stack: List[_Node] = []
+        for operation_id, operation_ts, created_at, amount in entries:
+            key = (operation_ts, created_at, operation_id)
+            self.operations[operation_id] = (key, amount)
+            node = _Node(key, amount)
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        if stack:
+            self.root = stack[0]
+            self._update_all(self.root)
+
+    @staticmethod
+    def _update_all(root: _Node) -> None:
+        """Calculates the aggregates of every node, children first"""
+        order = []
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            pending.extend(child for child in (node.left, node.right) if child is not None)
+        for node in reversed(order):
+            _update(node)
+
+    def cumulative_bounds(self, position: Tuple[int, str]) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        """
+        Returns the running balance of the last operation up to a position and the minimum running balance of the
+        operations after it, None if there is no operation before or after the position respectively.
+        """
+        with self.lock:
+            left, right = _split(self.root, position + (LAST_ID,))
+            previus_amount = left.total if left else None
+            min_amount = None
+            if right:
+                min_amount = (left.total if left else 0) + right.low
+            self.root = _merge(left, right)
+        return previus_amount, min_amount
+
+    def min_cumulative_between(self, after: Tuple[int, str], before: Tuple[int, str]) -> Optional[Decimal]:
+        """Returns the minimum running balance of the operations between two positions (both excluded)"""
+        with self.lock:
+            left, right = _split(self.root, after + (LAST_ID,))
+            middle, right = _split(right, before)
+            min_amount = None
+            if middle:
+                min_amount = (left.total if left else 0) + middle.low
+            self.root = _merge(_merge(left, middle), right)
+        return min_amount
+
+    def first_below(self, after: Tuple[int, str], before: Optional[Tuple[int, str]], amount: Decimal) -> Optional[str]:
+        """
+        Returns the operation_id of the first operation between two positions (both excluded, no end if before is
+        None) whose running balance is lower than amount, or None if there is no such operation.
+        """
+        with self.lock:
+            left, right = _split(self.root, after + (LAST_ID,))
+            middle, right = (right, None) if before is None else _split(right, before)
+            operation_id = None
+            balance = left.total if left else 0
+            node = middle
+            if node is not None and balance + node.low < amount:
+                # descend towards the first node where the running balance drops below amount
+                while node is not None:
+                    if node.left is not None and balance + node.left.low < amount:
+                        node = node.left
+                        continue
+                    balance += node.left.total if node.left is not None else 0
+                    balance += node.amount
+                    if balance < amount:
+                        operation_id = node.key[2]
+                        break
+                    node = node.right
+            self.root = _merge(_merge(left, middle), right)
+        return operation_id
+
+    def upsert(self, operation_id: str, amount: Decimal, operation_ts: int, created_at: Optional[str] = None) -> bool:
+        """
+        Inserts an operation or updates its amount and datetime. The created_at of an existing operation can be
+        omitted, it never changes.
+
+        Returns:
+            bool: False if the operation is not in the index and has no created_at, so it can't be placed.
+        """
+        with self.lock:
+            current = self.operations.get(operation_id)
+            if created_at is None:
+                if current is None:
+                    return False
+                created_at = current[0][1]
+            key = (operation_ts, created_at, operation_id)
+            if current == (key, amount):
+                return True
+            if current is not None:
+                self._remove(current[0])
+            self.operations[operation_id] = (key, amount)
+            left, right = _split(self.root, key)
+            self.root = _merge(_merge(left, _Node(key, amount)), right)
+        return True
+
+    def remove(self, operation_id: str) -> None:
+        """Removes an operation from the index"""
+        with self.lock:
+            current = self.operations.pop(operation_id, None)
+            if current is not None:
+                self._remove(current[0])
+
+    def _remove(self, key: Key) -> None:
+        left, right = _split(self.root, key)
+        _, right = _split(right, key + ("",))
+        self.root = _merge(left, right)
+
+
+_indexes: Dict[Tuple[str, str], BalanceIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _load_entries(user_id: str, account_id: str) -> List[Tuple[str, int, str, Decimal]]:
+    """Fetches the signed amounts of every operation of an account, sorted by position"""
+    with get_connection(user_id) as conn:
+        cur = conn.cursor()
+        table_name = resolve_table_name(user_id, account_id, cur)
+        exponent = None
+        if uses_minor_units_storage(user_id):
+            exponent = minor_unit_exponent(resolve_account_currency(user_id, account_id, cur))
+        # the index sorts by the whole key, so the operation_id breaks the ties
+        cur.execute(
+            f"""
+            SELECT operation_id, operation_ts, COALESCE(created_at, '') AS created_at, amount, operation_type
+            FROM {table_name}
+            ORDER BY operation_ts, created_at, operation_id;
+            """
+        )
+        records = cur.fetchall()
+
+    return [
+        (operation_id, operation_ts, created_at, COEFF[operation_type] * amount_from_db(amount, exponent))
+        for operation_id, operation_ts, created_at, amount, operation_type in records
+    ]
+
+
+def get_balance_index(user_id: str, account_id: str) -> BalanceIndex:
+    """
+    Returns the balance index of an account, building it from its operations table on first use.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+        account_id (str): The unique identifier for the account.
+    Returns:
+        BalanceIndex: The index of the account.
+    """
+    key = (user_id, account_id)
+    with _indexes_lock:
+        index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    index = BalanceIndex(_load_entries(user_id, account_id))
+    with _indexes_lock:
+        # another thread could have built it in the meantime
+        return _indexes.setdefault(key, index)
+
+
+def loaded_balance_index(user_id: str, account_id: str) -> Optional[BalanceIndex]:
+    """Returns the balance index of an account only if it is already built, e.g.: to keep it in sync after a write"""
+    with _indexes_lock:
+        return _indexes.get((user_id, account_id))
+
+
+def invalidate_balance_index(user_id: str, account_id: Optional[str] = None) -> None:
+    """
+    Drops the balance index of a given account, or of every account of the user if no account_id is provided. It is
+    built again on its next use.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+        account_id (str, optional): The unique identifier for the account.
+    """
+    with _indexes_lock:
+        if account_id is not None:
+            _indexes.pop((user_id, account_id), None)
+            return
+        for key in [key for key in _indexes if key[0] == user_id]:
+            del _indexes[key]
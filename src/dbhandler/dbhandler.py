@@ -0,0 +1,326 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the connections to the accounts databases.
+
+Every user database gets one ConnectionManager holding a bounded pool of sqlite3 connections that are kept open
+between calls, so the models don't pay the connect, schema parse and page cache warmup costs on every query.
+A connection is pinned to the thread that acquired it until that thread releases it, and nested acquisitions from
+the same thread reuse that same connection, so one backend action runs on one connection. The pending schema
+migrations are applied on the first connection to every database.
+
+Every new connection gets the PRAGMA_PROFILE applied: WAL journaling (readers don't block while a long recompute is
+writing and commits don't wait for a full fsync), synchronous=NORMAL, memory mapped I/O, a bigger page cache and
+in-memory temp tables. Each value can be overridden with an environment variable and the whole profile can be turned
+off with ACC_DATABASE_TUNING=0.
+
+This module is intended to be used by the models and not directly.
+"""
+
+import os
+import re
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from src.dbhandler.migrations import migrate
+from src.dbhandler.layout import CONSOLIDATED, is_consolidated, consolidate_operations_tables
+from src.dbhandler.money import MINOR_UNITS, uses_minor_units, convert_amounts_to_minor_units
+
+POOL_SIZE = int(os.getenv("ACC_DATABASE_POOL_SIZE", "4"))
+POOL_TIMEOUT = float(os.getenv("ACC_DATABASE_POOL_TIMEOUT", "30"))
+# prepared statements kept by every connection: sqlite3 defaults to 128, which is less than the statements of a few
+# dozen accounts (see the statements module)
+CACHED_STATEMENTS = int(os.getenv("ACC_DATABASE_CACHED_STATEMENTS", "512"))
+
+TUNING = os.getenv("ACC_DATABASE_TUNING", "1") != "0"
+PRAGMA_PROFILE = {
+    "journal_mode": os.getenv("ACC_DATABASE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("ACC_DATABASE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": os.getenv("ACC_DATABASE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "cache_size": os.getenv("ACC_DATABASE_CACHE_SIZE", "-16000"),  # negative values are KiB: 16MB
+    "temp_store": os.getenv("ACC_DATABASE_TEMP_STORE", "MEMORY"),
+}
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection of the pool is released in time by the other threads"""
+
+
+class PoolClosedError(Exception):
+    """Raised when attempting to use a connection manager that was already shut down"""
+
+
+class InvalidPragmaError(Exception):
+    """Raised when a value of the pragma profile is not a plain word or number"""
+
+
+def acc_db_path(user_id: str, database_name: str = "accounts_database.db") -> str:
+    """
+    Stablishes the path for the accounts database of a given user. The ACC_DATABASE_NAME environment variable
+    overrides it.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+        database_name (str, optional): The name of the database. Defaults to "accounts_database.db".
+    Returns:
+        str: The path of the database.
+    """
+    return os.getenv("ACC_DATABASE_NAME", os.path.join("data", user_id, database_name))
+
+
+def apply_pragmas(conn: sqlite3.Connection, profile: Dict[str, str]) -> None:
+    """
+    Applies a pragma profile to a connection.
+
+    Args:
+        conn (sqlite3.Connection): The connection to tune.
+        profile (dict): Pragma names and their values, e.g.: {"synchronous": "NORMAL"}.
+    """
+    for pragma, value in profile.items():
+        # pragmas can't be parametrized, so names and values are validated before formatting them into the query
+        if not re.match(r"^[a-zA-Z_]+$", pragma) or not re.match(r"^-?[a-zA-Z0-9_]+$", str(value)):
+            raise InvalidPragmaError(f"{pragma}={value}")
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+def connect(db_path: str, tuning: bool = TUNING) -> sqlite3.Connection:
+    """
+    Opens a new connection to the database in autocommit mode: transactions are handled explicitly with
+    ConnectionManager.transaction. The foreign keys are enforced on every connection, e.g.: deleting a group sets the
+    group_id of its operations to NULL.
+
+    Args:
+        db_path (str): The path of the database.
+        tuning (bool, optional): Applies the PRAGMA_PROFILE if True. Defaults to the ACC_DATABASE_TUNING setting.
+    Returns:
+        sqlite3.Connection: The new connection.
+    """
+    conn = sqlite3.connect(
+        db_path, isolation_level=None, check_same_thread=False, cached_statements=CACHED_STATEMENTS
+    )
+    # it can't be changed inside a transaction, so it is set once for the whole life of the connection
+    conn.execute("PRAGMA foreign_keys = ON")
+    if tuning:
+        apply_pragmas(conn, PRAGMA_PROFILE)
+    return conn
+
+
+class ConnectionManager:
+    """
+    ConnectionManager: Bounded pool of connections to a single database.
+
+    Args:
+        db_path (str): The path of the database.
+        pool_size (int, optional): Maximum number of connections open at the same time.
+        timeout (float, optional): Seconds to wait for a free connection before raising PoolTimeoutError.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle: List[sqlite3.Connection] = []
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        self._setup_lock = threading.Lock()
+        self._setup_done = False
+        self.consolidated = False
+        self.minor_units = False
+
+    def _setup(self, conn: sqlite3.Connection) -> None:
+        """Brings the schema of the database up to date and detects its storage layout, once per database."""
+        with self._setup_lock:
+            if self._setup_done:
+                return
+            migrate(conn)
+            if CONSOLIDATED and not is_consolidated(conn):
+                consolidate_operations_tables(conn)
+            self.consolidated = is_consolidated(conn)
+            if MINOR_UNITS and not uses_minor_units(conn):
+                convert_amounts_to_minor_units(conn, self.consolidated)
+            self.minor_units = uses_minor_units(conn)
+            self._setup_done = True
+
+    def _checkout(self) -> sqlite3.Connection:
+        """Takes an idle connection from the pool or opens a new one if there is a free slot."""
+        if self._closed:
+            raise PoolClosedError
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = connect(self.db_path)
+        except BaseException:
+            self._slots.release()
+            raise
+        if not self._setup_done:
+            try:
+                self._setup(conn)
+            except BaseException:
+                self._checkin(conn)
+                raise
+        return conn
+
+    def _checkin(self, conn: sqlite3.Connection) -> None:
+        """Gives the connection back to the pool, discarding any unfinished transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if self._closed:
+                    conn.close()
+                else:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yields the connection pinned to the current thread, checking one out of the pool if the thread has none.
+        The connection goes back to the pool when the outermost block of the thread exits.
+        """
+        local = self._local
+        if getattr(local, "conn", None) is not None:
+            yield local.conn
+            return
+
+        conn = self._checkout()
+        local.conn = conn
+        try:
+            yield conn
+        finally:
+            local.conn = None
+            self._checkin(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yields the connection of the current thread inside a transaction that is committed when the block exits and
+        rolled back if it raises. Nested blocks run inside a savepoint of the outer transaction.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                self._local.depth = getattr(self._local, "depth", 0) + 1
+                savepoint = f"sp_{self._local.depth}"
+                conn.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute(f"ROLLBACK TO {savepoint}")
+                    conn.execute(f"RELEASE {savepoint}")
+                    raise
+                else:
+                    conn.execute(f"RELEASE {savepoint}")
+                finally:
+                    self._local.depth -= 1
+                return
+
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def close(self) -> None:
+        """Closes every idle connection. Connections in use are closed when they are released."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(user_id: str, database_name: str = "accounts_database.db") -> ConnectionManager:
+    """
+    Returns the ConnectionManager of the accounts database of a given user, creating it on first use.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+        database_name (str, optional): The name of the database. Defaults to "accounts_database.db".
+    Returns:
+        ConnectionManager: The connection manager for that database.
+    """
+    db_path = acc_db_path(user_id, database_name)
+    with _managers_lock:
+        manager = _managers.get(db_path)
+        if manager is None:
+            manager = _managers[db_path] = ConnectionManager(db_path)
+    return manager
+
+
+def get_connection(user_id: str, database_name: str = "accounts_database.db"):
+    """Shortcut for get_manager(user_id).connection()"""
+    return get_manager(user_id, database_name).connection()
+
+
+def get_transaction(user_id: str, database_name: str = "accounts_database.db"):
+    """Shortcut for get_manager(user_id).transaction()"""
+    return get_manager(user_id, database_name).transaction()
+
+
+def is_consolidated_layout(user_id: str) -> bool:
+    """
+    Returns True if the accounts database of a given user stores all the operations in the consolidated
+    'operations' table (see the layout module).
+
+    Args:
+        user_id (str): The unique identifier for the user.
+    """
+    manager = get_manager(user_id)
+    with manager.connection():
+        return manager.consolidated
+
+
+def uses_minor_units_storage(user_id: str) -> bool:
+    """
+    Returns True if the accounts database of a given user stores the amounts as integer minor units (see the money
+    module).
+
+    Args:
+        user_id (str): The unique identifier for the user.
+    """
+    manager = get_manager(user_id)
+    with manager.connection():
+        return manager.minor_units
+
+
+def close_user_connections(user_id: str, database_name: str = "accounts_database.db") -> None:
+    """
+    Shuts down the connection manager of a given user, e.g.: at log out or before removing the user directory.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+        database_name (str, optional): The name of the database. Defaults to "accounts_database.db".
+    """
+    db_path = acc_db_path(user_id, database_name)
+    with _managers_lock:
+        manager = _managers.pop(db_path, None)
+    if manager is not None:
+        manager.close()
+
+
+def close_all_connections() -> None:
+    """Shuts down every connection manager. Registered to run at interpreter exit."""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        manager.close()
+
+
+atexit.register(close_all_connections)
@@ -0,0 +1,71 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the asyncio access to the databases.
+
+The queries and commands are synchronous and block the thread that runs them. Every query and command also has an
+execute_async coroutine that runs execute on a dedicated thread pool, so an event loop is never blocked and several
+reads can overlap, e.g.: await ListOperationsQuery(user_id=..., account_id=...).execute_async().
+
+Every job runs on one pooled connection pinned to its worker thread (see the dbhandler module). The executor has one
+worker less than the connection pools, so the synchronous callers always find a free connection.
+
+This module is intended to be used by the queries and commands modules and not directly.
+"""
+
+import os
+import atexit
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from src.dbhandler.dbhandler import POOL_SIZE
+
+DB_WORKERS = int(os.getenv("ACC_DATABASE_WORKERS", str(max(1, POOL_SIZE - 1))))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Returns the database thread pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="billedb")
+        return _executor
+
+
+async def run_in_db_executor(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a blocking function on the database thread pool without blocking the running event loop.
+
+    Args:
+        func (Callable): The function to run, e.g.: a bound execute method.
+        *args, **kwargs: Arguments for the function.
+    Returns:
+        Any: The return value of the function. Its exceptions are raised in the awaiting coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), partial(func, *args, **kwargs))
+
+
+def shutdown_db_executor(wait: bool = True) -> None:
+    """Stops the database thread pool. A new one is created if it is used again. Registered to run at exit."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+atexit.register(shutdown_db_executor)
+
+
+class AsyncExecutable:
+    """Mixin for queries and commands: adds execute_async, the awaitable version of their execute method."""
+
+    async def execute_async(self, *args: Any, **kwargs: Any) -> Any:
+        return await run_in_db_executor(self.execute, *args, **kwargs)
@@ -0,0 +1,159 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the optional consolidated storage layout of the accounts databases.
+
+By default every account stores its operations in its own table named '<account_name>_<currency>'. With the
+consolidated layout every operation of every account is stored in a single 'operations' table keyed by account_id,
+so cross-account queries are a single indexed statement and renaming an account doesn't move any data. Every account
+keeps a view with the old table name, with INSTEAD OF triggers for inserts, updates and deletes, so all the per-account
+queries keep working on both layouts.
+
+The layout is a property of each database: a database is consolidated when it has the 'operations' table. Databases
+are converted when they are opened with ACC_DATABASE_LAYOUT=consolidated.
+
+This module is intended to be used by the dbhandler module and the models and not directly.
+"""
+
+import os
+import sqlite3
+from typing import List
+
+from src.dbhandler.migrations import get_account_tables
+from src.dbhandler.statements import check_identifier
+
+CONSOLIDATED = os.getenv("ACC_DATABASE_LAYOUT", "tables") == "consolidated"
+
+OPERATIONS_COLUMNS = (
+    "operation_id",
+    "operation_datetime",
+    "cumulative_amount",
+    "amount",
+    "operation_type",
+    "category",
+    "subcategory",
+    "description",
+    "tags",
+    "group_id",
+    "detail_id",
+    "created_at",
+    "updated_at",
+    "operation_ts",
+)
+
+CREATE_OPERATIONS_TABLE_QUERIES = (
+    """
+    CREATE TABLE IF NOT EXISTS operations (
+      account_id TEXT NOT NULL,
+      operation_id TEXT NOT NULL,
+      operation_datetime DATETIME NOT NULL,
+      cumulative_amount DECIMAL NOT NULL,
+      amount DECIMAL NOT NULL,
+      operation_type TEXT NOT NULL,
+      category TEXT,
+      subcategory TEXT,
+      description TEXT,
+      tags TEXT,
+      group_id TEXT,
+      detail_id TEXT,
+      created_at DATETIME,
+      updated_at DATETIME,
+      operation_ts INTEGER,
+      PRIMARY KEY (account_id, operation_id),
+      FOREIGN KEY (group_id) REFERENCES operation_groups (group_id) ON DELETE SET NULL,
+      FOREIGN KEY (detail_id) REFERENCES operation_details (detail_id) ON DELETE SET NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS operations_ts_idx ON operations (account_id, operation_ts, created_at)",
+    "CREATE INDEX IF NOT EXISTS operations_type_ts_idx ON operations (account_id, operation_type, operation_ts)",
+    "CREATE INDEX IF NOT EXISTS operations_category_idx ON operations (category, subcategory)",
+)
+
+
+def is_consolidated(conn: sqlite3.Connection) -> bool:
+    """Returns True if the database uses the consolidated layout."""
+    cur = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'operations'")
+    return cur.fetchone() is not None
+
+
+def create_account_view(conn: sqlite3.Connection, table_name: str, account_id: str) -> None:
+    """
+    Creates the compatibility view of an account, with the same name and columns of its former operations table,
+    and the triggers that redirect the writes on the view into the operations table.
+
+    Args:
+        conn (sqlite3.Connection): A connection to the accounts database.
+        table_name (str): Name of the view, i.e.: '<account_name>_<currency>'.
+        account_id (str): The unique identifier for the account.
+    """
+    table_name = check_identifier(table_name)
+    account_id = check_identifier(account_id)
+    columns = ", ".join(OPERATIONS_COLUMNS)
+    new_values = ", ".join(f"NEW.{column}" for column in OPERATIONS_COLUMNS)
+    set_clause = ", ".join(f"{column} = NEW.{column}" for column in OPERATIONS_COLUMNS)
+
+    conn.execute(
+        f"CREATE VIEW IF NOT EXISTS {table_name} AS SELECT {columns} FROM operations WHERE account_id = '{account_id}'"
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table_name}_insert INSTEAD OF INSERT ON {table_name}
+        BEGIN
+          INSERT INTO operations (account_id, {columns}) VALUES ('{account_id}', {new_values});
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table_name}_update INSTEAD OF UPDATE ON {table_name}
+        BEGIN
+          UPDATE operations SET {set_clause}
+          WHERE account_id = '{account_id}' AND operation_id = OLD.operation_id;
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table_name}_delete INSTEAD OF DELETE ON {table_name}
+        BEGIN
+          DELETE FROM operations WHERE account_id = '{account_id}' AND operation_id = OLD.operation_id;
+        END
+        """
+    )
+
+
+def drop_account_view(conn: sqlite3.Connection, table_name: str) -> None:
+    """Drops the compatibility view of an account. Its triggers are dropped with it."""
+    conn.execute(f"DROP VIEW IF EXISTS {check_identifier(table_name)}")
+
+
+def consolidate_operations_tables(conn: sqlite3.Connection) -> List[str]:
+    """
+    Converts a database to the consolidated layout in a single transaction: moves the rows of every account
+    operations table into the operations table and replaces the tables with their compatibility views.
+
+    Args:
+        conn (sqlite3.Connection): A connection in autocommit mode.
+    Returns:
+        List[str]: The names of the converted tables.
+    """
+    columns = ", ".join(OPERATIONS_COLUMNS)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for query in CREATE_OPERATIONS_TABLE_QUERIES:
+            conn.execute(query)
+        table_name_list = get_account_tables(conn)
+        for table_name in table_name_list:
+            (account_id,) = conn.execute(
+                "SELECT account_id FROM accounts WHERE table_name = ?", (table_name,)
+            ).fetchone()
+            conn.execute(
+                f"INSERT INTO operations (account_id, {columns}) SELECT ?, {columns} FROM {table_name}",
+                (account_id,),
+            )
+            conn.execute(f"DROP TABLE {table_name}")
+            create_account_view(conn, table_name, account_id)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return table_name_list
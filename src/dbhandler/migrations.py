@@ -0,0 +1,269 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the versioned migrations of the accounts databases.
+
+The schema version of every database is tracked with PRAGMA user_version. When the first connection to a database is
+opened, every migration with a greater version is applied in order, each one inside its own transaction together with
+the update of user_version, so an interrupted upgrade resumes from the last applied migration.
+
+Migrations that rewrite every row of big tables are declared as chunked: they fill the rows in committed chunks that
+are resumed where they were left (see backfill_column_in_chunks), and only their final step, e.g.: creating the
+indexes, runs in the migration transaction.
+
+The SQL of a migration must never change once it is released: new schema changes are always a new migration.
+
+This module is intended to be used by the dbhandler module and not directly.
+"""
+
+import sqlite3
+from typing import Callable, Dict, List
+
+from pydantic import BaseModel
+
+from src.dbhandler.timestamps import epoch_us
+
+CHUNK_SIZE = 5000
+
+
+class MigrationError(Exception):
+    """Raised when the database has a schema version newer than the ones known by this version of the app"""
+
+
+class Migration(BaseModel):
+    """
+    Migration: A single schema change.
+
+    Args:
+        version (int): The schema version the database has after applying this migration.
+        description (str): Short description of the change.
+        chunked (bool, optional): True if the migration commits its own chunks of work before its final step.
+        apply (Callable): Function that takes a sqlite3.Connection and applies the change.
+    """
+
+    version: int
+    description: str
+    chunked: bool = False
+    apply: Callable[[sqlite3.Connection], None]
+
+
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+def migration(version: int, description: str, chunked: bool = False) -> Callable:
+    """Decorator that registers a function as the migration to a given schema version."""
+
+    def register(apply: Callable[[sqlite3.Connection], None]) -> Callable[[sqlite3.Connection], None]:
+        if version in MIGRATIONS:
+            raise ValueError(f"Duplicated migration version {version}")
+        MIGRATIONS[version] = Migration(version=version, description=description, chunked=chunked, apply=apply)
+        return apply
+
+    return register
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Returns the schema version of the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def get_account_tables(conn: sqlite3.Connection) -> List[str]:
+    """
+    Returns the names of every account operations table, or an empty list if there is no accounts table yet.
+    Accounts stored in the consolidated layout have views instead of tables and are not included.
+    """
+    cur = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'accounts'")
+    if not cur.fetchone():
+        return []
+    cur = conn.execute(
+        "SELECT table_name FROM accounts WHERE table_name IN (SELECT name FROM sqlite_master WHERE type = 'table')"
+    )
+    return [table_name for (table_name,) in cur.fetchall()]
+
+
+def backfill_column_in_chunks(
+    conn: sqlite3.Connection, table_name: str, column: str, expression: str, chunk_size: int = CHUNK_SIZE
+) -> None:
+    """
+    Sets a column of a table to an expression over its other columns in chunks of rows ordered by rowid, starting
+    from the first row where the column is NULL. Every chunk is committed on its own, so an interrupted backfill
+    continues from the first row still not filled and the write lock is only held for a chunk at a time.
+
+    Args:
+        conn (sqlite3.Connection): A connection in autocommit mode.
+        table_name (str): Name of the table to fill.
+        column (str): Column to fill, e.g.: "operation_ts".
+        expression (str): Expression over the columns of the row, e.g.: "epoch_us(operation_datetime)".
+        chunk_size (int, optional): Number of rows per committed chunk.
+    """
+    last_rowid = conn.execute(f"SELECT MIN(rowid) - 1 FROM {table_name} WHERE {column} IS NULL").fetchone()[0]
+    if last_rowid is None:
+        return
+
+    chunk_end_query = f"SELECT MAX(rowid) FROM (SELECT rowid FROM {table_name} WHERE rowid > ? ORDER BY rowid LIMIT ?)"
+    update_query = f"UPDATE {table_name} SET {column} = {expression} WHERE rowid > ? AND rowid <= ?"
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            chunk_end = conn.execute(chunk_end_query, (last_rowid, chunk_size)).fetchone()[0]
+            if chunk_end is not None:
+                conn.execute(update_query, (last_rowid, chunk_end))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        if chunk_end is None:
+            break
+        last_rowid = chunk_end
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Applies every pending migration to the database, in order.
+
+    Args:
+        conn (sqlite3.Connection): A connection in autocommit mode.
+    Returns:
+        int: The schema version of the database after the migrations.
+    """
+    current_version = get_schema_version(conn)
+    latest_version = max(MIGRATIONS, default=0)
+    if current_version > latest_version:
+        raise MigrationError(f"Database schema version {current_version} is newer than {latest_version}")
+
+    for version in sorted(MIGRATIONS):
+        if version <= current_version:
+            continue
+        pending = MIGRATIONS[version]
+        try:
+            if not pending.chunked:
+                conn.execute("BEGIN IMMEDIATE")
+                # another process could have applied it while waiting for the lock
+                if get_schema_version(conn) >= version:
+                    conn.rollback()
+                    current_version = version
+                    continue
+            pending.apply(conn)
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            # PRAGMA values can't be parametrized, the version is always an int
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        current_version = version
+
+    return current_version
+
+
+# migrations: new ones are appended at the end with the next version number
+
+
+@migration(1, "Baseline schema: accounts, operation_groups and operation_details tables")
+def _baseline_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS accounts (
+          account_id TEXT PRIMARY KEY,
+          user_id TEXT NOT NULL,
+          account_name TEXT NOT NULL,
+          account_currency TEXT NOT NULL,
+          table_name TEXT NOT NULL UNIQUE,
+          account_total DECIMAL,
+          is_active BOOLEAN NOT NULL CHECK (is_active IN (0, 1)),
+          created_at DATETIME,
+          updated_at DATETIME
+        )"""
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS operation_groups (
+          group_id TEXT PRIMARY KEY,
+          user_id TEXT,
+          group_datetime DATETIME NOT NULL,
+          group_name TEXT NOT NULL,
+          group_currency TEXT NOT NULL,
+          original_amount DECIMAL,
+          category TEXT,
+          subcategory TEXT,
+          description TEXT,
+          status TEXT NOT NULL,
+          created_at DATETIME,
+          updated_at DATETIME
+        )"""
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS operation_details (
+          detail_id TEXT PRIMARY KEY,
+          operation_id TEXT NOT NULL,
+          account_id TEXT NOT NULL,
+          details BLOB NOT NULL,
+          created_at DATETIME,
+          updated_at DATETIME
+        )"""
+    )
+
+
+@migration(2, "Datetime and type indexes on every account operations table")
+def _operations_indexes(conn: sqlite3.Connection) -> None:
+    for table_name in get_account_tables(conn):
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table_name}_datetime_idx ON {table_name} (operation_datetime, created_at)"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table_name}_type_datetime_idx "
+            f"ON {table_name} (operation_type, operation_datetime)"
+        )
+
+
+@migration(3, "Storage settings table")
+def _storage_settings(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS storage_settings (
+          key TEXT PRIMARY KEY,
+          value TEXT NOT NULL
+        )"""
+    )
+
+
+@migration(4, "Normalized UTC epoch microseconds column and indexes on every account operations table", chunked=True)
+def _operation_timestamps(conn: sqlite3.Connection) -> None:
+    # imported here because the layout module depends on this one
+    from src.dbhandler.layout import create_account_view, drop_account_view, is_consolidated
+
+    conn.create_function("epoch_us", 1, epoch_us, deterministic=True)
+    consolidated = is_consolidated(conn)
+    table_names = get_account_tables(conn) + (["operations"] if consolidated else [])
+
+    # the column is filled in committed chunks before the indexes are created, an interrupted migration resumes it
+    for table_name in table_names:
+        columns = [column for (_, column, *_) in conn.execute(f"PRAGMA table_info({table_name})").fetchall()]
+        if "operation_ts" not in columns:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN operation_ts INTEGER")
+        backfill_column_in_chunks(conn, table_name, "operation_ts", "epoch_us(operation_datetime)")
+
+    conn.execute("BEGIN IMMEDIATE")
+    for table_name in get_account_tables(conn):
+        conn.execute(f"DROP INDEX IF EXISTS {table_name}_datetime_idx")
+        conn.execute(f"DROP INDEX IF EXISTS {table_name}_type_datetime_idx")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_ts_idx ON {table_name} (operation_ts, created_at)")
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table_name}_type_ts_idx ON {table_name} (operation_type, operation_ts)"
+        )
+
+    if not consolidated:
+        return
+    conn.execute("DROP INDEX IF EXISTS operations_datetime_idx")
+    conn.execute("DROP INDEX IF EXISTS operations_type_datetime_idx")
+    conn.execute("CREATE INDEX IF NOT EXISTS operations_ts_idx ON operations (account_id, operation_ts, created_at)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS operations_type_ts_idx ON operations (account_id, operation_type, operation_ts)"
+    )
+    # the views have a fixed list of columns, so they are created again with the new one
+    for account_id, table_name in conn.execute("SELECT account_id, table_name FROM accounts").fetchall():
+        drop_account_view(conn, table_name)
+        create_account_view(conn, table_name, account_id)
@@ -0,0 +1,171 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the optional integer storage of the operation amounts.
+
+By default amount and cumulative_amount are stored as decimals, which SQLite keeps as floating point values, so every
+SUM(amount) is a floating point sum that is converted back to Decimal in Python. With the minor units storage both
+columns hold integers in the minor unit of the account currency (cents for USD, yens for JPY, fils for KWD), so SQLite
+aggregates them with exact integer arithmetic. The models convert the amounts when writing and reading them, so the
+rest of the app keeps working with Decimal values.
+
+The storage is a property of each database, recorded in the storage_settings table. Databases are converted when they
+are opened with ACC_DATABASE_MONEY=minor_units.
+
+This module is intended to be used by the dbhandler module and the models and not directly.
+"""
+
+import os
+import sqlite3
+from decimal import Decimal
+from typing import Dict, List, Mapping, Optional
+
+from src.dbhandler.migrations import get_account_tables
+
+MINOR_UNITS = os.getenv("ACC_DATABASE_MONEY", "decimal") == "minor_units"
+
+AMOUNT_COLUMNS = ("amount", "cumulative_amount")
+
+# ISO 4217 minor unit exponents different from 2
+MINOR_UNIT_EXPONENTS: Dict[str, int] = {
+    "BIF": 0,
+    "CLP": 0,
+    "DJF": 0,
+    "GNF": 0,
+    "ISK": 0,
+    "JPY": 0,
+    "KMF": 0,
+    "KRW": 0,
+    "PYG": 0,
+    "RWF": 0,
+    "UGX": 0,
+    "UYI": 0,
+    "VND": 0,
+    "VUV": 0,
+    "XAF": 0,
+    "XOF": 0,
+    "XPF": 0,
+    "BHD": 3,
+    "IQD": 3,
+    "JOD": 3,
+    "KWD": 3,
+    "LYD": 3,
+    "OMR": 3,
+    "TND": 3,
+    "CLF": 4,
+    "UYW": 4,
+}
+
+
+class InexactAmountError(Exception):
+    """Raised when an amount has more decimals than the minor unit of its currency"""
+
+
+def minor_unit_exponent(currency: str) -> int:
+    """Returns the number of decimals of the minor unit of a currency, e.g.: 2 for USD."""
+    return MINOR_UNIT_EXPONENTS.get(currency, 2)
+
+
+def to_minor_units(amount: Optional[Decimal], exponent: Optional[int]) -> Optional[Decimal | int]:
+    """
+    Converts an amount to the value stored in the database.
+
+    Args:
+        amount (Decimal): The amount, e.g.: Decimal("12.34").
+        exponent (int): Minor unit exponent of the currency, or None if the database stores decimals.
+    Returns:
+        int: The amount in minor units, e.g.: 1234. The amount itself if exponent is None.
+    """
+    if amount is None or exponent is None:
+        return amount
+    scaled = Decimal(amount).scaleb(exponent)
+    if scaled != scaled.to_integral_value():
+        raise InexactAmountError(f"{amount} has more than {exponent} decimals")
+    return int(scaled)
+
+
+def from_minor_units(value: Optional[int | float | str], exponent: Optional[int]) -> Optional[Decimal]:
+    """
+    Converts a value stored in the database (or an aggregate of them) to an amount.
+
+    Args:
+        value (int): The value in minor units, e.g.: 1234.
+        exponent (int): Minor unit exponent of the currency, or None if the database stores decimals.
+    Returns:
+        Decimal: The amount, e.g.: Decimal("12.34"). The value itself if exponent is None.
+    """
+    if value is None or exponent is None:
+        return value
+    return Decimal(value).scaleb(-exponent)
+
+
+def amount_from_db(value: Optional[int | float | str], exponent: Optional[int]) -> Optional[Decimal]:
+    """
+    Converts a value read from an amount column (or an aggregate of them) to Decimal on both storages.
+
+    Args:
+        value (int | float): The stored value, e.g.: 1234 or 12.34.
+        exponent (int): Minor unit exponent of the currency, or None if the database stores decimals.
+    Returns:
+        Decimal: The amount, e.g.: Decimal("12.34").
+    """
+    if value is None:
+        return None
+    if exponent is None:
+        # the same conversion pydantic applies to the floats of the decimal storage
+        return Decimal(str(value))
+    return from_minor_units(value, exponent)
+
+
+def record_from_db(record: Mapping, exponent: Optional[int]) -> Mapping:
+    """Returns a record of an operations table with its amounts converted, ready to build a model."""
+    if exponent is None:
+        return record
+    record = dict(record)
+    for column in AMOUNT_COLUMNS:
+        if column in record:
+            record[column] = from_minor_units(record[column], exponent)
+    return record
+
+
+def uses_minor_units(conn: sqlite3.Connection) -> bool:
+    """Returns True if the database stores the amounts as integer minor units."""
+    cur = conn.execute("SELECT value FROM storage_settings WHERE key = 'money_storage'")
+    row = cur.fetchone()
+    return row is not None and row[0] == "minor_units"
+
+
+def convert_amounts_to_minor_units(conn: sqlite3.Connection, consolidated: bool = False) -> List[str]:
+    """
+    Converts the amounts of every account to minor units in a single transaction and records the new storage.
+
+    Args:
+        conn (sqlite3.Connection): A connection in autocommit mode.
+        consolidated (bool, optional): True if the database uses the consolidated layout.
+    Returns:
+        List[str]: The names of the converted account tables.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        accounts = conn.execute("SELECT account_id, table_name, account_currency FROM accounts").fetchall()
+        account_tables = set(get_account_tables(conn))
+        converted = []
+        for account_id, table_name, currency in accounts:
+            # the exponent is an int, so it is safe to format it into the statement
+            factor = 10 ** minor_unit_exponent(currency)
+            set_clause = ", ".join(
+                f"{column} = CAST(ROUND({column} * {factor}) AS INTEGER)" for column in AMOUNT_COLUMNS
+            )
+            if consolidated:
+                conn.execute(f"UPDATE operations SET {set_clause} WHERE account_id = ?", (account_id,))
+            elif table_name in account_tables:
+                conn.execute(f"UPDATE {table_name} SET {set_clause}")
+            else:
+                continue
+            converted.append(table_name)
+        conn.execute("INSERT OR REPLACE INTO storage_settings (key, value) VALUES ('money_storage', 'minor_units')")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return converted
@@ -0,0 +1,136 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module builds the SQL statements that need a table name formatted into them.
+
+Table names can't be parametrized, so the per-table statements are written as string.Template objects. Substituting
+them on every call builds a new string each time, e.g.: once per row in a massive save. build_statement validates
+the table name and memoizes the result in an LRU cache, so every (statement, table) pair maps to one canonical string
+and sqlite3 finds it in the prepared statements cache of the connection (see dbhandler.CACHED_STATEMENTS).
+
+Statements that write many rows, e.g.: the cumulative amounts of a recompute, are run with executemany_in_batches:
+the parameters are streamed in bounded chunks, so there is one prepared statement and one call per chunk instead of
+one per row. Large reads are streamed the same way: fetch_in_batches yields the rows of a query in chunks of
+fetchmany, and operation_filters builds the usual predicates of the operation scans, so they run in SQL.
+
+This module is intended to be used by the dbhandler module and the models and not directly.
+"""
+
+import os
+import re
+import sqlite3
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from string import Template
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from src.dbhandler.timestamps import epoch_us
+
+STATEMENT_CACHE_SIZE = int(os.getenv("ACC_DATABASE_STATEMENT_CACHE_SIZE", "512"))
+WRITE_BATCH_SIZE = int(os.getenv("ACC_DATABASE_WRITE_BATCH_SIZE", "1000"))
+READ_BATCH_SIZE = int(os.getenv("ACC_DATABASE_READ_BATCH_SIZE", "500"))
+
+
+class InvalidIdentifierError(Exception):
+    """Raised when a table name or an account id is not safe to be formatted into a statement"""
+
+
+def check_identifier(identifier: str) -> str:
+    """Table names and account ids are formatted into the statements, so only [a-zA-Z0-9_] is allowed."""
+    if not re.match(r"^[a-zA-Z0-9_]+$", identifier):
+        raise InvalidIdentifierError(identifier)
+    return identifier
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def build_statement(template: Template, table_name: str) -> str:
+    """
+    Returns the SQL of a statement template for a given table.
+
+    Args:
+        template (Template): Statement with a $table_name placeholder, e.g.: INSERT_INTO_QUERY.
+        table_name (str): Name of the account operations table.
+    Returns:
+        str: The statement, always the same string object for the same (template, table_name).
+    """
+    return template.substitute(table_name=check_identifier(table_name))
+
+
+def executemany_in_batches(
+    cur: sqlite3.Cursor, statement: str, seq_of_parameters: Iterable[Sequence], batch_size: int = WRITE_BATCH_SIZE
+) -> int:
+    """
+    Runs a statement once for every tuple of parameters, with one executemany call per chunk of batch_size tuples,
+    so a generator of parameters is never materialized at once.
+
+    Args:
+        cur (sqlite3.Cursor): A cursor of a connection inside a transaction.
+        statement (str): The statement, e.g.: build_statement(UPDATE_OPERATIONS_QUERY, table_name).
+        seq_of_parameters (Iterable[Sequence]): The parameters of every execution.
+        batch_size (int, optional): Maximum number of tuples per executemany call.
+    Returns:
+        int: Number of rows inserted, updated or deleted. It includes the rows written by triggers, e.g.: the writes
+        on the views of the consolidated layout, which cursor.rowcount reports as 0.
+    """
+    total_changes = cur.connection.total_changes
+    parameters = iter(seq_of_parameters)
+    while batch := list(islice(parameters, batch_size)):
+        cur.executemany(statement, batch)
+    return cur.connection.total_changes - total_changes
+
+
+def fetch_in_batches(cur: sqlite3.Cursor, batch_size: int = READ_BATCH_SIZE) -> Iterator[List]:
+    """
+    Yields the rows of an executed query in chunks of at most batch_size rows, so the whole result is never
+    materialized at once.
+
+    Args:
+        cur (sqlite3.Cursor): A cursor with an executed query.
+        batch_size (int, optional): Maximum number of rows per fetchmany call.
+    """
+    while rows := cur.fetchmany(batch_size):
+        yield rows
+
+
+def operation_filters(
+    from_datetime: Optional[datetime] = None,
+    to_datetime: Optional[datetime] = None,
+    operation_types: Optional[Iterable[str]] = None,
+    categories: Optional[Iterable[Optional[str]]] = None,
+    column_prefix: str = "",
+) -> Tuple[str, List]:
+    """
+    Returns the conditions of an operation scan joined with AND and their parameters, or an empty string if no filter
+    is provided.
+
+    Args:
+        from_datetime (datetime, optional): initial datetime, included.
+        to_datetime (datetime, optional): final datetime, included.
+        operation_types (Iterable[str], optional): e.g.: ["income", "transfer_in"].
+        categories (Iterable[str], optional): Categories to keep, None for the operations without category.
+        column_prefix (str, optional): Prefix of the columns, e.g.: "operations." in a join.
+    Returns:
+        Tuple[str, List]: e.g.: ("operation_ts >= ? AND operation_type IN (?)", [1767225600000000, "income"]).
+    """
+    conditions = []
+    params: List = []
+    if from_datetime is not None:
+        conditions.append(f"{column_prefix}operation_ts >= ?")
+        params.append(epoch_us(from_datetime))
+    if to_datetime is not None:
+        conditions.append(f"{column_prefix}operation_ts <= ?")
+        params.append(epoch_us(to_datetime))
+    if operation_types is not None:
+        operation_types = list(operation_types)
+        conditions.append(f"{column_prefix}operation_type IN ({', '.join('?' * len(operation_types))})")
+        params.extend(operation_types)
+    if categories is not None:
+        categories = list(categories)
+        named = [category for category in categories if category is not None]
+        condition = f"{column_prefix}category IN ({', '.join('?' * len(named))})"
+        if None in categories:
+            condition = f"({condition} OR {column_prefix}category IS NULL)"
+        conditions.append(condition)
+        params.extend(named)
+    return " AND ".join(conditions), params
@@ -0,0 +1,83 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the resolution of account ids into the names of their operations tables and their currencies.
+
+Every operation query needs the table name of the account before doing any real work. The names and currencies are
+cached by (user_id, account_id) and the cache entry is invalidated by the account model whenever a table is created,
+renamed or dropped.
+
+This module is intended to be used by the models and not directly.
+"""
+
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from src.dbhandler.dbhandler import get_connection
+
+_table_names: Dict[Tuple[str, str], Tuple[str, str]] = {}
+_table_names_lock = threading.Lock()
+
+
+def _resolve_account(user_id: str, account_id: str, cur: Optional[sqlite3.Cursor] = None) -> Tuple[str, str]:
+    """Returns the (table_name, account_currency) of a given account, querying the accounts table on a cache miss."""
+    key = (user_id, account_id)
+    with _table_names_lock:
+        account = _table_names.get(key)
+    if account is not None:
+        return account
+
+    if cur is None:
+        with get_connection(user_id) as conn:
+            return _resolve_account(user_id, account_id, conn.cursor())
+
+    cur.execute("SELECT table_name, account_currency FROM accounts WHERE account_id = ?", (account_id,))
+    account = tuple(cur.fetchone())
+    with _table_names_lock:
+        _table_names[key] = account
+    return account
+
+
+def resolve_table_name(user_id: str, account_id: str, cur: Optional[sqlite3.Cursor] = None) -> str:
+    """
+    Returns the name of the operations table of a given account, querying the accounts table only on a cache miss.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+        account_id (str): The unique identifier for the account.
+        cur (sqlite3.Cursor, optional): Cursor to use on a cache miss. If not provided a pooled connection is used.
+    Returns:
+        str: The name of the operations table.
+    """
+    return _resolve_account(user_id, account_id, cur)[0]
+
+
+def resolve_account_currency(user_id: str, account_id: str, cur: Optional[sqlite3.Cursor] = None) -> str:
+    """
+    Returns the currency code of a given account, querying the accounts table only on a cache miss.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+        account_id (str): The unique identifier for the account.
+        cur (sqlite3.Cursor, optional): Cursor to use on a cache miss. If not provided a pooled connection is used.
+    Returns:
+        str: The ISO 4217 code of the account currency, e.g.: 'USD'.
+    """
+    return _resolve_account(user_id, account_id, cur)[1]
+
+
+def invalidate_table_name(user_id: str, account_id: Optional[str] = None) -> None:
+    """
+    Removes the cached table name of a given account, or of every account of the user if no account_id is provided.
+
+    Args:
+        user_id (str): The unique identifier for the user.
+        account_id (str, optional): The unique identifier for the account.
+    """
+    with _table_names_lock:
+        if account_id is not None:
+            _table_names.pop((user_id, account_id), None)
+            return
+        for key in [key for key in _table_names if key[0] == user_id]:
+            del _table_names[key]
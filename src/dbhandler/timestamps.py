@@ -0,0 +1,38 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the normalized timestamps of the operations.
+
+operation_datetime is stored with the isoformat() adapter, so the stored strings can carry different UTC offsets and
+precisions and comparing them as text doesn't always follow the chronological order. Every operations table also
+has the operation_ts column: the same instant as an integer number of microseconds since the UTC epoch, written
+together with operation_datetime and indexed. Range filters and chronological ordering use operation_ts.
+
+Naive datetimes are taken as UTC, the same way SQLite date functions read them.
+
+This module is intended to be used by the dbhandler module and the models and not directly.
+"""
+
+from datetime import datetime, timedelta, UTC
+from typing import Optional
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def epoch_us(value: Optional[datetime | str]) -> Optional[int]:
+    """
+    Converts a datetime, or a stored datetime string, to UTC epoch microseconds.
+
+    Args:
+        value (datetime | str): e.g.: datetime(2025, 1, 1, tzinfo=UTC) or "2025-01-01T00:00:00+00:00".
+    Returns:
+        int: Microseconds since 1970-01-01 00:00:00 UTC, e.g.: 1735689600000000.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    # integer arithmetic on the timedelta, so there is no floating point rounding
+    return (value - EPOCH) // timedelta(microseconds=1)
@@ -0,0 +1,136 @@
+"""
+billeterapp 2.0 - Octubre 2026
+
+This module handles the construction of the models from the records of the databases.
+
+Every record was validated by its model when it was written, so validating it again on every read only costs time.
+load_model converts the stored values to the types of the model fields (Decimal, datetime and bool) and builds the
+model with model_construct, skipping the validators. The conversions are the same pydantic does on the stored
+values, so both ways build equal models. With ACC_DATABASE_STRICT_LOAD=1 the models are built with the full
+validation instead, e.g.: to find records written outside the models.
+
+This module is intended to be used by the models and not directly.
+"""
+
+import itertools
+import operator
+import os
+import types
+import typing
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from src.dbhandler.money import amount_from_db
+
+STRICT_LOAD = os.getenv("ACC_DATABASE_STRICT_LOAD", "0") == "1"
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+def _to_decimal(value: Any) -> Any:
+    """
+    Converts a stored amount as amount_from_db does on the decimal storage: the amounts of the minor units storage
+    are already converted to Decimal by record_from_db.
+    """
+    if isinstance(value, Decimal):
+        return value
+    return amount_from_db(value, None)
+
+
+def _to_datetime(value: Any) -> Any:
+    """Converts a datetime stored with the isoformat() adapter"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _to_bool(value: Any) -> Any:
+    """Converts a stored BOOLEAN (0 or 1)"""
+    if value is None:
+        return value
+    return bool(value)
+
+
+CONVERTERS: Dict[type, Callable[[Any], Any]] = {Decimal: _to_decimal, datetime: _to_datetime, bool: _to_bool}
+
+
+def _field_converter(annotation: Any) -> Optional[Callable[[Any], Any]]:
+    """Returns the converter of a field type that is not stored as it is, e.g.: Optional[Decimal]"""
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        candidates = typing.get_args(annotation)
+    else:
+        candidates = (annotation,)
+    for candidate in candidates:
+        if candidate in CONVERTERS:
+            return CONVERTERS[candidate]
+    return None
+
+
+@lru_cache(maxsize=None)
+def _model_plan(model_cls: Type[BaseModel]) -> Tuple[Tuple[str, Optional[Callable]], ...]:
+    """Returns the (name, converter) of every field of a model. Computed once per model."""
+    return tuple((name, _field_converter(field.annotation)) for name, field in model_cls.model_fields.items())
+
+
+def load_models(model_cls: Type[Model], records: Iterable[Mapping], **fields: Any) -> List[Model]:
+    """
+    Builds the models of several database records with the same columns without validating them again.
+
+    The stored values are converted and the objects built with model_construct, but the columns are matched with the
+    fields, and their converters looked up, once for all the records.
+
+    Args:
+        model_cls (Type[BaseModel]): The model, e.g.: UserAccounts.
+        records (Iterable[Mapping]): The records, e.g.: sqlite3.Row. Columns that are not fields are ignored.
+        **fields: Values not in the records, e.g.: user_id and account_id.
+    Returns:
+        List[BaseModel]: The model objects. They are validated as usual if ACC_DATABASE_STRICT_LOAD=1.
+    """
+    if STRICT_LOAD:
+        return [model_cls(**dict(record, **fields)) for record in records]
+
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return []
+
+    columns = set(first.keys())
+    # the constant values, converted once
+    constants: Dict[str, Any] = {}
+    stored: List[str] = []
+    converted: List[Tuple[str, Callable]] = []
+    for name, convert in _model_plan(model_cls):
+        if name in fields:
+            constants[name] = fields[name] if convert is None else convert(fields[name])
+        elif name in columns:
+            stored.append(name)
+            if convert is not None:
+                converted.append((name, convert))
+    fields_set = frozenset(constants).union(stored)
+    get_stored = operator.itemgetter(*stored) if len(stored) > 1 else lambda record: tuple(record[n] for n in stored)
+
+    models = []
+    for record in itertools.chain((first,), records):
+        values = dict(zip(stored, get_stored(record)), **constants)
+        for name, convert in converted:
+            values[name] = convert(values[name])
+        models.append(model_cls.model_construct(_fields_set=set(fields_set), **values))
+    return models
+
+
+def load_model(model_cls: Type[Model], record: Mapping, **fields: Any) -> Model:
+    """
+    Builds a model from a database record without validating it again.
+
+    Args:
+        model_cls (Type[BaseModel]): The model, e.g.: UserAccounts.
+        record (Mapping): The record, e.g.: a sqlite3.Row. Columns that are not fields of the model are ignored.
+        **fields: Values not in the record, e.g.: user_id.
+    Returns:
+        BaseModel: The model object. It is validated as usual if ACC_DATABASE_STRICT_LOAD=1.
+    """
+    return load_models(model_cls, (record,), **fields)[0]
@@ -9,17 +9,23 @@ This module is intended to be used by the module commands and not directly.
 
 """
 
-import os
 import re
 import sqlite3
 import datetime
 from decimal import Decimal
+from string import Template
 from typing import Optional
 
 from ulid import ULID
 from pydantic import BaseModel, Field, field_validator
 from pydantic_extra_types.currency_code import ISO4217
 
+from src.dbhandler.balanceindex import invalidate_balance_index
+from src.dbhandler.dbhandler import get_connection, get_transaction, is_consolidated_layout
+from src.dbhandler.layout import create_account_view, drop_account_view
+from src.dbhandler.tableresolver import invalidate_table_name
+from src.dbhandler.trustedload import load_model, load_models
+
 # custom sqlite3 adapter for date and datetime
 sqlite3.register_adapter(datetime.date, lambda val: val.isoformat())
 sqlite3.register_adapter(datetime.datetime, lambda val: val.isoformat())
@@ -28,6 +34,17 @@ sqlite3.register_adapter(Decimal, lambda val: str(val))
 # custom sqlite3 converter for deicmals
 sqlite3.register_converter("DECIMAL", lambda val: Decimal(val))
 
+# indexes of every account operations table: chronological order for cumulative recomputes and last operation
+# lookups, and type + timestamp for the monthly totals and category queries
+CREATE_OPERATIONS_INDEXES_QUERIES = (
+    Template("CREATE INDEX IF NOT EXISTS ${table_name}_ts_idx ON $table_name (operation_ts, created_at)"),
+    Template("CREATE INDEX IF NOT EXISTS ${table_name}_type_ts_idx ON $table_name (operation_type, operation_ts)"),
+)
+DROP_OPERATIONS_INDEXES_QUERIES = (
+    Template("DROP INDEX IF EXISTS ${table_name}_ts_idx"),
+    Template("DROP INDEX IF EXISTS ${table_name}_type_ts_idx"),
+)
+
 
 class AccountNotFoundError(Exception):
     pass
@@ -63,11 +80,6 @@ class UserAccounts(BaseModel, validate_assignment=True):
     created_at: Optional[datetime.datetime] = None
     updated_at: Optional[datetime.datetime] = None
 
-    @staticmethod
-    def __db_path(user_id) -> str:
-        """Stablished the path for the accounts_database.db"""
-        return os.path.join("data", user_id, "accounts_database.db")
-
     @field_validator("account_name")
     @classmethod
     def __name_validator(cls, acc_name) -> str:
@@ -97,19 +109,17 @@ class UserAccounts(BaseModel, validate_assignment=True):
         Returns:
             UserAccount: An UserAccount object with that account columns that matches the id provided.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserAccounts.__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM accounts WHERE account_id = ?", (account_id,))
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute("SELECT * FROM accounts WHERE account_id = ?", (account_id,))
 
-        record = cur.fetchone()
-        conn.close()
+            record = cur.fetchone()
 
         if not record:
             raise AccountNotFoundError
 
-        account = cls(**record)
+        account = load_model(cls, record)
 
         return account
 
@@ -127,19 +137,17 @@ class UserAccounts(BaseModel, validate_assignment=True):
         """
         table_name = UserAccounts.__name_validator(table_name)
 
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserAccounts.__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM accounts WHERE table_name = ?", (table_name,))
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute("SELECT * FROM accounts WHERE table_name = ?", (table_name,))
 
-        record = cur.fetchone()
-        conn.close()
+            record = cur.fetchone()
 
         if not record:
             raise AccountNotFoundError
 
-        account = cls(**record)
+        account = load_model(cls, record)
 
         return account
 
@@ -156,9 +164,6 @@ class UserAccounts(BaseModel, validate_assignment=True):
         Returns:
             list[UserAccount]: A list of all the UserAccount objects for the user.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserAccounts.__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
         select_query = "SELECT * FROM accounts"
         query_conditions = []
         query_parameters = []
@@ -175,13 +180,14 @@ class UserAccounts(BaseModel, validate_assignment=True):
             if query_conditions:
                 select_query += " WHERE " + " AND ".join(query_conditions)
 
-        cur = conn.cursor()
-        cur.execute(select_query, query_parameters)
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute(select_query, query_parameters)
 
-        records = cur.fetchall()
-        conn.close()
+            records = cur.fetchall()
 
-        accounts = [cls(**record) for record in records]
+        accounts = load_models(cls, records)
 
         return accounts
 
@@ -206,24 +212,22 @@ class UserAccounts(BaseModel, validate_assignment=True):
             created_at -> datetime
             updated_at -> datetime
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserAccounts.__db_path(user_id)))
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS accounts (
-              account_id TEXT PRIMARY KEY,
-              user_id TEXT NOT NULL,
-              account_name TEXT NOT NULL,
-              account_currency TEXT NOT NULL,
-              table_name TEXT NOT NULL UNIQUE,
-              account_total DECIMAL,
-              is_active BOOLEAN NOT NULL CHECK (is_active IN (0, 1)),
-              created_at DATETIME,
-              updated_at DATETIME
-            )"""
-        )
-        conn.commit()
-        conn.close()
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS accounts (
+                  account_id TEXT PRIMARY KEY,
+                  user_id TEXT NOT NULL,
+                  account_name TEXT NOT NULL,
+                  account_currency TEXT NOT NULL,
+                  table_name TEXT NOT NULL UNIQUE,
+                  account_total DECIMAL,
+                  is_active BOOLEAN NOT NULL CHECK (is_active IN (0, 1)),
+                  created_at DATETIME,
+                  updated_at DATETIME
+                )"""
+            )
 
     def create_account_operations_tables(self) -> None:
         """
@@ -249,99 +253,106 @@ class UserAccounts(BaseModel, validate_assignment=True):
             detail_id -> text/foreing key referencing operation_details table
             created_at -> datetime
             updated_at -> datetime
+            operation_ts -> integer, operation_datetime as UTC epoch microseconds
         """
 
         self.created_at = self.updated_at = datetime.datetime.now(datetime.UTC)
 
         table_name = f"{self.account_name}_{self.account_currency}"
 
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserAccounts.__db_path(self.user_id)))
-        cur = conn.cursor()
         # creation of the the account (operations) table and the operation_groups table
         try:
-            cur.execute("BEGIN TRANSACTION")
-            # account operations table
-            cur.execute(
-                f"""
-                CREATE TABLE IF NOT EXISTS {table_name} (
-                operation_id TEXT PRIMARY KEY,
-                operation_datetime DATETIME NOT NULL,
-                cumulative_amount DECIMAL NOT NULL,
-                amount DECIMAL NOT NULL,
-                operation_type TEXT NOT NULL,
-                category TEXT,
-                subcategory TEXT,
-                description TEXT,
-                tags TEXT,
-                group_id TEXT,
-                detail_id TEXT,
-                created_at DATETIME,
-                updated_at DATETIME,
-                FOREIGN KEY (group_id) REFERENCES operation_groups (group_id) ON DELETE SET NULL, 
-                FOREIGN KEY (detail_id) REFERENCES operation_details (detail_id) ON DELETE SET NULL
-                )"""
-            )
-            # operation groups table
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS operation_groups (
-                group_id TEXT PRIMARY KEY,
-                user_id TEXT,
-                group_datetime DATETIME NOT NULL,
-                group_name TEXT NOT NULL,
-                group_currency TEXT NOT NULL,
-                original_amount DECIMAL,
-                category TEXT,
-                subcategory TEXT,
-                description TEXT,
-                status TEXT NOT NULL,
-                created_at DATETIME,
-                updated_at DATETIME
+            with get_transaction(self.user_id) as conn:
+                cur = conn.cursor()
+                if is_consolidated_layout(self.user_id):
+                    # account operations view over the consolidated operations table
+                    create_account_view(conn, table_name, self.account_id)
+                else:
+                    # account operations table
+                    cur.execute(
+                        f"""
+                        CREATE TABLE IF NOT EXISTS {table_name} (
+                        operation_id TEXT PRIMARY KEY,
+                        operation_datetime DATETIME NOT NULL,
+                        cumulative_amount DECIMAL NOT NULL,
+                        amount DECIMAL NOT NULL,
+                        operation_type TEXT NOT NULL,
+                        category TEXT,
+                        subcategory TEXT,
+                        description TEXT,
+                        tags TEXT,
+                        group_id TEXT,
+                        detail_id TEXT,
+                        created_at DATETIME,
+                        updated_at DATETIME,
+                        operation_ts INTEGER,
+                        FOREIGN KEY (group_id) REFERENCES operation_groups (group_id) ON DELETE SET NULL, 
+                        FOREIGN KEY (detail_id) REFERENCES operation_details (detail_id) ON DELETE SET NULL
+                        )"""
+                    )
+                    # account operations table indexes
+                    for query in CREATE_OPERATIONS_INDEXES_QUERIES:
+                        cur.execute(query.substitute(table_name=table_name))
+                # operation groups table
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS operation_groups (
+                    group_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    group_datetime DATETIME NOT NULL,
+                    group_name TEXT NOT NULL,
+                    group_currency TEXT NOT NULL,
+                    original_amount DECIMAL,
+                    category TEXT,
+                    subcategory TEXT,
+                    description TEXT,
+                    status TEXT NOT NULL,
+                    created_at DATETIME,
+                    updated_at DATETIME
+                    )
+                    """
+                )
+                # operation details table
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS operation_details (
+                    detail_id TEXT PRIMARY KEY,
+                    operation_id TEXT NOT NULL,
+                    account_id TEXT NOT NULL,
+                    details BLOB NOT NULL,
+                    created_at DATETIME,
+                    updated_at DATETIME
+                    )"""
+                )
+                # insert new account operations table name into accounts table
+                cur.execute(
+                    """
+                    INSERT INTO accounts
+                      (account_id,
+                      user_id,
+                      account_name,
+                      account_currency,
+                      table_name,
+                      is_active,
+                      created_at,
+                      updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        self.account_id,
+                        self.user_id,
+                        self.account_name,
+                        self.account_currency,
+                        table_name,
+                        self.is_active,
+                        self.created_at,
+                        self.updated_at,
+                    ),
                 )
-                """
-            )
-            # operation details table
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS operation_details (
-                detail_id TEXT PRIMARY KEY,
-                operation_id TEXT NOT NULL,
-                account_id TEXT NOT NULL,
-                details BLOB NOT NULL,
-                created_at DATETIME,
-                updated_at DATETIME
-                )"""
-            )
-            # insert new account operations table name into accounts table
-            cur.execute(
-                """
-                INSERT INTO accounts
-                  (account_id,
-                  user_id,
-                  account_name,
-                  account_currency,
-                  table_name,
-                  is_active,
-                  created_at,
-                  updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    self.account_id,
-                    self.user_id,
-                    self.account_name,
-                    self.account_currency,
-                    table_name,
-                    self.is_active,
-                    self.created_at,
-                    self.updated_at,
-                ),
-            )
-            conn.commit()
         except sqlite3.Error:
-            conn.rollback()
+            pass
         finally:
-            conn.close()
+            invalidate_table_name(self.user_id, self.account_id)
         return self
 
     def save(self, change_table_name_flag: bool = False) -> "UserAccounts":
@@ -358,12 +369,22 @@ class UserAccounts(BaseModel, validate_assignment=True):
 
         table_name = f"{self.account_name}_{self.account_currency}"
 
-        with sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserAccounts.__db_path(self.user_id))) as conn:
+        with get_transaction(self.user_id) as conn:
             cur = conn.cursor()
             if change_table_name_flag:
                 cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (self.account_id,))
                 old_table_name = cur.fetchone()[0]
-                cur.execute(f"ALTER TABLE {old_table_name} RENAME TO {table_name}")
+                if is_consolidated_layout(self.user_id):
+                    # no data is moved: only the compatibility view changes its name
+                    drop_account_view(conn, old_table_name)
+                    create_account_view(conn, table_name, self.account_id)
+                else:
+                    cur.execute(f"ALTER TABLE {old_table_name} RENAME TO {table_name}")
+                    # indexes keep their names after renaming the table, so they are recreated with the new one
+                    for query in DROP_OPERATIONS_INDEXES_QUERIES:
+                        cur.execute(query.substitute(table_name=old_table_name))
+                    for query in CREATE_OPERATIONS_INDEXES_QUERIES:
+                        cur.execute(query.substitute(table_name=table_name))
             cur.execute(
                 """
                 UPDATE
@@ -388,8 +409,9 @@ class UserAccounts(BaseModel, validate_assignment=True):
                     self.account_id,
                 ),
             )
-            conn.commit()
-        conn.close()
+
+        if change_table_name_flag:
+            invalidate_table_name(self.user_id, self.account_id)
         return self
 
     @classmethod
@@ -401,16 +423,20 @@ class UserAccounts(BaseModel, validate_assignment=True):
         Returns:
             UserAccount: An UserAccount object.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserAccounts.__db_path(user_id)))
-        cur = conn.cursor()
         try:
-            cur.execute("BEGIN TRANSACTION")
-            cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (account_id,))
-            table_name = cur.fetchone()[0]
-            cur.execute(f"DROP TABLE {table_name}")
-            cur.execute("DELETE FROM accounts WHERE account_id = ?", (account_id,))
-            conn.commit()
+            with get_transaction(user_id) as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (account_id,))
+                table_name = cur.fetchone()[0]
+                if is_consolidated_layout(user_id):
+                    cur.execute("DELETE FROM operations WHERE account_id = ?", (account_id,))
+                    drop_account_view(conn, table_name)
+                else:
+                    cur.execute(f"DROP TABLE {table_name}")
+                cur.execute("DELETE FROM accounts WHERE account_id = ?", (account_id,))
         except sqlite3.Error:
-            conn.rollback()
+            pass
         finally:
-            conn.close()
+            invalidate_table_name(user_id, account_id)
+            invalidate_balance_index(user_id, account_id)
+
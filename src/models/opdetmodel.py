@@ -8,7 +8,6 @@ their corresponding accounts table and a new table for each user account.
 This module is intended to be used by the module commands and not directly.
 """
 
-import os
 import sqlite3
 import datetime
 from typing import Optional, List
@@ -16,6 +15,9 @@ from typing import Optional, List
 from ulid import ULID
 from pydantic import BaseModel, Field
 
+from src.dbhandler.dbhandler import get_connection, get_transaction
+from src.dbhandler.trustedload import load_model, load_models
+
 # custom sqlite3 adapter for date and datetime
 sqlite3.register_adapter(datetime.date, lambda val: val.isoformat())
 sqlite3.register_adapter(datetime.datetime, lambda val: val.isoformat())
@@ -47,16 +49,12 @@ class OperationsDetails(BaseModel, validate_assignment=True):
         Returns:
             OperationDetails: An OperationDetails object with that operation data.
         """
-        db_path = os.path.join("data", user_id, "accounts_database.db")
-
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM operation_details WHERE operation_id = ?", (operation_id,))
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute("SELECT * FROM operation_details WHERE operation_id = ?", (operation_id,))
 
-        record = cur.fetchone()
-        conn.close()
+            record = cur.fetchone()
 
         if not record:
             raise OperationDetailsNotFoundError
@@ -64,7 +62,7 @@ class OperationsDetails(BaseModel, validate_assignment=True):
         record = dict(record)
         record["user_id"] = user_id
 
-        details = cls(**record)
+        details = load_model(cls, record)
 
         return details
 
@@ -76,17 +74,14 @@ class OperationsDetails(BaseModel, validate_assignment=True):
         Returns:
             List[OperationDetails]: A list of OperationDetails objects.
         """
-        db_path = os.path.join("data", user_id, "accounts_database.db")
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM operation_details WHERE account_id = ?", (account_id,))
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute("SELECT * FROM operation_details WHERE account_id = ?", (account_id,))
 
-        records = cur.fetchall()
-        conn.close()
+            records = cur.fetchall()
 
-        details = [cls(**record) for record in records]
+        details = load_models(cls, records)
 
         return details
 
@@ -99,11 +94,9 @@ class OperationsDetails(BaseModel, validate_assignment=True):
         Returns:
             self (OperationDetails): An OperationDetails object.
         """
-        db_path = os.path.join("data", self.user_id, database_name)
-
         self.created_at = self.updated_at = datetime.datetime.now(datetime.UTC)
 
-        with sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path)) as conn:
+        with get_transaction(self.user_id, database_name) as conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -121,8 +114,6 @@ class OperationsDetails(BaseModel, validate_assignment=True):
                     self.updated_at,
                 ),
             )
-            conn.commit()
-        conn.close()
         return self
 
     def save(self) -> "OperationsDetails":
@@ -134,11 +125,9 @@ class OperationsDetails(BaseModel, validate_assignment=True):
         Returns:
             self (OperationDetails): An OperationDetails object.
         """
-        db_path = os.path.join("data", self.user_id, "accounts_database.db")
-
         self.updated_at = datetime.datetime.now(datetime.UTC)
 
-        with sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path)) as conn:
+        with get_transaction(self.user_id) as conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -148,8 +137,6 @@ class OperationsDetails(BaseModel, validate_assignment=True):
                 """,
                 (self.details, self.updated_at, self.operation_id),
             )
-            conn.commit()
-        conn.close()
         return self
 
     def delete(self) -> None:
@@ -159,11 +146,7 @@ class OperationsDetails(BaseModel, validate_assignment=True):
         Args:
             self (OperationDetails): The unique identifier for the user generated by the library ULID.
         """
-        db_path = os.path.join("data", self.user_id, "accounts_database.db")
-
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        cur = conn.cursor()
+        with get_transaction(self.user_id) as conn:
+            cur = conn.cursor()
 
-        cur.execute("DELETE FROM operation_details WHERE operation_id = ?", (self.operation_id,))
-        conn.commit()
-        conn.close()
+            cur.execute("DELETE FROM operation_details WHERE operation_id = ?", (self.operation_id,))
@@ -9,7 +9,6 @@ loans: If user A lends money to user B, it is not necesarily a real expense, bec
 user A in another time. But it is a flow o money. The real expense, if user B repays the total to user A, would be 0.
 """
 
-import os
 import sqlite3
 from datetime import datetime, date, UTC
 from decimal import Decimal
@@ -19,6 +18,9 @@ from ulid import ULID
 from pydantic import BaseModel, Field
 from pydantic_extra_types.currency_code import ISO4217
 
+from src.dbhandler.dbhandler import get_connection, get_transaction
+from src.dbhandler.trustedload import load_model, load_models
+
 # custom sqlite3 adapter for date and datetime
 sqlite3.register_adapter(date, lambda val: val.isoformat())
 sqlite3.register_adapter(datetime, lambda val: val.isoformat())
@@ -43,11 +45,6 @@ class OperationGroups(BaseModel, validate_assignment=True):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
-    @staticmethod
-    def __db_path(user_id) -> str:
-        """Stablished the path for the accounts_database.db"""
-        return os.path.join("data", user_id, "accounts_database.db")
-
     @classmethod
     def get_group_by_id(cls, user_id: str, group_id: str) -> "OperationGroups":
         """
@@ -59,23 +56,19 @@ class OperationGroups(BaseModel, validate_assignment=True):
         Returns:
             OperationGroups: An OperationGroups object with that operation data.
         """
-        db_path = os.path.join("data", user_id, "accounts_database.db")
-
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM operation_groups WHERE group_id = ?", (group_id,))
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute("SELECT * FROM operation_groups WHERE group_id = ?", (group_id,))
 
-        record = cur.fetchone()
-        conn.close()
+            record = cur.fetchone()
 
         if not record:
             raise GroupNotFoundError
 
         record = dict(record)
 
-        group = cls(**record)
+        group = load_model(cls, record)
 
         return group
 
@@ -89,26 +82,22 @@ class OperationGroups(BaseModel, validate_assignment=True):
         Returns:
             list[UserOperation]: A list of UserOperation objects for a given account.
         """
-        db_path = os.path.join("data", user_id, "accounts_database.db")
-
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
 
-        if status == "open":
-            cur.execute("SELECT * FROM operation_groups WHERE status = 'open';")
-        elif status == "closed":
-            cur.execute("SELECT * FROM operation_groups WHERE status = 'closed';")
-        elif status == "cancelled":
-            cur.execute("SELECT * FROM operation_groups WHERE status = 'cancelled';")
-        else:
-            cur.execute("SELECT * FROM operation_groups;")
+            if status == "open":
+                cur.execute("SELECT * FROM operation_groups WHERE status = 'open';")
+            elif status == "closed":
+                cur.execute("SELECT * FROM operation_groups WHERE status = 'closed';")
+            elif status == "cancelled":
+                cur.execute("SELECT * FROM operation_groups WHERE status = 'cancelled';")
+            else:
+                cur.execute("SELECT * FROM operation_groups;")
 
-        records = cur.fetchall()
-        conn.close()
+            records = cur.fetchall()
 
-        groups = [cls(**record) for record in records]
+        groups = load_models(cls, records)
 
         return groups
 
@@ -121,11 +110,9 @@ class OperationGroups(BaseModel, validate_assignment=True):
         Returns:
             self (OperationGroups): An OperationGroups object.
         """
-        db_path = os.path.join("data", self.user_id, database_name)
-
         self.created_at = self.updated_at = datetime.now(UTC)
 
-        with sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path)) as conn:
+        with get_transaction(self.user_id, database_name) as conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -161,8 +148,6 @@ class OperationGroups(BaseModel, validate_assignment=True):
                     self.updated_at,
                 ),
             )
-            conn.commit()
-        conn.close()
         return self
 
     def save(self) -> "OperationGroups":
@@ -174,11 +159,9 @@ class OperationGroups(BaseModel, validate_assignment=True):
         Returns:
             self (OperationGroups): An OperationGroups object.
         """
-        db_path = os.path.join("data", self.user_id, "accounts_database.db")
-
         self.updated_at = datetime.now(UTC)
 
-        with sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path)) as conn:
+        with get_transaction(self.user_id) as conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -208,8 +191,6 @@ class OperationGroups(BaseModel, validate_assignment=True):
                     self.group_id,
                 ),
             )
-            conn.commit()
-        conn.close()
         return self
 
     def delete(self) -> None:
@@ -219,12 +200,7 @@ class OperationGroups(BaseModel, validate_assignment=True):
         Args:
             self (OperationGroups): An OperationGroups object used to extract the group_id.
         """
-        db_path = os.path.join("data", self.user_id, "accounts_database.db")
-
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", db_path))
-        cur = conn.cursor()
-
-        cur.execute("PRAGMA foreign_keys = ON;")  # activate the foreing keys enforcement
-        cur.execute("DELETE FROM operation_groups WHERE group_id = ?", (self.group_id,))
-        conn.commit()
-        conn.close()
+        with get_connection(self.user_id) as conn:
+            cur = conn.cursor()
+            # the foreign keys of every connection are enforced: the group_id of its operations is set to NULL
+            cur.execute("DELETE FROM operation_groups WHERE group_id = ?", (self.group_id,))
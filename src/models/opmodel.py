@@ -9,18 +9,38 @@ their corresponding accounts table and a new table for each user account.
 This module is intended to be used by the module commands and not directly.
 """
 
-import os
 import re
 import sqlite3
 from datetime import datetime, date, UTC
 from decimal import Decimal
 from string import Template
-from typing import Optional, Literal, List, Sequence
+from typing import Iterator, Optional, Literal, List, Sequence, Tuple
 
 from ulid import ULID
 from pydantic import BaseModel, Field, field_validator
 from pydantic_extra_types.currency_code import ISO4217
 
+from src.dbhandler.balanceindex import (
+    BALANCE_INDEX,
+    COEFF,
+    get_balance_index,
+    invalidate_balance_index,
+    loaded_balance_index,
+    position_key,
+)
+from src.dbhandler.dbhandler import get_connection, get_transaction, is_consolidated_layout, uses_minor_units_storage
+from src.dbhandler.money import minor_unit_exponent, to_minor_units, amount_from_db, record_from_db
+from src.dbhandler.statements import (
+    READ_BATCH_SIZE,
+    build_statement,
+    executemany_in_batches,
+    fetch_in_batches,
+    operation_filters,
+)
+from src.dbhandler.tableresolver import resolve_table_name, resolve_account_currency
+from src.dbhandler.timestamps import epoch_us
+from src.dbhandler.trustedload import load_model, load_models
+
 # custom sqlite3 adapter for date and datetime
 sqlite3.register_adapter(date, lambda val: val.isoformat())
 sqlite3.register_adapter(datetime, lambda val: val.isoformat())
@@ -41,9 +61,10 @@ INSERT_INTO_QUERY = Template(
       group_id,
       detail_id,
       created_at,
-      updated_at)
+      updated_at,
+      operation_ts)
     VALUES
-      (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+      (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
 )
 UPDATE_OPERATIONS_QUERY = Template(
@@ -61,11 +82,51 @@ UPDATE_OPERATIONS_QUERY = Template(
       tags = ?,
       group_id = ?,
       detail_id = ?,
+      updated_at = ?,
+      operation_ts = ?
+    WHERE
+      operation_id = ?
+    """
+)
+UPDATE_CUMULATIVE_QUERY = Template(
+    """
+    UPDATE
+      $table_name
+    SET
+      cumulative_amount = ?,
       updated_at = ?
     WHERE
       operation_id = ?
     """
 )
+DELETE_OPERATION_QUERY = Template("DELETE FROM $table_name WHERE operation_id = ?")
+# adds a constant amount to the cumulative_amount of every operation between two (operation_ts, created_at) positions
+# (both excluded). OPEN_END is the upper position of the ranges without end.
+OPEN_END = (2**63 - 1, "")
+SHIFT_CUMULATIVES_QUERY = Template(
+    """
+    UPDATE
+      $table_name
+    SET
+      cumulative_amount = cumulative_amount + ?,
+      updated_at = ?
+    WHERE
+      (operation_ts, created_at) > (?, ?) AND (operation_ts, created_at) < (?, ?)
+    """
+)
+# the decimal storage keeps floating point values: rounding drops the representation error of every addition, so the
+# shifted values read back the same as the ones calculated with Decimal
+SHIFT_DECIMAL_CUMULATIVES_QUERY = Template(
+    """
+    UPDATE
+      $table_name
+    SET
+      cumulative_amount = ROUND(cumulative_amount + ?, 9),
+      updated_at = ?
+    WHERE
+      (operation_ts, created_at) > (?, ?) AND (operation_ts, created_at) < (?, ?)
+    """
+)
 UPDATE_ACC_TOTAL_QUERY = """
     UPDATE
       accounts
@@ -77,6 +138,13 @@ UPDATE_ACC_TOTAL_QUERY = """
     """
 
 
+def _amount_exponent(user_id: str, account_id: str, cur: sqlite3.Cursor) -> Optional[int]:
+    """Minor unit exponent of the account currency if the database stores integer amounts, otherwise None."""
+    if not uses_minor_units_storage(user_id):
+        return None
+    return minor_unit_exponent(resolve_account_currency(user_id, account_id, cur))
+
+
 class OperationNotFoundError(Exception):
     pass
 
@@ -127,11 +195,6 @@ class OperationsModel(BaseModel, validate_assignment=True):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
-    @staticmethod
-    def __db_path(user_id) -> str:
-        """Stablished the path for the accounts_database.db"""
-        return os.path.join("data", user_id, "accounts_database.db")
-
     @field_validator("account_name")
     @classmethod
     def __name_validator(cls, acc_name) -> str | None:
@@ -152,6 +215,22 @@ class OperationsModel(BaseModel, validate_assignment=True):
         return acc_name
 
 
+def _sync_balance_index(
+    user_id: str, account_id: str, written: Sequence[OperationsModel] = (), deleted: Sequence[str] = ()
+) -> None:
+    """Applies the written and deleted operations to the balance index of the account, if it is built"""
+    index = loaded_balance_index(user_id, account_id)
+    if index is None:
+        return
+    for operation_id in deleted:
+        index.remove(operation_id)
+    for oper in written:
+        operation_ts, created_at = position_key(oper.operation_datetime, oper.created_at)
+        if not index.upsert(oper.operation_id, COEFF[oper.operation_type] * oper.amount, operation_ts, created_at):
+            invalidate_balance_index(user_id, account_id)
+            return
+
+
 class UserOperations(OperationsModel):
     """
     UserOperations model: Handle the lower level operations of each account that an user can have.
@@ -160,6 +239,18 @@ class UserOperations(OperationsModel):
         Inherited from OperationModel.
     """
 
+    # rows of the operations table written by the last massive write of this object
+    _affected_rows: Optional[int] = None
+
+    @property
+    def affected_rows(self) -> Optional[int]:
+        """
+        Number of operation rows created, updated or deleted by the last massive_save, delete_n_massive_save,
+        shift_n_save or delete_n_shift call, e.g.: len(operations_list) + 1 after a massive_save of a new operation.
+        Callers can compare it with the number of rows they expected to write.
+        """
+        return self._affected_rows
+
     @classmethod
     def get_operation_by_id(cls, user_id: str, account_id: str, operation_id: str) -> "UserOperations":
         """
@@ -172,25 +263,23 @@ class UserOperations(OperationsModel):
         Returns:
             UserOperation: An UserOperation object with that operation data.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (account_id,))
-        table_name = cur.fetchone()[0]
-        cur.execute(f"SELECT * FROM {table_name} WHERE operation_id = ?", (operation_id,))
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(f"SELECT * FROM {table_name} WHERE operation_id = ?", (operation_id,))
 
-        record = cur.fetchone()
-        conn.close()
+            record = cur.fetchone()
 
         if not record:
             raise OperationNotFoundError
 
-        record = dict(record)
+        record = dict(record_from_db(record, exponent))
         record["user_id"] = user_id
         record["account_id"] = account_id
 
-        operation = cls(**record)
+        operation = load_model(cls, record)
 
         return operation
 
@@ -206,65 +295,129 @@ class UserOperations(OperationsModel):
         Returns:
             UserOperation: An UserOperation object with the last operation datetime.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (account_id,))
-        table_name = cur.fetchone()[0]
-        cur.execute(f"SELECT * FROM {table_name} ORDER BY operation_datetime DESC LIMIT 1;")
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(f"SELECT * FROM {table_name} ORDER BY operation_ts DESC, created_at DESC LIMIT 1;")
 
-        record = cur.fetchone()
-        conn.close()
+            record = cur.fetchone()
 
         if not record:
             raise OperationNotFoundError
 
-        record = dict(record)
+        record = dict(record_from_db(record, exponent))
         record["user_id"] = user_id
         record["account_id"] = account_id
 
-        operation = cls(**record)
+        operation = load_model(cls, record)
 
         return operation
 
     @classmethod
     def get_operations_list(
-        cls, user_id: str, account_id: str, order_by_datetime: str | None = None
-    ) -> List["UserOperations"]:
+        cls, user_id: str, account_id: str, order_by_datetime: str | None = None, as_rows: bool = False
+    ) -> List["UserOperations"] | List["OperationRow"]:
         """
         Fetches all operations from db and returns a list of UserOperation objects.
 
         Args:
             user_id (str): The unique identifier for the user
             account_id (str): The unique identifier for the account
+            order_by_datetime (str, optional): 'ASC' or 'DESC'.
+            as_rows (bool, optional): Returns OperationRow objects instead, e.g.: to render them. Defaults to False.
         Returns:
             list[UserOperation]: A list of UserOperation objects for a given account.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (account_id,))
-        table_name = cur.fetchone()[0]
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
 
-        select_op_query = f"SELECT * FROM {table_name}"
-        if order_by_datetime == "ASC":
-            select_op_query += " ORDER BY operation_datetime ASC;"
-        elif order_by_datetime == "DESC":
-            select_op_query += " ORDER BY operation_datetime DESC"
+            select_op_query = f"SELECT * FROM {table_name}"
+            if order_by_datetime == "ASC":
+                select_op_query += " ORDER BY operation_ts ASC;"
+            elif order_by_datetime == "DESC":
+                select_op_query += " ORDER BY operation_ts DESC"
 
-        cur.execute(select_op_query)
+            cur.execute(select_op_query)
 
-        records = cur.fetchall()
-        conn.close()
+            records = cur.fetchall()
 
-        records = [dict(record, user_id=user_id, account_id=account_id) for record in records]
+        if as_rows:
+            return OperationRow.from_records(records, exponent, user_id=user_id, account_id=account_id)
 
-        operations = [cls(**record) for record in records]
+        operations = load_models(
+            cls, (record_from_db(record, exponent) for record in records), user_id=user_id, account_id=account_id
+        )
 
         return operations
 
+    @classmethod
+    def iter_operations(
+        cls,
+        user_id: str,
+        account_id: str,
+        from_datetime: Optional[datetime] = None,
+        to_datetime: Optional[datetime] = None,
+        operation_types: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[Optional[str]]] = None,
+        order_by_datetime: str | None = None,
+        limit: Optional[int] = None,
+        batch_size: int = READ_BATCH_SIZE,
+        as_rows: bool = False,
+    ) -> Iterator["UserOperations"] | Iterator["OperationRow"]:
+        """
+        Streams the operations of an account matching the given filters, which are applied in the query. The rows are
+        fetched and converted batch_size at a time, so the memory doesn't grow with the size of the account.
+
+        The generator holds a pooled connection of its thread until it is exhausted or closed: iterate it on a single
+        thread, and close it (e.g.: with contextlib.closing) to stop early.
+
+        Args:
+            user_id (str): The unique identifier for the user
+            account_id (str): The unique identifier for the account
+            from_datetime (datetime, optional): initial datetime, included.
+            to_datetime (datetime, optional): final datetime, included.
+            operation_types (Sequence[str], optional): e.g.: ["income", "transfer_in"].
+            categories (Sequence[str], optional): Categories to keep, None for the operations without category.
+            order_by_datetime (str, optional): 'ASC' or 'DESC'.
+            limit (int, optional): Maximum number of operations.
+            batch_size (int, optional): Number of rows per fetchmany call.
+            as_rows (bool, optional): Yields OperationRow objects instead, e.g.: to render them. Defaults to False.
+        Yields:
+            UserOperations: The operations of the account, as get_operations_list would return them.
+        """
+        conditions, params = operation_filters(from_datetime, to_datetime, operation_types, categories)
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+
+            select_op_query = f"SELECT * FROM {table_name}"
+            if conditions:
+                select_op_query += f" WHERE {conditions}"
+            if order_by_datetime in ("ASC", "DESC"):
+                select_op_query += f" ORDER BY operation_ts {order_by_datetime}"
+            if limit is not None:
+                select_op_query += " LIMIT ?"
+                params.append(limit)
+
+            cur.execute(select_op_query, params)
+            for records in fetch_in_batches(cur, batch_size):
+                if as_rows:
+                    yield from OperationRow.from_records(records, exponent, user_id=user_id, account_id=account_id)
+                else:
+                    yield from load_models(
+                        cls,
+                        (record_from_db(record, exponent) for record in records),
+                        user_id=user_id,
+                        account_id=account_id,
+                    )
+
     @classmethod
     def get_operations_list_by_tags(cls, user_id: str, account_id: str, tags: Sequence) -> List["UserOperations"]:
         """
@@ -277,21 +430,19 @@ class UserOperations(OperationsModel):
         Returns:
             list[UserOperation]: A list of UserOperation objects for a given account with given tags.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (account_id,))
-        table_name = cur.fetchone()[0]
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
 
-        like_clause = f"SELECT * FROM {table_name} WHERE tags LIKE ? " + "OR tags LIKE ? " * (len(tags) - 1)
-        tup_tags = tuple(f"%{tag}%" for tag in tags)
-        cur.execute(like_clause, tup_tags)
+            like_clause = f"SELECT * FROM {table_name} WHERE tags LIKE ? " + "OR tags LIKE ? " * (len(tags) - 1)
+            tup_tags = tuple(f"%{tag}%" for tag in tags)
+            cur.execute(like_clause, tup_tags)
 
-        records = cur.fetchall()
-        conn.close()
+            records = cur.fetchall()
 
-        operations = [cls(**record) for record in records]
+        operations = load_models(cls, (record_from_db(record, exponent) for record in records))
 
         return operations
 
@@ -313,37 +464,35 @@ class UserOperations(OperationsModel):
         Returns:
             list[UserOperations]: A list of sorted UserOperation objects for a given account with given datetimes.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (account_id,))
-        table_name = cur.fetchone()[0]
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
 
-        cur.execute(
-            f"""
-            WITH previus_row AS (
-              SELECT *
-              FROM {table_name}
-              WHERE operation_datetime <= ?
-              ORDER BY operation_datetime DESC, created_at DESC
-              LIMIT 1
+            cur.execute(
+                f"""
+                WITH previus_row AS (
+                  SELECT *
+                  FROM {table_name}
+                  WHERE operation_ts <= ?
+                  ORDER BY operation_ts DESC, created_at DESC
+                  LIMIT 1
+                )
+                SELECT *
+                FROM {table_name}
+                WHERE operation_ts > ?
+                UNION ALL
+                SELECT *
+                FROM previus_row
+                ORDER BY operation_ts ASC;
+                """,
+                (epoch_us(operation_datetime), epoch_us(operation_datetime)),
             )
-            SELECT *
-            FROM {table_name}
-            WHERE operation_datetime > ?
-            UNION ALL
-            SELECT *
-            FROM previus_row
-            ORDER BY operation_datetime ASC;
-            """,
-            (operation_datetime, operation_datetime),
-        )
 
-        records = cur.fetchall()
-        conn.close()
+            records = cur.fetchall()
 
-        operations = [cls(**record) for record in records]
+        operations = load_models(cls, (record_from_db(record, exponent) for record in records))
 
         return operations
 
@@ -360,69 +509,316 @@ class UserOperations(OperationsModel):
         Returns:
             list[UserOperations]: A list of sorted UserOperation objects for a given account with given datetimes.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(user_id)))
-        conn.row_factory = sqlite3.Row
-
-        cur = conn.cursor()
-        cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (account_id,))
-        table_name = cur.fetchone()[0]
-        cur.execute(
-            f"""
-            WITH row_number_table AS (
-              SELECT *, row_number()
-              over (ORDER BY operation_datetime, created_at ASC)
-              AS row_number
-              FROM {table_name}
-              WHERE operation_datetime <= (
-                SELECT operation_datetime
-                FROM {table_name}
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(
+                f"""
+                WITH row_number_table AS (
+                  SELECT *, row_number()
+                  over (ORDER BY operation_ts, created_at ASC)
+                  AS row_number
+                  FROM {table_name}
+                  WHERE operation_ts <= (
+                    SELECT operation_ts
+                    FROM {table_name}
+                    WHERE operation_id = ?
+                    )
+                )
+                SELECT operation_id,
+                  operation_datetime,
+                  cumulative_amount,
+                  amount,
+                  operation_type,
+                  category,
+                  subcategory,
+                  description,
+                  tags,
+                  group_id,
+                  detail_id,
+                  created_at,
+                  updated_at,
+                  operation_ts
+                FROM row_number_table
+                WHERE row_number = (
+                  SELECT row_number-1
+                  FROM row_number_table
+                  WHERE operation_id=?
+                )
+                UNION
+                SELECT * FROM {table_name}
                 WHERE operation_id = ?
+                UNION
+                SELECT * FROM {table_name}
+                WHERE operation_ts >= (
+                  SELECT operation_ts FROM {table_name}
+                  WHERE operation_id = ?
                 )
+                ORDER BY operation_ts, created_at;
+                """,
+                (
+                    operation_id,
+                    operation_id,
+                    operation_id,
+                    operation_id,
+                ),
             )
-            SELECT operation_id,
-              operation_datetime,
-              cumulative_amount,
-              amount,
-              operation_type,
-              category,
-              subcategory,
-              description,
-              tags,
-              group_id,
-              detail_id,
-              created_at,
-              updated_at
-            FROM row_number_table
-            WHERE row_number = (
-              SELECT row_number-1
-              FROM row_number_table
-              WHERE operation_id=?
+
+            records = cur.fetchall()
+
+        operations = load_models(cls, (record_from_db(record, exponent) for record in records))
+
+        return operations
+
+    @classmethod
+    def get_operations_list_since(
+        cls, user_id: str, account_id: str, operation_datetime: datetime
+    ) -> List["UserOperations"]:
+        """
+        Fetches all operations from db with a datetime equal or after the input datetime, sorted by datetime and
+        creation.
+
+        Args:
+            user_id (str): The unique identifier for the user
+            account_id (str): The unique identifier for the account
+            operation_datetime (datetime): the datetime to use as filter
+        Returns:
+            list[UserOperations]: A list of sorted UserOperation objects for a given account with given datetimes.
+        """
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(
+                f"""
+                SELECT *
+                FROM {table_name}
+                WHERE operation_ts >= ?
+                ORDER BY operation_ts, created_at;
+                """,
+                (epoch_us(operation_datetime),),
             )
-            UNION
-            SELECT * FROM {table_name}
-            WHERE operation_id = ?
-            UNION
-            SELECT * FROM {table_name}
-            WHERE operation_datetime >= (
-              SELECT operation_datetime FROM {table_name}
-              WHERE operation_id = ?
+            records = cur.fetchall()
+
+        return load_models(
+            cls, (record_from_db(record, exponent) for record in records), user_id=user_id, account_id=account_id
+        )
+
+    @classmethod
+    def get_operations_list_from_ids(
+        cls, user_id: str, account_id: str, operation_ids: Sequence[str]
+    ) -> List["UserOperations"]:
+        """
+        Fetches all operations from db with a datetime equal or after the oldest datetime of the operations with given
+        ids, sorted by datetime and creation. The first operation of the list is the first one of that datetime.
+
+        Args:
+            user_id (str): The unique identifier for the user
+            account_id (str): The unique identifier for the account
+            operation_ids (Sequence[str]): The unique identifiers of the operations
+        Returns:
+            list[UserOperations]: A list of sorted UserOperation objects for a given account with given datetimes.
+        """
+        if not operation_ids:
+            return []
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(
+                f"""
+                SELECT *
+                FROM {table_name}
+                WHERE operation_ts >= (
+                  SELECT MIN(operation_ts)
+                  FROM {table_name}
+                  WHERE operation_id IN ({", ".join("?" * len(operation_ids))})
+                )
+                ORDER BY operation_ts, created_at;
+                """,
+                tuple(operation_ids),
             )
-            ORDER BY operation_datetime, created_at;
-            """,
-            (
-                operation_id,
-                operation_id,
-                operation_id,
-                operation_id,
-            ),
+            records = cur.fetchall()
+
+        return load_models(
+            cls, (record_from_db(record, exponent) for record in records), user_id=user_id, account_id=account_id
         )
 
-        records = cur.fetchall()
-        conn.close()
+    @classmethod
+    def get_operations_list_after(
+        cls, user_id: str, account_id: str, after: Tuple[datetime, datetime]
+    ) -> List["UserOperations"]:
+        """
+        Fetches all operations from db after a chronological position, sorted by datetime and creation.
 
-        operations = [cls(**record) for record in records]
+        Args:
+            user_id (str): The unique identifier for the user
+            account_id (str): The unique identifier for the account
+            after (Tuple[datetime, datetime]): (operation_datetime, created_at) of the position, excluded.
+        Returns:
+            list[UserOperations]: A list of sorted UserOperation objects for a given account after the position.
+        """
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(
+                f"""
+                SELECT *
+                FROM {table_name}
+                WHERE (operation_ts, created_at) > (?, ?)
+                ORDER BY operation_ts, created_at;
+                """,
+                (epoch_us(after[0]), after[1]),
+            )
+            records = cur.fetchall()
 
-        return operations
+        return load_models(
+            cls, (record_from_db(record, exponent) for record in records), user_id=user_id, account_id=account_id
+        )
+
+    @classmethod
+    def get_cumulative_bounds(
+        cls, user_id: str, account_id: str, operation_datetime: datetime, created_at: datetime
+    ) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        """
+        Fetches, around a chronological position, the cumulative amount of the last operation up to that position and
+        the minimum cumulative amount of the operations after it. Operations are sorted by datetime and creation.
+
+        Args:
+            user_id (str): The unique identifier for the user
+            account_id (str): The unique identifier for the account
+            operation_datetime (datetime): datetime of the position
+            created_at (datetime): creation datetime of the position, to sort operations with the same datetime
+        Returns:
+            Tuple[Decimal, Decimal]: (previous cumulative amount, minimum later cumulative amount), None if there is no
+            operation before or after the position respectively. With ACC_BALANCE_INDEX=1 they come from the balance
+            index of the account.
+        """
+        if BALANCE_INDEX:
+            return get_balance_index(user_id, account_id).cumulative_bounds(
+                position_key(operation_datetime, created_at)
+            )
+
+        position = (epoch_us(operation_datetime), created_at)
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(
+                f"""
+                SELECT
+                  (SELECT cumulative_amount
+                   FROM {table_name}
+                   WHERE (operation_ts, created_at) <= (?, ?)
+                   ORDER BY operation_ts DESC, created_at DESC
+                   LIMIT 1),
+                  (SELECT MIN(cumulative_amount)
+                   FROM {table_name}
+                   WHERE (operation_ts, created_at) > (?, ?));
+                """,
+                position + position,
+            )
+            previus_amount, min_amount = cur.fetchone()
+
+        return amount_from_db(previus_amount, exponent), amount_from_db(min_amount, exponent)
+
+    @classmethod
+    def get_min_cumulative_amount_between(
+        cls, user_id: str, account_id: str, after: Tuple[datetime, datetime], before: Tuple[datetime, datetime]
+    ) -> Optional[Decimal]:
+        """
+        Fetches the minimum cumulative amount of the operations between two chronological positions (both excluded).
+
+        Args:
+            user_id (str): The unique identifier for the user
+            account_id (str): The unique identifier for the account
+            after (Tuple[datetime, datetime]): (operation_datetime, created_at) of the start of the interval.
+            before (Tuple[datetime, datetime]): (operation_datetime, created_at) of the end of the interval.
+        Returns:
+            Decimal: The minimum cumulative amount, None if there is no operation in the interval. With
+            ACC_BALANCE_INDEX=1 it comes from the balance index of the account.
+        """
+        if BALANCE_INDEX:
+            return get_balance_index(user_id, account_id).min_cumulative_between(
+                position_key(*after), position_key(*before)
+            )
+
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(
+                f"""
+                SELECT MIN(cumulative_amount)
+                FROM {table_name}
+                WHERE (operation_ts, created_at) > (?, ?) AND (operation_ts, created_at) < (?, ?);
+                """,
+                (epoch_us(after[0]), after[1], epoch_us(before[0]), before[1]),
+            )
+            (min_amount,) = cur.fetchone()
+
+        return amount_from_db(min_amount, exponent)
+
+    @classmethod
+    def get_first_operation_below(
+        cls,
+        user_id: str,
+        account_id: str,
+        amount: Decimal,
+        after: Tuple[datetime, datetime],
+        before: Optional[Tuple[datetime, datetime]] = None,
+    ) -> Optional["UserOperations"]:
+        """
+        Fetches the first operation, in chronological order, between two positions (both excluded) whose cumulative
+        amount is lower than a given amount, e.g.: the first operation that a shift of -amount would make negative.
+
+        Args:
+            user_id (str): The unique identifier for the user
+            account_id (str): The unique identifier for the account
+            amount (Decimal): The threshold.
+            after (Tuple[datetime, datetime]): (operation_datetime, created_at) of the start of the interval.
+            before (Tuple[datetime, datetime], optional): (operation_datetime, created_at) of the end of the interval.
+                If not provided, up to the last operation.
+        Returns:
+            UserOperations: The first operation below the threshold, None if there is none. With ACC_BALANCE_INDEX=1
+            it is found with the balance index of the account.
+        """
+        if BALANCE_INDEX:
+            operation_id = get_balance_index(user_id, account_id).first_below(
+                position_key(*after), None if before is None else position_key(*before), amount
+            )
+            if operation_id is None:
+                return None
+            return cls.get_operation_by_id(user_id, account_id, operation_id)
+
+        before_ts, before_created_at = OPEN_END if before is None else (epoch_us(before[0]), before[1])
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            cur.execute(
+                f"""
+                SELECT *
+                FROM {table_name}
+                WHERE (operation_ts, created_at) > (?, ?) AND (operation_ts, created_at) < (?, ?)
+                  AND cumulative_amount < ?
+                ORDER BY operation_ts, created_at
+                LIMIT 1;
+                """,
+                (epoch_us(after[0]), after[1], before_ts, before_created_at, to_minor_units(amount, exponent)),
+            )
+            record = cur.fetchone()
+
+        if not record:
+            return None
+        return load_model(cls, record_from_db(record, exponent), user_id=user_id, account_id=account_id)
 
     @classmethod
     def get_unique_categories(cls, user_id: str) -> List[str]:
@@ -434,16 +830,18 @@ class UserOperations(OperationsModel):
         Returns:
             list[str]: A list of strings (categories)
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(user_id)))
+        if is_consolidated_layout(user_id):
+            with get_connection(user_id) as conn:
+                return conn.execute("SELECT DISTINCT category FROM operations;").fetchall()
 
-        cur = conn.cursor()
-        cur.execute("SELECT table_name FROM accounts;")
-        table_name_list = [table_name[0] for table_name in cur.fetchall()]
-        categories = []
-        for table_name in table_name_list:
-            cur.execute(f"SELECT DISTINCT category FROM {table_name};")
-            categories.extend(cur.fetchall())
-        conn.close()
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT table_name FROM accounts;")
+            table_name_list = [table_name[0] for table_name in cur.fetchall()]
+            categories = []
+            for table_name in table_name_list:
+                cur.execute(f"SELECT DISTINCT category FROM {table_name};")
+                categories.extend(cur.fetchall())
 
         categories = list(set(categories))
         return categories
@@ -459,21 +857,27 @@ class UserOperations(OperationsModel):
         Returns:
             list[str]: A list of strings (subcategories)
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(user_id)))
-
-        cur = conn.cursor()
-        cur.execute("SELECT table_name FROM accounts;")
-        table_name_list = [table_name[0] for table_name in cur.fetchall()]
-        subcategories = []
-        if category:
-            for table_name in table_name_list:
-                cur.execute(f"SELECT DISTINCT subcategory FROM {table_name} WHERE category = ?", (category,))
-                subcategories.extend(cur.fetchall())
-        else:
-            for table_name in table_name_list:
-                cur.execute(f"SELECT DISTINCT subcategory FROM {table_name};")
-                subcategories.extend(cur.fetchall())
-        conn.close()
+        if is_consolidated_layout(user_id):
+            with get_connection(user_id) as conn:
+                if category:
+                    cur = conn.execute("SELECT DISTINCT subcategory FROM operations WHERE category = ?", (category,))
+                else:
+                    cur = conn.execute("SELECT DISTINCT subcategory FROM operations;")
+                return cur.fetchall()
+
+        with get_connection(user_id) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT table_name FROM accounts;")
+            table_name_list = [table_name[0] for table_name in cur.fetchall()]
+            subcategories = []
+            if category:
+                for table_name in table_name_list:
+                    cur.execute(f"SELECT DISTINCT subcategory FROM {table_name} WHERE category = ?", (category,))
+                    subcategories.extend(cur.fetchall())
+            else:
+                for table_name in table_name_list:
+                    cur.execute(f"SELECT DISTINCT subcategory FROM {table_name};")
+                    subcategories.extend(cur.fetchall())
 
         subcategories = list(set(subcategories))
 
@@ -490,19 +894,18 @@ class UserOperations(OperationsModel):
         """
         self.created_at = self.updated_at = datetime.now(UTC)
 
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(self.user_id)))
-        cur = conn.cursor()
-        try:
-            cur.execute("BEGIN TRANSACTION")
-            cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (self.account_id,))
-            table_name = cur.fetchone()[0]
+        # the errors are raised, so a failed insert aborts the transaction of the caller, e.g.: a transfer
+        with get_transaction(self.user_id) as conn:
+            cur = conn.cursor()
+            table_name = resolve_table_name(self.user_id, self.account_id, cur)
+            exponent = _amount_exponent(self.user_id, self.account_id, cur)
             cur.execute(
-                INSERT_INTO_QUERY.substitute(table_name=table_name),
+                build_statement(INSERT_INTO_QUERY, table_name),
                 (
                     self.operation_id,
                     self.operation_datetime,
-                    self.cumulative_amount,
-                    self.amount,
+                    to_minor_units(self.cumulative_amount, exponent),
+                    to_minor_units(self.amount, exponent),
                     self.operation_type,
                     self.category,
                     self.subcategory,
@@ -512,6 +915,7 @@ class UserOperations(OperationsModel):
                     self.detail_id,
                     self.created_at,
                     self.updated_at,
+                    epoch_us(self.operation_datetime),
                 ),
             )
             # if self.account_total: doesn't work well with account_total=0, since 0==False but (not None==0)==True
@@ -524,11 +928,7 @@ class UserOperations(OperationsModel):
                         self.account_id,
                     ),
                 )
-            conn.commit()
-        except sqlite3.Error:
-            conn.rollback()
-        finally:
-            conn.close()
+        _sync_balance_index(self.user_id, self.account_id, written=[self])
         return self
 
     def save(self) -> "UserOperations":
@@ -542,20 +942,17 @@ class UserOperations(OperationsModel):
         """
         self.updated_at = datetime.now(UTC)
 
-        with sqlite3.connect(
-            (os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(self.user_id)))
-        ) as conn:
+        with get_transaction(self.user_id) as conn:
             cur = conn.cursor()
-            cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (self.account_id,))
-
-            table_name = cur.fetchone()[0]
+            table_name = resolve_table_name(self.user_id, self.account_id, cur)
+            exponent = _amount_exponent(self.user_id, self.account_id, cur)
 
             cur.execute(
-                UPDATE_OPERATIONS_QUERY.substitute(table_name=table_name),
+                build_statement(UPDATE_OPERATIONS_QUERY, table_name),
                 (
                     self.operation_datetime,
-                    self.cumulative_amount,
-                    self.amount,
+                    to_minor_units(self.cumulative_amount, exponent),
+                    to_minor_units(self.amount, exponent),
                     self.operation_type,
                     self.category,
                     self.subcategory,
@@ -564,6 +961,7 @@ class UserOperations(OperationsModel):
                     self.group_id,
                     self.detail_id,
                     self.updated_at,
+                    epoch_us(self.operation_datetime),
                     self.operation_id,
                 ),
             )
@@ -576,14 +974,13 @@ class UserOperations(OperationsModel):
                         self.account_id,
                     ),
                 )
-            conn.commit()
-
-        conn.close()
+        _sync_balance_index(self.user_id, self.account_id, written=[self])
         return self
 
     def massive_save(self, operations_list: list, edit_flag: bool = False) -> None:
         """
-        Edits several operations in the database in the given table (account).
+        Edits several operations in the database in the given table (account). The updates are sent in batches (see
+        executemany_in_batches) and the number of written rows is kept in affected_rows.
 
         args:
             self (useroperations): an useroperations object.
@@ -594,19 +991,111 @@ class UserOperations(OperationsModel):
         """
         self.created_at = self.updated_at = datetime.now(UTC)
 
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(self.user_id)))
-        cur = conn.cursor()
         try:
-            cur.execute("BEGIN TRANSACTION")
-            cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (self.account_id,))
-            table_name = cur.fetchone()[0]
-            for oper in operations_list:
-                cur.execute(
-                    UPDATE_OPERATIONS_QUERY.substitute(table_name=table_name),
+            with get_transaction(self.user_id) as conn:
+                cur = conn.cursor()
+                table_name = resolve_table_name(self.user_id, self.account_id, cur)
+                exponent = _amount_exponent(self.user_id, self.account_id, cur)
+                total_changes = conn.total_changes
+                executemany_in_batches(
+                    cur,
+                    build_statement(UPDATE_OPERATIONS_QUERY, table_name),
+                    (
+                        (
+                            oper.operation_datetime,
+                            to_minor_units(oper.cumulative_amount, exponent),
+                            to_minor_units(oper.amount, exponent),
+                            oper.operation_type,
+                            oper.category,
+                            oper.subcategory,
+                            oper.description,
+                            oper.tags,
+                            oper.group_id,
+                            oper.detail_id,
+                            self.updated_at,
+                            epoch_us(oper.operation_datetime),
+                            oper.operation_id,
+                        )
+                        for oper in operations_list
+                    ),
+                )
+                if not edit_flag:
+                    cur.execute(
+                        build_statement(INSERT_INTO_QUERY, table_name),
+                        (
+                            self.operation_id,
+                            self.operation_datetime,
+                            to_minor_units(self.cumulative_amount, exponent),
+                            to_minor_units(self.amount, exponent),
+                            self.operation_type,
+                            self.category,
+                            self.subcategory,
+                            self.description,
+                            self.tags,
+                            self.group_id,
+                            self.detail_id,
+                            self.created_at,
+                            self.updated_at,
+                            epoch_us(self.operation_datetime),
+                        ),
+                    )
+                self._affected_rows = conn.total_changes - total_changes
+                if self.account_total is not None:
+                    cur.execute(
+                        UPDATE_ACC_TOTAL_QUERY,
+                        (
+                            self.account_total,
+                            self.updated_at,
+                            self.account_id,
+                        ),
+                    )
+            written = operations_list if edit_flag else [*operations_list, self]
+            _sync_balance_index(self.user_id, self.account_id, written=written)
+        except sqlite3.Error:
+            raise sqlite3.Error
+        return self
+
+    @classmethod
+    def massive_create(
+        cls,
+        operations_list: Sequence[OperationsModel],
+        updated_operations: Sequence[OperationsModel] = (),
+        account_total: Optional[Decimal] = None,
+    ) -> List["UserOperations"]:
+        """
+        Creates several operations of the same account and updates the cumulative_amount of other existing operations
+        in a single transaction. The inserts and updates are sent in batches (see executemany_in_batches).
+
+        args:
+            operations_list (Sequence[OperationsModel]): The new operations, with their cumulative_amount calculated.
+                The ones without created_at get the current datetime.
+            updated_operations (Sequence[OperationsModel]): Existing operations with their new cumulative_amount.
+            account_total (Decimal, optional): New account_total of the account. Not updated if None.
+        returns:
+            List[UserOperations]: The created operations.
+        """
+        if not operations_list:
+            return []
+        user_id, account_id = operations_list[0].user_id, operations_list[0].account_id
+        updated_at = datetime.now(UTC)
+        created = [oper if isinstance(oper, cls) else cls(**oper.model_dump()) for oper in operations_list]
+        for oper in created:
+            oper.created_at = oper.created_at or updated_at
+            oper.updated_at = updated_at
+
+        with get_transaction(user_id) as conn:
+            cur = conn.cursor()
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            executemany_in_batches(
+                cur,
+                build_statement(INSERT_INTO_QUERY, table_name),
+                (
                     (
+                        oper.operation_id,
                         oper.operation_datetime,
-                        oper.cumulative_amount,
-                        oper.amount,
+                        to_minor_units(oper.cumulative_amount, exponent),
+                        to_minor_units(oper.amount, exponent),
                         oper.operation_type,
                         oper.category,
                         oper.subcategory,
@@ -614,18 +1103,220 @@ class UserOperations(OperationsModel):
                         oper.tags,
                         oper.group_id,
                         oper.detail_id,
-                        self.updated_at,
+                        oper.created_at,
+                        oper.updated_at,
+                        epoch_us(oper.operation_datetime),
+                    )
+                    for oper in created
+                ),
+            )
+            executemany_in_batches(
+                cur,
+                build_statement(UPDATE_CUMULATIVE_QUERY, table_name),
+                (
+                    (to_minor_units(oper.cumulative_amount, exponent), updated_at, oper.operation_id)
+                    for oper in updated_operations
+                ),
+            )
+            if account_total is not None:
+                cur.execute(UPDATE_ACC_TOTAL_QUERY, (account_total, updated_at, account_id))
+        _sync_balance_index(user_id, account_id, written=created)
+        return created
+
+    @classmethod
+    def massive_update(
+        cls,
+        user_id: str,
+        account_id: str,
+        edited_operations: Sequence[OperationsModel],
+        updated_operations: Sequence[OperationsModel] = (),
+        account_total: Optional[Decimal] = None,
+    ) -> int:
+        """
+        Saves several edited operations of the same account and updates the cumulative_amount of other existing
+        operations in a single transaction. The updates are sent in batches (see executemany_in_batches).
+
+        args:
+            user_id (str): The unique identifier for the user.
+            account_id (str): The unique identifier for the account.
+            edited_operations (Sequence[OperationsModel]): The edited operations, every field is saved.
+            updated_operations (Sequence[OperationsModel]): Existing operations with their new cumulative_amount.
+            account_total (Decimal, optional): New account_total of the account. Not updated if None.
+        returns:
+            int: Number of written operations.
+        """
+        updated_at = datetime.now(UTC)
+
+        with get_transaction(user_id) as conn:
+            cur = conn.cursor()
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            written_rows = executemany_in_batches(
+                cur,
+                build_statement(UPDATE_OPERATIONS_QUERY, table_name),
+                (
+                    (
+                        oper.operation_datetime,
+                        to_minor_units(oper.cumulative_amount, exponent),
+                        to_minor_units(oper.amount, exponent),
+                        oper.operation_type,
+                        oper.category,
+                        oper.subcategory,
+                        oper.description,
+                        oper.tags,
+                        oper.group_id,
+                        oper.detail_id,
+                        updated_at,
+                        epoch_us(oper.operation_datetime),
                         oper.operation_id,
+                    )
+                    for oper in edited_operations
+                ),
+            )
+            written_rows += executemany_in_batches(
+                cur,
+                build_statement(UPDATE_CUMULATIVE_QUERY, table_name),
+                (
+                    (to_minor_units(oper.cumulative_amount, exponent), updated_at, oper.operation_id)
+                    for oper in updated_operations
+                ),
+            )
+            if account_total is not None:
+                cur.execute(UPDATE_ACC_TOTAL_QUERY, (account_total, updated_at, account_id))
+        _sync_balance_index(user_id, account_id, written=edited_operations)
+        return written_rows
+
+    @classmethod
+    def massive_delete(
+        cls,
+        user_id: str,
+        account_id: str,
+        operation_ids: Sequence[str],
+        updated_operations: Sequence[OperationsModel] = (),
+        account_total: Optional[Decimal] = None,
+    ) -> int:
+        """
+        Deletes several operations of the same account and updates the cumulative_amount of other existing operations
+        in a single transaction. The deletions and updates are sent in batches (see executemany_in_batches).
+
+        args:
+            user_id (str): The unique identifier for the user.
+            account_id (str): The unique identifier for the account.
+            operation_ids (Sequence[str]): The unique identifiers of the operations to delete.
+            updated_operations (Sequence[OperationsModel]): Existing operations with their new cumulative_amount.
+            account_total (Decimal, optional): New account_total of the account. Not updated if None.
+        returns:
+            int: Number of deleted operations.
+        """
+        updated_at = datetime.now(UTC)
+
+        with get_transaction(user_id) as conn:
+            cur = conn.cursor()
+            table_name = resolve_table_name(user_id, account_id, cur)
+            exponent = _amount_exponent(user_id, account_id, cur)
+            executemany_in_batches(
+                cur,
+                build_statement(UPDATE_CUMULATIVE_QUERY, table_name),
+                (
+                    (to_minor_units(oper.cumulative_amount, exponent), updated_at, oper.operation_id)
+                    for oper in updated_operations
+                ),
+            )
+            deleted_rows = executemany_in_batches(
+                cur,
+                build_statement(DELETE_OPERATION_QUERY, table_name),
+                ((operation_id,) for operation_id in operation_ids),
+            )
+            if account_total is not None:
+                cur.execute(UPDATE_ACC_TOTAL_QUERY, (account_total, updated_at, account_id))
+        _sync_balance_index(user_id, account_id, deleted=operation_ids)
+        return deleted_rows
+
+    def _shift_cumulatives(
+        self,
+        cur: sqlite3.Cursor,
+        table_name: str,
+        exponent: Optional[int],
+        shift: Decimal,
+        after: Tuple[datetime, datetime],
+        before: Optional[Tuple[datetime, datetime]] = None,
+    ) -> None:
+        """
+        Adds shift to the cumulative_amount of every operation between two (operation_datetime, created_at) positions,
+        or after the first one if there is no end position.
+        """
+        if exponent is None:
+            template = SHIFT_DECIMAL_CUMULATIVES_QUERY
+        else:
+            template = SHIFT_CUMULATIVES_QUERY
+        before_ts, before_created_at = OPEN_END if before is None else (epoch_us(before[0]), before[1])
+        cur.execute(
+            build_statement(template, table_name),
+            (
+                to_minor_units(shift, exponent),
+                self.updated_at,
+                epoch_us(after[0]),
+                after[1],
+                before_ts,
+                before_created_at,
+            ),
+        )
+
+    def shift_n_save(self, shifts: Sequence[Tuple], edit_flag: bool = False) -> "UserOperations":
+        """
+        Creates or edits the self operation and adds a constant amount to the cumulative_amount of the operations of
+        one or more chronological ranges, with one statement per range. Only valid when the other operations of every
+        range keep their order, e.g.: a new operation, an edition of the amount or a move of the self operation.
+
+        args:
+            self (useroperations): an useroperations object.
+            shifts (Sequence[Tuple]): (shift, after, before) for every range: the amount to add to the cumulative_amount
+                of the operations between the after and before (operation_datetime, created_at) positions, both
+                excluded. before is None for a range up to the last operation. The positions are the ones before the
+                self operation is written.
+            edit_flag (bool): True if there is a self edition involved.
+        returns:
+            self (useroperations): an useroperations object.
+        """
+        self.updated_at = datetime.now(UTC)
+        if not edit_flag:
+            self.created_at = self.updated_at
+
+        with get_transaction(self.user_id) as conn:
+            cur = conn.cursor()
+            table_name = resolve_table_name(self.user_id, self.account_id, cur)
+            exponent = _amount_exponent(self.user_id, self.account_id, cur)
+            total_changes = conn.total_changes
+            # shifted before the self operation is written, so the self row is never shifted
+            for shift, after, before in shifts:
+                self._shift_cumulatives(cur, table_name, exponent, shift, after, before)
+            if edit_flag:
+                cur.execute(
+                    build_statement(UPDATE_OPERATIONS_QUERY, table_name),
+                    (
+                        self.operation_datetime,
+                        to_minor_units(self.cumulative_amount, exponent),
+                        to_minor_units(self.amount, exponent),
+                        self.operation_type,
+                        self.category,
+                        self.subcategory,
+                        self.description,
+                        self.tags,
+                        self.group_id,
+                        self.detail_id,
+                        self.updated_at,
+                        epoch_us(self.operation_datetime),
+                        self.operation_id,
                     ),
                 )
-            if not edit_flag:
+            else:
                 cur.execute(
-                    INSERT_INTO_QUERY.substitute(table_name=table_name),
+                    build_statement(INSERT_INTO_QUERY, table_name),
                     (
                         self.operation_id,
                         self.operation_datetime,
-                        self.cumulative_amount,
-                        self.amount,
+                        to_minor_units(self.cumulative_amount, exponent),
+                        to_minor_units(self.amount, exponent),
                         self.operation_type,
                         self.category,
                         self.subcategory,
@@ -635,8 +1326,10 @@ class UserOperations(OperationsModel):
                         self.detail_id,
                         self.created_at,
                         self.updated_at,
+                        epoch_us(self.operation_datetime),
                     ),
                 )
+            self._affected_rows = conn.total_changes - total_changes
             if self.account_total is not None:
                 cur.execute(
                     UPDATE_ACC_TOTAL_QUERY,
@@ -646,52 +1339,31 @@ class UserOperations(OperationsModel):
                         self.account_id,
                     ),
                 )
-            conn.commit()
-        except sqlite3.Error:
-            conn.rollback()
-            raise sqlite3.Error
-        finally:
-            conn.close()
+        _sync_balance_index(self.user_id, self.account_id, written=[self])
         return self
 
-    def delete_n_massive_save(self, operations_list: list) -> None:
+    def delete_n_shift(self, shift: Decimal) -> "UserOperations":
         """
-        Deletes the self operation and edits all operations affected by the deletion in a give table.
+        Deletes the self operation and adds a constant amount to the cumulative_amount of every later operation with
+        a single statement.
 
         args:
             self (useroperations): an useroperations object.
-            operations_list (list): list of OperationModel objects with the information to update the database.
+            shift (Decimal): Amount to add to the cumulative_amount of every later operation.
         returns:
             self (useroperations): an useroperations object.
         """
+        after = (self.operation_datetime, self.created_at)
         self.updated_at = datetime.now(UTC)
 
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(self.user_id)))
-        cur = conn.cursor()
-        try:
-            cur.execute("BEGIN TRANSACTION")
-            cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (self.account_id,))
-            table_name = cur.fetchone()[0]
-            for oper in operations_list:
-                cur.execute(
-                    f"""
-                    UPDATE
-                      {table_name}
-                    SET
-                      cumulative_amount = ?,
-                      updated_at = ?
-                    WHERE operation_id = ?
-                    """,
-                    (
-                        oper.cumulative_amount,
-                        self.updated_at,
-                        oper.operation_id,
-                    ),
-                )
-
-            # Delete de operation
-            cur.execute(f"DELETE FROM {table_name} WHERE operation_id = ?", (self.operation_id,))
-            # Update the account total
+        with get_transaction(self.user_id) as conn:
+            cur = conn.cursor()
+            table_name = resolve_table_name(self.user_id, self.account_id, cur)
+            exponent = _amount_exponent(self.user_id, self.account_id, cur)
+            total_changes = conn.total_changes
+            self._shift_cumulatives(cur, table_name, exponent, shift, after)
+            cur.execute(build_statement(DELETE_OPERATION_QUERY, table_name), (self.operation_id,))
+            self._affected_rows = conn.total_changes - total_changes
             if self.account_total is not None:
                 cur.execute(
                     UPDATE_ACC_TOTAL_QUERY,
@@ -701,12 +1373,53 @@ class UserOperations(OperationsModel):
                         self.account_id,
                     ),
                 )
-            conn.commit()
-            conn.commit()
+        _sync_balance_index(self.user_id, self.account_id, deleted=[self.operation_id])
+        return self
+
+    def delete_n_massive_save(self, operations_list: list) -> None:
+        """
+        Deletes the self operation and edits all operations affected by the deletion in a give table. The updates are
+        sent in batches and the number of written rows is kept in affected_rows.
+
+        args:
+            self (useroperations): an useroperations object.
+            operations_list (list): list of OperationModel objects with the information to update the database.
+        returns:
+            self (useroperations): an useroperations object.
+        """
+        self.updated_at = datetime.now(UTC)
+
+        try:
+            with get_transaction(self.user_id) as conn:
+                cur = conn.cursor()
+                table_name = resolve_table_name(self.user_id, self.account_id, cur)
+                exponent = _amount_exponent(self.user_id, self.account_id, cur)
+                total_changes = conn.total_changes
+                executemany_in_batches(
+                    cur,
+                    build_statement(UPDATE_CUMULATIVE_QUERY, table_name),
+                    (
+                        (to_minor_units(oper.cumulative_amount, exponent), self.updated_at, oper.operation_id)
+                        for oper in operations_list
+                    ),
+                )
+
+                # Delete de operation
+                cur.execute(build_statement(DELETE_OPERATION_QUERY, table_name), (self.operation_id,))
+                self._affected_rows = conn.total_changes - total_changes
+                # Update the account total
+                if self.account_total is not None:
+                    cur.execute(
+                        UPDATE_ACC_TOTAL_QUERY,
+                        (
+                            self.account_total,
+                            self.updated_at,
+                            self.account_id,
+                        ),
+                    )
+            _sync_balance_index(self.user_id, self.account_id, deleted=[self.operation_id])
         except sqlite3.Error:
-            conn.rollback()
-        finally:
-            conn.close()
+            pass
         return self
 
     def delete(self) -> None:
@@ -716,16 +1429,103 @@ class UserOperations(OperationsModel):
         Args:
             self (UserOperations): An UserOperations object.
         """
-        conn = sqlite3.connect(os.getenv("ACC_DATABASE_NAME", UserOperations._OperationsModel__db_path(self.user_id)))
-        cur = conn.cursor()
         try:
-            cur.execute("BEGIN TRANSACTION")
-            cur.execute("SELECT table_name FROM accounts WHERE account_id = ?", (self.account_id,))
-            table_name = cur.fetchone()[0]
+            with get_transaction(self.user_id) as conn:
+                cur = conn.cursor()
+                table_name = resolve_table_name(self.user_id, self.account_id, cur)
 
-            cur.execute(f"DELETE FROM {table_name} WHERE operation_id = ?", (self.operation_id,))
-            conn.commit()
+                cur.execute(build_statement(DELETE_OPERATION_QUERY, table_name), (self.operation_id,))
+            _sync_balance_index(self.user_id, self.account_id, deleted=[self.operation_id])
         except sqlite3.Error:
-            conn.rollback()
-        finally:
-            conn.close()
+            pass
+
+
+class OperationRow:
+    """
+    OperationRow: Lightweight read only operation, e.g.: to render a table or to sum amounts. It is built straight from
+    a database record without the validation of the models: the values are only converted to the types of
+    UserOperations. Use to_model to get the UserOperations object.
+
+    Args:
+        The same fields as UserOperations. The ones not provided are None.
+    """
+
+    __slots__ = (
+        "user_id",
+        "account_id",
+        "account_name",
+        "operation_id",
+        "operation_datetime",
+        "cumulative_amount",
+        "amount",
+        "operation_type",
+        "category",
+        "subcategory",
+        "description",
+        "tags",
+        "group_id",
+        "detail_id",
+        "created_at",
+        "updated_at",
+    )
+
+    def __init__(self, **fields) -> None:
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def __repr__(self) -> str:
+        return f"OperationRow(operation_id={self.operation_id!r}, account_id={self.account_id!r})"
+
+    @classmethod
+    def from_db(cls, record: sqlite3.Row, exponent: Optional[int], **fields) -> "OperationRow":
+        """
+        Builds a row from a record of an operations table.
+
+        Args:
+            record (sqlite3.Row): The record, with its amounts as they are stored.
+            exponent (int): Minor unit exponent of the account currency, or None if the database stores decimals.
+            **fields: Values not in the record, e.g.: user_id and account_id.
+        Returns:
+            OperationRow: The row, with the same values an UserOperations object would have.
+        """
+        return cls.from_records([record], exponent, **fields)[0]
+
+    @classmethod
+    def from_records(cls, records: Sequence[sqlite3.Row], exponent: Optional[int], **fields) -> List["OperationRow"]:
+        """
+        Builds the rows of several records with the same columns, e.g.: the result of a query. The columns are
+        matched with the attributes once for all of them.
+
+        Args:
+            records (Sequence[sqlite3.Row]): The records, with their amounts as they are stored.
+            exponent (int): Minor unit exponent of the account currency, or None if the database stores decimals.
+            **fields: Values not in the records, e.g.: user_id and account_id.
+        Returns:
+            List[OperationRow]: The rows, with the same values UserOperations objects would have.
+        """
+        if not records:
+            return []
+        columns = set(records[0].keys())
+        stored = [name for name in cls.__slots__ if name in columns and name not in fields]
+        constant = [(name, fields.get(name)) for name in cls.__slots__ if name not in stored]
+        datetimes = [name for name in ("operation_datetime", "created_at", "updated_at") if name in stored]
+
+        rows = []
+        for record in records:
+            row = cls.__new__(cls)
+            for name in stored:
+                setattr(row, name, record[name])
+            for name, value in constant:
+                setattr(row, name, value)
+            row.amount = amount_from_db(row.amount, exponent)
+            row.cumulative_amount = amount_from_db(row.cumulative_amount, exponent)
+            for name in datetimes:
+                value = getattr(row, name)
+                if value is not None:
+                    setattr(row, name, datetime.fromisoformat(value))
+            rows.append(row)
+        return rows
+
+    def to_model(self) -> UserOperations:
+        """Returns the UserOperations object of the row, with every value validated"""
+        return UserOperations(**{name: getattr(self, name) for name in self.__slots__})
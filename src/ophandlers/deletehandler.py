@@ -5,14 +5,12 @@ Class to handle the deletion of individual operations that are not transfers and
 operations.
 """
 
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
 from decimal import Decimal
+from src.dbhandler.balanceindex import COEFF
 from src.models.accmodel import UserAccounts
-from src.models.opmodel import OperationsModel, UserOperations
-
-
-class NegativeAccountTotalError(Exception):
-    """Raised when an operation would result in negative account total"""
+from src.models.opmodel import OperationsModel, UserOperations, OperationNotFoundError
+from src.ophandlers.operationhandler import NegativeAccountTotalError, single_transaction
 
 
 class EmptyAccountError(Exception):
@@ -24,7 +22,8 @@ class DeletionHandler(OperationsModel):
     user_id: str
     account_id: str
     amount: Decimal = Decimal(0)
-    coeff: dict = {"income": 1, "expense": -1, "transfer_in": 1, "transfer_out": -1}
+    # set by set_cumulatives when every later operation only needs the same amount added to its cumulative_amount
+    _cumulative_shift: Optional[Decimal] = None
 
     def _calculate_cumulatives(
         self, operations_list: List[OperationsModel], previus_amount: Decimal
@@ -39,7 +38,7 @@ class DeletionHandler(OperationsModel):
         """
         for operation in operations_list:
             operation.cumulative_amount = previus_amount = (
-                previus_amount + self.coeff[operation.operation_type] * operation.amount
+                previus_amount + COEFF[operation.operation_type] * operation.amount
             )
         return operations_list
 
@@ -57,11 +56,36 @@ class DeletionHandler(OperationsModel):
         if account_total == 0 and self.operation_type == "expense":
             raise EmptyAccountError
 
-        self.account_total = account_total - self.coeff[self.operation_type] * self.amount
+        self.account_total = account_total - COEFF[self.operation_type] * self.amount
 
         if self.account_total < 0:
             raise NegativeAccountTotalError
 
+    def _shift_cumulatives(self) -> List[OperationsModel]:
+        """
+        A deletion never changes the order of the other operations, so the cumulative_amount of every later operation
+        is shifted by the same amount: the shift and the negative balance check are done in SQL.
+        """
+        shift = -COEFF[self.operation_type] * self.amount
+        _, min_later_amount = UserOperations.get_cumulative_bounds(
+            user_id=self.user_id,
+            account_id=self.account_id,
+            operation_datetime=self.operation_datetime,
+            created_at=self.created_at,
+        )
+        if min_later_amount is not None:
+            if min_later_amount + shift < 0:
+                raise NegativeAccountTotalError(
+                    UserOperations.get_first_operation_below(
+                        user_id=self.user_id,
+                        account_id=self.account_id,
+                        amount=-shift,
+                        after=(self.operation_datetime, self.created_at),
+                    )
+                )
+            self._cumulative_shift = shift
+        return []
+
     def set_cumulatives(self) -> List[OperationsModel]:
         """
         Calculates and, if necessary, corrects the cumulative_amount of every operation with a posterior date to the
@@ -72,6 +96,10 @@ class DeletionHandler(OperationsModel):
         Returns:
             List[OperationsModel]: List with all involved operations to be modified and/or created.
         """
+        self._cumulative_shift = None
+        if self.created_at is not None:
+            return self._shift_cumulatives()
+
         existing_operations = UserOperations.get_operations_list_from_id(
             user_id=self.user_id, account_id=self.account_id, operation_id=self.operation_id
         )
@@ -110,5 +138,72 @@ class DeletionHandler(OperationsModel):
         Returns:
             operation: OperationsModel object
         """
+        if self._cumulative_shift is not None:
+            return UserOperations(**self.model_dump()).delete_n_shift(self._cumulative_shift)
+
         operation = UserOperations(**self.model_dump()).delete_n_massive_save(existing_operations)
         return operation
+
+    @classmethod
+    def delete_many(cls, user_id: str, operations: Sequence[Tuple[str, str]]) -> int:
+        """
+        Deletes several operations, of one or more accounts, at once. The deletions are grouped by account: the history
+        of every account is read and recalculated once from the oldest deleted datetime and the deletions, the updated
+        cumulative amounts and the account_total of every account are written in a single transaction.
+        Every account is checked before writing any of them, so a rejected deletion leaves every account unchanged.
+        Args:
+            user_id (str): The unique identifier for the user.
+            operations (Sequence[Tuple[str, str]]): (account_id, operation_id) of every operation to delete.
+        Returns:
+            int: Number of deleted operations.
+        Raises:
+            NegativeAccountTotalError: with the first operation that would get a negative cumulative_amount.
+            OperationNotFoundError: if any of the operations doesn't exist.
+        """
+        operation_ids_by_account: Dict[str, set] = {}
+        for account_id, operation_id in operations:
+            operation_ids_by_account.setdefault(account_id, set()).add(operation_id)
+
+        deletions = []
+        for account_id, operation_ids in operation_ids_by_account.items():
+            existing_operations = UserOperations.get_operations_list_from_ids(
+                user_id=user_id, account_id=account_id, operation_ids=list(operation_ids)
+            )
+            deleted_operations = [oper for oper in existing_operations if oper.operation_id in operation_ids]
+            if len(deleted_operations) != len(operation_ids):
+                raise OperationNotFoundError
+
+            # the balance before the first operation of the list
+            first_operation = existing_operations[0]
+            cumulative_amount = (
+                first_operation.cumulative_amount - COEFF[first_operation.operation_type] * first_operation.amount
+            )
+            updated_operations = []
+            for oper in existing_operations:
+                if oper.operation_id in operation_ids:
+                    continue
+                cumulative_amount += COEFF[oper.operation_type] * oper.amount
+                if cumulative_amount < 0:
+                    raise NegativeAccountTotalError(oper)
+                if oper.cumulative_amount != cumulative_amount:
+                    oper.cumulative_amount = cumulative_amount
+                    updated_operations.append(oper)
+
+            account = UserAccounts.get_account_by_id(user_id=user_id, account_id=account_id)
+            account_total = (account.account_total or 0) - sum(
+                COEFF[oper.operation_type] * oper.amount for oper in deleted_operations
+            )
+            deletions.append((account_id, list(operation_ids), updated_operations, account_total))
+
+        deleted = 0
+        # every account of the user is in the same database
+        with single_transaction(user_id, list(operation_ids_by_account)):
+            for account_id, operation_ids, updated_operations, account_total in deletions:
+                deleted += UserOperations.massive_delete(
+                    user_id,
+                    account_id,
+                    operation_ids,
+                    updated_operations=updated_operations,
+                    account_total=account_total,
+                )
+        return deleted
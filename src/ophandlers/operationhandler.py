@@ -4,31 +4,83 @@ billeterapp 2.0 - Agosto 2024
 Class to handle the incomes into a given account
 """
 
-from typing import List, Optional
+import heapq
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta, UTC
 from decimal import Decimal
+from src.dbhandler.balanceindex import COEFF, invalidate_balance_index
+from src.dbhandler.dbhandler import get_transaction
+from src.dbhandler.timestamps import epoch_us
 from src.models.accmodel import UserAccounts
-from src.models.opmodel import OperationsModel, UserOperations
+from src.models.opmodel import OperationsModel, UserOperations, OperationNotFoundError
 
 
 class NegativeAccountTotalError(Exception):
     """Raised when an operation would result in negative account total"""
 
+    def __init__(self, operation: Optional[OperationsModel] = None) -> None:
+        super().__init__(operation)
+        # the first operation, chronologically, whose cumulative_amount would be negative, if known
+        self.operation = operation
+
 
 class EmptyAccountError(Exception):
     """Raised when attempting to withdraw from an empty account"""
 
 
+@contextmanager
+def single_transaction(user_id: str, account_ids: Sequence[str]) -> Iterator[None]:
+    """
+    Runs the writes of several accounts of a user inside one transaction: the writes of the models become savepoints
+    of it, so they are committed together. The balance indexes of the accounts are dropped if it is rolled back,
+    since the models keep them in sync as soon as their own writes succeed.
+    """
+    try:
+        with get_transaction(user_id):
+            yield
+    except BaseException:
+        for account_id in account_ids:
+            invalidate_balance_index(user_id, account_id)
+        raise
+
+
 class OperationHandler(OperationsModel):
 
     user_id: str
     account_id: str
-    account: Optional[UserAccounts] = None
-    coeff: dict = {"income": 1, "expense": -1, "transfer_in": 1, "transfer_out": -1}
+    # (shift, after, before) ranges set by set_cumulatives when the operations of every range only need the same
+    # amount added to their cumulative_amount (see UserOperations.shift_n_save)
+    _cumulative_shifts: Optional[List[Tuple]] = None
+    # see the account property
+    _account: Optional[UserAccounts] = None
 
-    def __init__(self, **kwargs):
+    def __init__(self, account: Optional[UserAccounts] = None, **kwargs):
+        """
+        Args:
+            account (UserAccounts, optional): The account of the operation, e.g.: to share one account object among the
+            handlers built in a batch. If not provided it is fetched on first use.
+        """
         super().__init__(**kwargs)
-        self.account = UserAccounts.get_account_by_id(user_id=self.user_id, account_id=self.account_id)
-        self.operation_currency = self.account.account_currency
+        if account is not None:
+            self.account = account
+
+    @property
+    def account(self) -> UserAccounts:
+        """The account of the operation, fetched on first use if it was not provided when creating the handler"""
+        if self._account is None:
+            self.account = UserAccounts.get_account_by_id(user_id=self.user_id, account_id=self.account_id)
+        return self._account
+
+    @account.setter
+    def account(self, account: UserAccounts) -> None:
+        self._account = account
+        self.operation_currency = account.account_currency
+
+    def _update_account_total(self) -> None:
+        """Applies the saved account_total to the account object, which can be shared with other handlers"""
+        if self._account is not None and self.account_total is not None:
+            self._account.account_total = self.account_total
 
     def readjustment(self, account_total: Decimal) -> List:
         """
@@ -69,7 +121,7 @@ class OperationHandler(OperationsModel):
         """
         for operation in operations_list:
             operation.cumulative_amount = previus_amount = (
-                previus_amount + self.coeff[operation.operation_type] * operation.amount
+                previus_amount + COEFF[operation.operation_type] * operation.amount
             )
         if edit_flag:
             operations_list.append(self)
@@ -78,47 +130,105 @@ class OperationHandler(OperationsModel):
     def _handle_new_operation(self) -> List[OperationsModel]:
         """
         Handles all possible cases for creation of operations and manages the impact on the rest of the operations.
+        A new operation never changes the order of the other operations, so the cumulative_amount of every later
+        operation is shifted by the same amount: the shift and the negative balance check are done in SQL.
         """
-        existing_operations = UserOperations.get_operations_list_from_datetime(
-            user_id=self.user_id, account_id=self.account_id, operation_datetime=self.operation_datetime
+        # the new operation goes after every existing operation with the same datetime
+        position = (self.operation_datetime, datetime.now(UTC))
+        previus_amount, min_later_amount = UserOperations.get_cumulative_bounds(
+            user_id=self.user_id, account_id=self.account_id, operation_datetime=position[0], created_at=position[1]
         )
-        if not existing_operations:
-            self.cumulative_amount = self.amount
-            return existing_operations
-
-        first_operation = existing_operations[0]
-        # new operation datetime is OLDER than the oldest operation saved in database (first operation)
-        if self.operation_datetime < first_operation.operation_datetime:
-            if self.operation_type == "expense":
-                raise NegativeAccountTotalError
+        shift = COEFF[self.operation_type] * self.amount
+        cumulative_amount = (previus_amount or 0) + shift
+        ranges = [(shift, position, None, min_later_amount)]
+        self._check_balances(cumulative_amount, ranges)
 
-            self.cumulative_amount = self.amount
+        self.cumulative_amount = cumulative_amount
+        self._set_cumulative_shifts(ranges)
+        return []
 
-            return self._calculate_cumulatives(existing_operations, self.amount)
+    def _check_balances(self, cumulative_amount: Decimal, ranges: List[Tuple], self_index: int = 0) -> None:
+        """
+        Checks that neither the self cumulative_amount nor any cumulative_amount of the shifted ranges is negative.
+        Raises NegativeAccountTotalError with the first operation, in chronological order, that would be negative.
+        Args:
+            cumulative_amount (Decimal): The cumulative_amount of the self operation.
+            ranges (list): (shift, after, before, min_amount) of every range in chronological order, min_amount is the
+            current minimum cumulative_amount of the range or None if the range is empty.
+            self_index (int, optional): Place of the self operation among the ranges. Defaults to 0 (before them).
+        """
+        checks = list(ranges)
+        checks.insert(self_index, None)
+        for check in checks:
+            if check is None:
+                if cumulative_amount < 0:
+                    raise NegativeAccountTotalError(self)
+                continue
+            shift, after, before, min_amount = check
+            if min_amount is not None and min_amount + shift < 0:
+                raise NegativeAccountTotalError(
+                    UserOperations.get_first_operation_below(
+                        user_id=self.user_id, account_id=self.account_id, amount=-shift, after=after, before=before
+                    )
+                )
 
-        # New operation with exact same datetime than an existing operation
-        if first_operation.operation_datetime == self.operation_datetime:
-            self.cumulative_amount = first_operation.cumulative_amount + self.coeff[self.operation_type] * self.amount
-            existing_operations = existing_operations[1:]
-            if self.cumulative_amount < 0:
-                raise NegativeAccountTotalError
+    def _set_cumulative_shifts(self, ranges: List[Tuple]) -> None:
+        """Keeps the (shift, after, before) of the ranges that change, to be applied when saving"""
+        self._cumulative_shifts = [
+            (shift, after, before)
+            for shift, after, before, min_amount in ranges
+            if min_amount is not None and shift != 0
+        ]
 
-            return self._calculate_cumulatives(existing_operations, self.cumulative_amount)
+    def _handle_moved_operation(self, original_operation: OperationsModel) -> List[OperationsModel]:
+        """
+        Handles the editions of an operation with any given datetime without loading the other operations. Only two
+        ranges of operations change, each one by a constant amount:
+        - the operations between the original and the edited datetime: they lose the original amount if the operation
+        moves to a newer datetime or they gain the edited amount if it moves to an older datetime.
+        - the operations after both datetimes: they gain the difference between the edited and the original amount.
+        The shifts and the negative balance checks are done in SQL.
+        """
+        original_amount = COEFF[original_operation.operation_type] * original_operation.amount
+        edited_amount = COEFF[self.operation_type] * self.amount
+        # an edited operation keeps its created_at, which sorts it among the operations with the same datetime
+        original_position = (original_operation.operation_datetime, original_operation.created_at)
+        edited_position = (self.operation_datetime, original_operation.created_at)
+        moved_to_newer = epoch_us(self.operation_datetime) > epoch_us(original_operation.operation_datetime)
+        first, last = (original_position, edited_position) if moved_to_newer else (edited_position, original_position)
+
+        min_moved_amount = None
+        if epoch_us(self.operation_datetime) != epoch_us(original_operation.operation_datetime):
+            min_moved_amount = UserOperations.get_min_cumulative_amount_between(
+                user_id=self.user_id, account_id=self.account_id, after=first, before=last
+            )
 
-        # New operation in the middle of other operations:
-        if first_operation.operation_datetime < self.operation_datetime and len(existing_operations) > 1:
-            self.cumulative_amount = first_operation.cumulative_amount + self.coeff[self.operation_type] * self.amount
-            if self.cumulative_amount < 0:
-                raise NegativeAccountTotalError
-            # Removes the operation before the interest operation
-            existing_operations = existing_operations[1:]
+        moved_shift = 0
+        if min_moved_amount is None:
+            # the order of the operations doesn't change
+            cumulative_amount = original_operation.cumulative_amount - original_amount + edited_amount
+        else:
+            moved_shift = -original_amount if moved_to_newer else edited_amount
+            previus_amount, _ = UserOperations.get_cumulative_bounds(
+                user_id=self.user_id,
+                account_id=self.account_id,
+                operation_datetime=edited_position[0],
+                created_at=edited_position[1],
+            )
+            # moved to a newer datetime, the previus operation is one of the moved range and it is shifted too
+            cumulative_amount = (previus_amount or 0) + (moved_shift if moved_to_newer else 0) + edited_amount
 
-            return self._calculate_cumulatives(existing_operations, self.cumulative_amount)
+        later_shift = edited_amount - original_amount
+        _, min_later_amount = UserOperations.get_cumulative_bounds(
+            user_id=self.user_id, account_id=self.account_id, operation_datetime=last[0], created_at=last[1]
+        )
+        ranges = [(moved_shift, first, last, min_moved_amount), (later_shift, last, None, min_later_amount)]
+        # moved to a newer datetime, the self operation goes after the moved range
+        self._check_balances(cumulative_amount, ranges, self_index=1 if moved_to_newer else 0)
 
-        # New operation datetime is NEWER than the last operation
-        if first_operation.operation_datetime < self.operation_datetime and len(existing_operations) == 1:
-            self.cumulative_amount = first_operation.cumulative_amount + self.coeff[self.operation_type] * self.amount
-            return existing_operations
+        self.cumulative_amount = cumulative_amount
+        self._set_cumulative_shifts(ranges)
+        return [self]
 
     def _handle_edited_operation(self, original_operation: OperationsModel) -> List[OperationsModel]:
         """
@@ -136,8 +246,8 @@ class OperationHandler(OperationsModel):
         if not existing_operations:
             self.cumulative_amount = (
                 original_operation.cumulative_amount
-                - self.coeff[original_operation.operation_type] * original_operation.amount
-                + self.coeff[self.operation_type] * self.amount
+                - COEFF[original_operation.operation_type] * original_operation.amount
+                + COEFF[self.operation_type] * self.amount
             )
             return [self]
 
@@ -146,10 +256,10 @@ class OperationHandler(OperationsModel):
         # when the edited datetime is older than the original
         if self.operation_datetime < original_operation.operation_datetime:
             if self.operation_datetime < first_operation.operation_datetime:
-                self.cumulative_amount = self.coeff[self.operation_type] * self.amount
+                self.cumulative_amount = COEFF[self.operation_type] * self.amount
                 return self._calculate_cumulatives(existing_operations, self.cumulative_amount, edit_flag=True)
 
-            self.cumulative_amount = first_operation.cumulative_amount + self.coeff[self.operation_type] * self.amount
+            self.cumulative_amount = first_operation.cumulative_amount + COEFF[self.operation_type] * self.amount
             existing_operations = existing_operations[1:]
             return self._calculate_cumulatives(existing_operations, self.cumulative_amount, edit_flag=True)
 
@@ -179,8 +289,8 @@ class OperationHandler(OperationsModel):
                         return self._calculate_cumulatives(existing_operations, 0, edit_flag=True)
                     # Original operation is in the middle and the new date is newer but does'n produce order changes
                     self.cumulative_amount += (
-                        self.coeff[self.operation_type] * self.amount
-                        - self.coeff[original_operation.operation_type] * original_operation.amount
+                        COEFF[self.operation_type] * self.amount
+                        - COEFF[original_operation.operation_type] * original_operation.amount
                     )
                     existing_operations = existing_operations[1:]
                     return self._calculate_cumulatives(existing_operations, self.cumulative_amount, edit_flag=True)
@@ -188,7 +298,7 @@ class OperationHandler(OperationsModel):
                 if self.operation_datetime > first_operation.operation_datetime:
                     previus_amount = (
                         original_operation.cumulative_amount
-                        - self.coeff[original_operation.operation_type] * original_operation.amount
+                        - COEFF[original_operation.operation_type] * original_operation.amount
                     )
                     return self._calculate_cumulatives(existing_operations, previus_amount, edit_flag=True)
 
@@ -196,7 +306,7 @@ class OperationHandler(OperationsModel):
                 second_operation = existing_operations[1]
                 second_operation.cumulative_amount = (
                     first_operation.cumulative_amount
-                    + self.coeff[second_operation.operation_type] * second_operation.amount
+                    + COEFF[second_operation.operation_type] * second_operation.amount
                 )
                 return self._calculate_cumulatives(
                     existing_operations, second_operation.cumulative_amount, edit_flag=True
@@ -219,33 +329,209 @@ class OperationHandler(OperationsModel):
         if edit_flag and original_operation:
             self.account_total = (
                 account_total
-                - self.coeff[original_operation.operation_type] * original_operation.amount
-                + self.coeff[self.operation_type] * self.amount
+                - COEFF[original_operation.operation_type] * original_operation.amount
+                + COEFF[self.operation_type] * self.amount
             )
         else:
-            self.account_total = account_total + self.coeff[self.operation_type] * self.amount
+            self.account_total = account_total + COEFF[self.operation_type] * self.amount
 
         if self.account_total < 0:
             raise NegativeAccountTotalError
 
-    def set_cumulatives(self, edit_flag=False, original_operation: OperationsModel = None) -> List[OperationsModel]:
+    def set_cumulatives(
+        self, edit_flag=False, original_operation: OperationsModel = None, recalculate: bool = False
+    ) -> List[OperationsModel]:
         """
         Calculates and, if necessary, corrects the cumulative_amount of every operation with a posterior date to the
         self operation date. It can handle the creation of new operations the edition of existing operations with any
         given datetime.
+        The later operations are not loaded: the returned list doesn't include them and their cumulative_amount is
+        shifted in SQL by create_operations or save. Only the recalculations load them.
         Args:
             self: OperationsModel object
             edit_flag (bool, optional): Flag to indicate if the operation is an edit. Defaults to False.
             original_operation (OperationsModel, optional): Original operation prior to edition. Defaults to None.
+            recalculate (bool, optional): Recalculates every later cumulative_amount from the amounts instead of
+            shifting them, e.g.: to correct imported operations. Defaults to False.
         Returns:
             List[OperationsModel]: List with all involved operations to be modified and/or created.
         """
+        self._cumulative_shifts = None
         if not edit_flag:
             return self._handle_new_operation()
 
         if edit_flag and original_operation:
+            if not recalculate and original_operation.created_at is not None:
+                return self._handle_moved_operation(original_operation)
             return self._handle_edited_operation(original_operation)
 
+    @classmethod
+    def create_many(
+        cls, operations: Sequence[OperationsModel], account: Optional[UserAccounts] = None
+    ) -> List[UserOperations]:
+        """
+        Creates several operations of the same account at once. The batch is sorted chronologically and merged once
+        with the existing operations after its first datetime, every cumulative_amount is calculated in a single pass
+        and everything is written in a single transaction.
+        Operations of the batch go after the existing operations with the same datetime, in the order given.
+        Args:
+            operations (Sequence[OperationsModel]): The new operations, all of them of the same user and account.
+            account (UserAccounts, optional): The account of the operations, fetched if not provided. Its account_total
+            is updated.
+        Returns:
+            List[UserOperations]: The created operations, sorted chronologically.
+        Raises:
+            NegativeAccountTotalError: with the first operation, new or existing, that would get a negative
+            cumulative_amount. Nothing is written.
+        """
+        if not operations:
+            return []
+        user_id, account_id = operations[0].user_id, operations[0].account_id
+        if any(oper.user_id != user_id or oper.account_id != account_id for oper in operations):
+            raise ValueError("All the operations must belong to the same account")
+        if account is None:
+            account = UserAccounts.get_account_by_id(user_id=user_id, account_id=account_id)
+
+        # distinct creation datetimes keep the order of the batch among the operations with the same datetime
+        created_at = datetime.now(UTC)
+        sorted_operations = sorted(operations, key=lambda oper: epoch_us(oper.operation_datetime))
+        new_operations = [
+            UserOperations(
+                **oper.model_dump(exclude={"cumulative_amount", "created_at", "updated_at"}),
+                created_at=created_at + timedelta(microseconds=i),
+            )
+            for i, oper in enumerate(sorted_operations)
+        ]
+        for oper in new_operations:
+            oper.operation_currency = account.account_currency
+
+        first_position = (new_operations[0].operation_datetime, new_operations[0].created_at)
+        previus_amount, _ = UserOperations.get_cumulative_bounds(
+            user_id=user_id, account_id=account_id, operation_datetime=first_position[0], created_at=first_position[1]
+        )
+        existing_operations = UserOperations.get_operations_list_after(
+            user_id=user_id, account_id=account_id, after=first_position
+        )
+
+        # the existing operations go first among the ones with the same datetime
+        history = heapq.merge(
+            ((epoch_us(oper.operation_datetime), 0, oper) for oper in existing_operations),
+            ((epoch_us(oper.operation_datetime), 1, oper) for oper in new_operations),
+            key=lambda item: item[:2],
+        )
+        cumulative_amount = previus_amount or 0
+        updated_operations = []
+        for _, is_new, oper in history:
+            cumulative_amount += COEFF[oper.operation_type] * oper.amount
+            if cumulative_amount < 0:
+                raise NegativeAccountTotalError(oper)
+            if not is_new and oper.cumulative_amount != cumulative_amount:
+                updated_operations.append(oper)
+            oper.cumulative_amount = cumulative_amount
+
+        account_total = (account.account_total or 0) + sum(
+            COEFF[oper.operation_type] * oper.amount for oper in new_operations
+        )
+        created = UserOperations.massive_create(new_operations, updated_operations, account_total=account_total)
+        account.account_total = account_total
+        return created
+
+    @classmethod
+    def save_many(cls, edits: Sequence[Tuple[OperationsModel, OperationsModel]]) -> List[UserOperations]:
+        """
+        Saves several edited operations, of one or more accounts, at once. The editions are grouped by account: the
+        history of every account is read once from the oldest original or edited datetime, the edited operations are
+        placed in their new positions and every cumulative_amount is recalculated in a single pass. The edited
+        operations, the updated cumulative amounts and the account_total of every account are written in a single
+        transaction. Every account is checked before writing any of them, so a rejected edition leaves every account
+        unchanged.
+        An edited operation keeps its created_at, which sorts it among the operations with the same datetime.
+        Args:
+            edits (Sequence[Tuple[OperationsModel, OperationsModel]]): (original operation, edited operation) pairs.
+        Returns:
+            List[UserOperations]: The saved operations.
+        Raises:
+            NegativeAccountTotalError: with the first operation that would get a negative cumulative_amount.
+        """
+        edits_by_account: Dict[Tuple[str, str], List[Tuple[OperationsModel, OperationsModel]]] = {}
+        for original_operation, edited_operation in edits:
+            key = (original_operation.user_id, original_operation.account_id)
+            edits_by_account.setdefault(key, []).append((original_operation, edited_operation))
+
+        savings = []
+        for (user_id, account_id), account_edits in edits_by_account.items():
+            oldest_datetime = min(
+                (oper.operation_datetime for pair in account_edits for oper in pair), key=lambda dt: epoch_us(dt)
+            )
+            existing_operations = UserOperations.get_operations_list_since(
+                user_id=user_id, account_id=account_id, operation_datetime=oldest_datetime
+            )
+            edited_by_id = {edited.operation_id: edited for _, edited in account_edits}
+            if len(edited_by_id) != len({oper.operation_id for oper in existing_operations} & edited_by_id.keys()):
+                raise OperationNotFoundError
+
+            # the balance before the first operation of the list
+            first_operation = existing_operations[0]
+            cumulative_amount = (
+                first_operation.cumulative_amount - COEFF[first_operation.operation_type] * first_operation.amount
+            )
+            total_difference = 0
+            history = []
+            edited_operations = []
+            for oper in existing_operations:
+                edited = edited_by_id.get(oper.operation_id)
+                if edited is None:
+                    history.append(oper)
+                    continue
+                edited = UserOperations(
+                    **edited.model_dump(exclude={"user_id", "account_id", "cumulative_amount", "created_at"}),
+                    user_id=user_id,
+                    account_id=account_id,
+                    created_at=oper.created_at,
+                )
+                total_difference += (
+                    COEFF[edited.operation_type] * edited.amount - COEFF[oper.operation_type] * oper.amount
+                )
+                history.append(edited)
+                edited_operations.append(edited)
+
+            history.sort(
+                key=lambda oper: (
+                    epoch_us(oper.operation_datetime),
+                    oper.created_at.isoformat() if oper.created_at is not None else "",
+                )
+            )
+            edited_ids = {oper.operation_id for oper in edited_operations}
+            updated_operations = []
+            for oper in history:
+                cumulative_amount += COEFF[oper.operation_type] * oper.amount
+                if cumulative_amount < 0:
+                    raise NegativeAccountTotalError(oper)
+                if oper.operation_id not in edited_ids and oper.cumulative_amount != cumulative_amount:
+                    updated_operations.append(oper)
+                oper.cumulative_amount = cumulative_amount
+
+            account = UserAccounts.get_account_by_id(user_id=user_id, account_id=account_id)
+            account_total = (account.account_total or 0) + total_difference
+            savings.append((user_id, account_id, edited_operations, updated_operations, account_total))
+
+        saved_operations = []
+        # every account of a user is in the same database
+        for user_id in dict.fromkeys(saving[0] for saving in savings):
+            user_savings = [saving for saving in savings if saving[0] == user_id]
+            with single_transaction(user_id, [saving[1] for saving in user_savings]):
+                for _, account_id, edited_operations, updated_operations, account_total in user_savings:
+                    UserOperations.massive_update(
+                        user_id,
+                        account_id,
+                        edited_operations,
+                        updated_operations=updated_operations,
+                        account_total=account_total,
+                    )
+            for saving in user_savings:
+                saved_operations.extend(saving[2])
+        return saved_operations
+
     def create_operations(self, existing_operations: List[OperationsModel] = None) -> OperationsModel:
         """
         Saves the new income into the database, edits the account_total column in 'accounts' table and makes the
@@ -256,10 +542,14 @@ class OperationHandler(OperationsModel):
         Returns:
             oper: OperationsModel object
         """
-        if not existing_operations:
-            return UserOperations(**self.model_dump()).create()
-
-        return UserOperations(**self.model_dump()).massive_save(existing_operations)
+        if self._cumulative_shifts:
+            operation = UserOperations(**self.model_dump()).shift_n_save(self._cumulative_shifts)
+        elif not existing_operations:
+            operation = UserOperations(**self.model_dump()).create()
+        else:
+            operation = UserOperations(**self.model_dump()).massive_save(existing_operations)
+        self._update_account_total()
+        return operation
 
     def save(self, existing_operations: List[OperationsModel]) -> "OperationsModel":
         """
@@ -270,5 +560,9 @@ class OperationHandler(OperationsModel):
         Returns:
             operation: OperationsModel object
         """
-        operation = UserOperations(**self.model_dump()).massive_save(existing_operations, edit_flag=True)
+        if self._cumulative_shifts:
+            operation = UserOperations(**self.model_dump()).shift_n_save(self._cumulative_shifts, edit_flag=True)
+        else:
+            operation = UserOperations(**self.model_dump()).massive_save(existing_operations, edit_flag=True)
+        self._update_account_total()
         return operation
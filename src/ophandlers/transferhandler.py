@@ -4,13 +4,12 @@ billeterapp 2.0 - Enero 2025
 Class to handle transfers between accounts
 """
 
-import sqlite3
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+from src.models.accmodel import UserAccounts
 from src.models.opmodel import OperationsModel, UserOperations
-from src.ophandlers.operationhandler import OperationHandler
-
-
-class NegativeAccountTotalError(Exception):
-    """Raised when an operation would result in negative account total"""
+from src.ophandlers.operationhandler import NegativeAccountTotalError, OperationHandler, single_transaction
 
 
 class SameAccountError(Exception):
@@ -67,7 +66,7 @@ class TransferHandler(OperationsModel):
             description=f"Transfer to {out_acc}",
         )
 
-        if transfer_in.operation_currency != transfer_out.operation_currency:
+        if transfer_in.account.account_currency != transfer_out.account.account_currency:
             raise DifferentCurrencyTransferError
 
         transfer_in.set_account_total(edit_flag, in_original_op)
@@ -93,17 +92,10 @@ class TransferHandler(OperationsModel):
         in_cml = transfer_object_in.set_cumulatives()
         out_cml = transfer_object_out.set_cumulatives()
 
-        try:
-            if not in_cml:
-                UserOperations(**transfer_object_in.model_dump()).create()
-            else:
-                UserOperations(**transfer_object_in.model_dump()).massive_save(in_cml)
-            if not out_cml:
-                UserOperations(**transfer_object_out.model_dump()).create()
-            else:
-                UserOperations(**transfer_object_out.model_dump()).massive_save(out_cml)
-        except sqlite3.Error:
-            raise sqlite3.Error
+        # a failed leg rolls back both, and its error is raised as it is
+        with single_transaction(self.user_id, [transfer_object_in.account_id, transfer_object_out.account_id]):
+            transfer_object_in.create_operations(in_cml)
+            transfer_object_out.create_operations(out_cml)
 
     def save_transfer(
         self,
@@ -123,8 +115,77 @@ class TransferHandler(OperationsModel):
         in_cml = transfer_object_in.set_cumulatives(edit_flag=True, original_operation=in_original_op)
         out_cml = transfer_object_out.set_cumulatives(edit_flag=True, original_operation=out_original_op)
 
-        try:
-            UserOperations(**transfer_object_in.model_dump()).massive_save(in_cml, edit_flag=True)
-            UserOperations(**transfer_object_out.model_dump()).massive_save(out_cml, edit_flag=True)
-        except sqlite3.Error:
-            raise sqlite3.Error
+        # a failed leg rolls back both, and its error is raised as it is
+        with single_transaction(self.user_id, [transfer_object_in.account_id, transfer_object_out.account_id]):
+            transfer_object_in.save(in_cml)
+            transfer_object_out.save(out_cml)
+
+    @classmethod
+    def create_transfers(
+        cls, user_id: str, transfers: Sequence[Tuple[str, str, Decimal, Optional[datetime]]]
+    ) -> List[Tuple[UserOperations, UserOperations]]:
+        """
+        Creates several transfers at once. The legs are grouped by account and every account gets all its legs with
+        OperationHandler.create_many, so its history is read and recalculated once. Every leg of every transfer is
+        written in a single transaction: a rejected transfer leaves every account unchanged.
+        Args:
+            user_id (str): The unique identifier for the user.
+            transfers (Sequence[Tuple]): (in_acc, out_acc, amount, operation_datetime) of every transfer, the
+                operation_datetime can be None for the current datetime.
+        Returns:
+            List[Tuple[UserOperations, UserOperations]]: The (transfer_in, transfer_out) operations of every transfer,
+            in the given order.
+        Raises:
+            SameAccountError, DifferentCurrencyTransferError: if any transfer is not valid. Nothing is written.
+            NegativeAccountTotalError: with the first operation that would get a negative cumulative_amount.
+        """
+        accounts: Dict[str, UserAccounts] = {}
+        legs: Dict[str, List[OperationsModel]] = {}
+        operation_ids = []
+        for in_acc, out_acc, amount, operation_datetime in transfers:
+            if in_acc == out_acc:
+                raise SameAccountError
+            for account_id in (in_acc, out_acc):
+                if account_id not in accounts:
+                    accounts[account_id] = UserAccounts.get_account_by_id(user_id, account_id)
+            if accounts[in_acc].account_currency != accounts[out_acc].account_currency:
+                raise DifferentCurrencyTransferError
+
+            transfer = cls(user_id=user_id, amount=amount)
+            if operation_datetime is not None:
+                transfer.operation_datetime = operation_datetime
+            legs.setdefault(in_acc, []).append(
+                OperationsModel(
+                    user_id=user_id,
+                    account_id=in_acc,
+                    operation_id=transfer.operation_id,
+                    amount=amount,
+                    operation_datetime=transfer.operation_datetime,
+                    operation_type="transfer_in",
+                    category="Transfer",
+                    subcategory="Incoming",
+                    description=f"Transfer from {in_acc}",
+                )
+            )
+            legs.setdefault(out_acc, []).append(
+                OperationsModel(
+                    user_id=user_id,
+                    account_id=out_acc,
+                    operation_id=transfer.operation_id,
+                    amount=amount,
+                    operation_datetime=transfer.operation_datetime,
+                    operation_type="transfer_out",
+                    category="Transfer",
+                    subcategory="Outcoming",
+                    description=f"Transfer to {out_acc}",
+                )
+            )
+            operation_ids.append(transfer.operation_id)
+
+        created = {}
+        with single_transaction(user_id, list(legs)):
+            for account_id, account_legs in legs.items():
+                for oper in OperationHandler.create_many(account_legs, account=accounts[account_id]):
+                    created[(oper.operation_id, oper.operation_type)] = oper
+
+        return [(created[(op_id, "transfer_in")], created[(op_id, "transfer_out")]) for op_id in operation_ids]
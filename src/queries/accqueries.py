@@ -6,10 +6,11 @@ from typing import List
 
 from pydantic import BaseModel
 
+from src.dbhandler.executor import AsyncExecutable
 from src.models.accmodel import UserAccounts
 
 
-class GetAccountByIDQuery(BaseModel):
+class GetAccountByIDQuery(BaseModel, AsyncExecutable):
 
     user_id: str
     account_id: str
@@ -19,7 +20,7 @@ class GetAccountByIDQuery(BaseModel):
         return account
 
 
-class GetAccountByTableNameQuery(BaseModel):
+class GetAccountByTableNameQuery(BaseModel, AsyncExecutable):
 
     user_id: str
     table_name: str
@@ -29,7 +30,7 @@ class GetAccountByTableNameQuery(BaseModel):
         return account
 
 
-class ListAccountsQuery(BaseModel):
+class ListAccountsQuery(BaseModel, AsyncExecutable):
 
     user_id: str
 
@@ -6,10 +6,11 @@ from typing import List
 
 from pydantic import BaseModel
 
+from src.dbhandler.executor import AsyncExecutable
 from src.models.opdetmodel import OperationsDetails
 
 
-class GetOperationDetailByID(BaseModel):
+class GetOperationDetailByID(BaseModel, AsyncExecutable):
 
     user_id: str
     operation_id: str
@@ -19,7 +20,7 @@ class GetOperationDetailByID(BaseModel):
         return details
 
 
-class GetOperationDetailsByAccID(BaseModel):
+class GetOperationDetailsByAccID(BaseModel, AsyncExecutable):
 
     user_id: str
     account_id: str
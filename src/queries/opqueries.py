@@ -5,10 +5,11 @@ billeterapp 2.0 - Junio 2024
 import datetime
 from typing import List, Optional, Sequence
 
+from src.dbhandler.executor import AsyncExecutable
 from src.models.opmodel import OperationsModel, UserOperations
 
 
-class GetOperationByIDQuery(OperationsModel):
+class GetOperationByIDQuery(OperationsModel, AsyncExecutable):
 
     user_id: str
     account_id: str
@@ -21,7 +22,7 @@ class GetOperationByIDQuery(OperationsModel):
         return operations
 
 
-class GetUniqueCategoriesByAccount(OperationsModel):
+class GetUniqueCategoriesByAccount(OperationsModel, AsyncExecutable):
 
     user_id: str
     account_id: Optional[str] = None
@@ -33,7 +34,7 @@ class GetUniqueCategoriesByAccount(OperationsModel):
         return categories
 
 
-class GetUniqueSubcategoriesByAccount(OperationsModel):
+class GetUniqueSubcategoriesByAccount(OperationsModel, AsyncExecutable):
 
     user_id: str
     account_id: Optional[str] = None
@@ -46,7 +47,7 @@ class GetUniqueSubcategoriesByAccount(OperationsModel):
         return subcategories
 
 
-class GetLastChronologicalOperationQuery(OperationsModel):
+class GetLastChronologicalOperationQuery(OperationsModel, AsyncExecutable):
 
     user_id: str
     account_id: str
@@ -58,7 +59,7 @@ class GetLastChronologicalOperationQuery(OperationsModel):
         return operation
 
 
-class GetOperationByTagsQuery(OperationsModel):
+class GetOperationByTagsQuery(OperationsModel, AsyncExecutable):
 
     user_id: str
     account_id: str
@@ -71,19 +72,19 @@ class GetOperationByTagsQuery(OperationsModel):
         return operations
 
 
-class ListOperationsQuery(OperationsModel):
+class ListOperationsQuery(OperationsModel, AsyncExecutable):
 
     user_id: str
     account_id: str
     amount: Optional[float] = None
     operation_type: Optional[str] = None
 
-    def execute(self, order_by_datetime: bool = False) -> List["UserOperations"]:
-        operations = UserOperations.get_operations_list(self.user_id, self.account_id, order_by_datetime)
+    def execute(self, order_by_datetime: bool = False, as_rows: bool = False) -> List["UserOperations"]:
+        operations = UserOperations.get_operations_list(self.user_id, self.account_id, order_by_datetime, as_rows)
         return operations
 
 
-class ListOperationsByDatetime(OperationsModel):
+class ListOperationsByDatetime(OperationsModel, AsyncExecutable):
 
     user_id: str
     account_id: str
@@ -98,7 +99,7 @@ class ListOperationsByDatetime(OperationsModel):
         return operations
 
 
-class ListOperationsByIdFromDatetime(OperationsModel):
+class ListOperationsByIdFromDatetime(OperationsModel, AsyncExecutable):
 
     user_id: str
     account_id: str
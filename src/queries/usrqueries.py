@@ -6,10 +6,11 @@ from typing import List
 
 from pydantic import BaseModel, EmailStr
 
+from src.dbhandler.executor import AsyncExecutable
 from src.models.usrmodel import User
 
 
-class GetUserByIDQuery(BaseModel):
+class GetUserByIDQuery(BaseModel, AsyncExecutable):
 
     user_id: str
 
@@ -18,7 +19,7 @@ class GetUserByIDQuery(BaseModel):
         return user
 
 
-class GetUserByEmailQuery(BaseModel):
+class GetUserByEmailQuery(BaseModel, AsyncExecutable):
 
     user_email: EmailStr
 
@@ -27,7 +28,7 @@ class GetUserByEmailQuery(BaseModel):
         return user
 
 
-class ListUsersQuery(BaseModel):
+class ListUsersQuery(BaseModel, AsyncExecutable):
     def execute(self) -> List["User"]:
         users = User.get_all_users()
         return users